@@ -0,0 +1,51 @@
+"""
+Crystal ball motion, shared by the live demo and offline renderers.
+
+Everything here is a pure function of time and screen size, with no GL or
+pygame dependency, so the CPU renderer and exporters reproduce exactly what
+the demo shows.
+"""
+
+import math
+
+PHOTO_DISPLAY_TIME = 30.0  # Seconds each photo is shown, dissolve included
+CROSSFADE_DURATION = 8.0  # Seconds of slow dissolve at the start of each photo
+
+
+def sphere_motion(t, screen_width, screen_height):
+    """Sphere center (pixels, GL bottom-up), radius (pixels) and lens strength at time t"""
+    # IMPROVED DEMOSCENE MOTION - More complex Lissajous with rotation
+    # Multiple sine waves with different frequencies and phases
+    center_x = screen_width/2 + math.sin(t * 0.8) * (screen_width * 0.3)
+    center_x += math.cos(t * 1.3) * (screen_width * 0.15)
+    center_x += math.sin(t * 2.1) * (screen_width * 0.05)  # Extra detail
+
+    center_y = screen_height/2 + math.cos(t * 1.2) * (screen_height * 0.25)
+    center_y += math.sin(t * 0.9) * (screen_height * 0.12)
+    center_y += math.cos(t * 1.7) * (screen_height * 0.08)  # Extra detail
+
+    # Pulsing radius with multiple frequencies
+    base_radius = min(screen_width, screen_height) * 0.18
+    radius = base_radius + math.sin(t * 3.2) * (base_radius * 0.12)
+    radius += math.cos(t * 5.1) * (base_radius * 0.05)  # Extra pulse
+
+    # Varying distortion strength (breathing effect)
+    strength = 2.3 + math.sin(t * 1.8) * 0.4
+    strength += math.cos(t * 3.5) * 0.2  # Extra variation
+
+    return center_x, center_y, radius, strength
+
+
+def slideshow_state(t, photo_count, display_time=PHOTO_DISPLAY_TIME,
+                    crossfade_duration=CROSSFADE_DURATION):
+    """Photos bound to tex1/tex2 and the crossfade amount at time t of an uninterrupted slideshow.
+
+    Follows the demo's timeline: slot k dissolves photo k into photo k+1
+    over its first crossfade_duration seconds, then both texture units show
+    photo k+1 until the next slot. Indices wrap around photo_count.
+    """
+    slot = int(t // display_time)
+    crossfade = min(1.0, (t - slot * display_time) / crossfade_duration)
+    incoming = (slot + 1) % photo_count
+    outgoing = slot % photo_count if crossfade < 1.0 else incoming
+    return outgoing, incoming, crossfade
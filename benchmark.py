@@ -0,0 +1,419 @@
+"""
+Benchmarks for the photo load pipeline and the render loop.
+
+Generates a synthetic photo corpus once (JPEG and PNG, several resolutions
+and aspect ratios, all the interesting EXIF orientations) and then times:
+
+- Each stage of preparing a photo separately: decode, resize (with the
+  EXIF rotation applied to the fitted frame), RGBX array conversion and
+  (with a GL context) the texture upload. Letterboxing is done by the
+  shader from uniforms sent with every draw, so the frame CPU timing below
+  covers it.
+- A headless slideshow loop at fixed resolutions, loading photos inline on
+  the loop thread ("single"), through the prefetch pool ("pooled") and
+  through the prefetch pool backed by a warm frame cache ("cached").
+- The CPU cost of issuing one demo frame (motion, uniforms and draw calls,
+  with PyOpenGL error checking off as in the demo) at the first render
+  size, measured without waiting for the GPU. Pass --frame-cpu-budget-ms
+  to also fail the run when its p95 is over a fixed budget.
+
+Results are written as JSON with a flat "metrics" map of milliseconds
+(lower is better). Pass --baseline to compare against an earlier run; any
+metric that got slower than the threshold is reported and the exit code is
+1, so regressions are caught before they reach the displays. A change must
+also pass a noise floor of 0.5 ms or a quarter of the baseline value,
+whichever is smaller: sub-millisecond metrics like the frame CPU p95 are
+flagged by default once they slow down by more than 25%.
+
+    python benchmark.py --out bench.json
+    python benchmark.py --baseline bench.json --out bench_new.json
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from animation import sphere_motion, slideshow_state
+from frame_cache import FrameCache, warm_cache
+from image_decode import decode_photo
+from image_pipeline import prepare_photo, orient_and_resize, frame_pixels, EXIF_ORIENTATION
+from lens_tables import SHADER_MATHS
+from prefetch import PhotoPrefetcher
+
+DEFAULT_CORPUS_DIR = os.path.join(os.path.expanduser("~"), ".crystal_ball_cache", "bench_corpus")
+
+# (name, width, height, EXIF orientation); the extension picks the format
+CORPUS = [
+    ("landscape_12mp.jpg", 4000, 3000, 1),
+    ("portrait_rot90_12mp.jpg", 4000, 3000, 6),
+    ("upside_down_8mp.jpg", 3264, 2448, 3),
+    ("portrait_rot270_8mp.jpg", 3264, 2448, 8),
+    ("mirrored_transpose_8mp.jpg", 2448, 3264, 5),
+    ("panorama_36mp.jpg", 12000, 3000, 1),
+    ("tall_9mp.jpg", 1500, 6000, 1),
+    ("small_vga.jpg", 640, 480, 1),
+    ("landscape_12mp.png", 4000, 3000, 1),
+    ("square_4mp.png", 2000, 2000, 6),
+    ("rgba_4mp.png", 2400, 1600, 1),
+]
+
+STAGES = ("decode", "resize", "array", "upload")
+RENDER_CONFIGS = ("single", "pooled", "cached")
+
+# Differences smaller than this are noise, whatever the ratio; metrics of a few
+# tenths of a millisecond use the smaller relative floor instead, or they would never be flagged
+NOISE_FLOOR_MS = 0.5
+NOISE_FLOOR_FRACTION = 0.25
+
+
+def synthetic_pixels(width, height, seed, alpha=False):
+    """Gradients plus noise: compresses like a photo rather than a flat fill"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    channels = [
+        127 + 100 * np.sin(x / width * 6.3 + seed),
+        127 + 100 * np.cos(y / height * 4.1 + seed),
+        127 + 100 * np.sin((x + y) / (width + height) * 9.7),
+    ]
+    if alpha:
+        channels.append(200 + 55 * np.cos(x / width * 3.1))
+    pixels = np.stack(channels, axis=2)
+    pixels += rng.normal(0, 12, pixels.shape).astype(np.float32)
+    return np.clip(pixels, 0, 255).astype(np.uint8)
+
+
+def make_corpus(directory=DEFAULT_CORPUS_DIR, scale=1.0):
+    """Write the synthetic corpus (skipping files already there); returns the photo paths"""
+    directory = os.path.join(directory, f"scale_{scale:g}")
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for seed, (name, width, height, orientation) in enumerate(CORPUS):
+        path = os.path.join(directory, name)
+        paths.append(path)
+        if os.path.exists(path):
+            continue
+        width, height = max(16, int(width * scale)), max(16, int(height * scale))
+        alpha = name.startswith("rgba")
+        img = Image.fromarray(synthetic_pixels(width, height, seed, alpha), "RGBA" if alpha else "RGB")
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION] = orientation
+        tmp = path + ".tmp"
+        if name.endswith(".jpg"):
+            img.save(tmp, "JPEG", quality=90, exif=exif.tobytes())
+        else:
+            img.save(tmp, "PNG", exif=exif.tobytes())
+        os.replace(tmp, path)
+        print(f"[BENCH] Generated {name} ({width}x{height}, orientation {orientation})")
+    return paths
+
+
+def summarize(samples_ms):
+    """mean/p50/p95/min/max of a list of millisecond timings"""
+    values = np.array(samples_ms, dtype=float)
+    p50, p95, p99 = np.percentile(values, (50, 95, 99))
+    return {"mean": round(float(values.mean()), 3), "p50": round(float(p50), 3),
+            "p95": round(float(p95), 3), "p99": round(float(p99), 3),
+            "min": round(float(values.min()), 3), "max": round(float(values.max()), 3)}
+
+
+class GLUploadTarget:
+    """Hidden GL context with a texture pool, for timing uploads"""
+
+    def __init__(self, width, height):
+        import pygame
+        from texture_pool import TexturePool
+
+        pygame.display.init()
+        pygame.display.set_mode((64, 64), pygame.OPENGL | pygame.HIDDEN)
+        self.pool = TexturePool(width, height, count=1)
+        self.texture = self.pool.textures[0]
+
+    def upload(self, pixels):
+        from OpenGL.GL import glFinish
+
+        self.texture = self.pool.upload(self.texture, pixels)
+        glFinish()  # Time the transfer, not just queuing it
+
+    def close(self):
+        import pygame
+
+        self.pool.delete()
+        pygame.display.quit()
+
+
+def bench_stages(photo_paths, screen_width, screen_height, repeat=3, gl_upload=True):
+    """Time each preparation stage per photo; returns ({photo: {stage: ms}}, {stage: summary})"""
+    upload_target = None
+    if gl_upload:
+        try:
+            upload_target = GLUploadTarget(screen_width, screen_height)
+        except Exception as e:
+            print(f"[BENCH] No GL context, upload stage skipped: {e}")
+
+    per_photo = {}
+    samples = {stage: [] for stage in STAGES}
+    try:
+        for path in photo_paths:
+            runs = {stage: [] for stage in STAGES}
+            for _ in range(repeat):
+                timings = {}
+                start = time.perf_counter()
+                img = decode_photo(path, screen_width, screen_height)
+                timings["decode"] = time.perf_counter() - start
+
+                start = time.perf_counter()
+                resized = orient_and_resize(img, screen_width, screen_height)
+                timings["resize"] = time.perf_counter() - start
+
+                start = time.perf_counter()
+                pixels = frame_pixels(resized)
+                timings["array"] = time.perf_counter() - start
+
+                if upload_target is not None:
+                    start = time.perf_counter()
+                    upload_target.upload(pixels)
+                    timings["upload"] = time.perf_counter() - start
+                img.close()
+
+                for stage, seconds in timings.items():
+                    runs[stage].append(seconds * 1000)
+            # Best of the repeats per photo: the least disturbed run
+            per_photo[os.path.basename(path)] = {stage: round(min(ms), 3) for stage, ms in runs.items() if ms}
+            for stage, ms in runs.items():
+                if ms:
+                    samples[stage].append(min(ms))
+    finally:
+        if upload_target is not None:
+            upload_target.close()
+    return per_photo, {stage: summarize(ms) for stage, ms in samples.items() if ms}
+
+
+def bench_render_loop(photo_paths, width, height, config, renderer="cpu", frames=60, change_every=10,
+                      workers=2, cache_dir=None, fps=60, shader_math="lut"):
+    """Frame times of a headless slideshow loop loading photos the way `config` says"""
+    from export_video import RENDERERS
+
+    frame_cache = None
+    if config == "cached":
+        frame_cache = FrameCache(cache_dir, 1 << 40)
+        warm_cache(frame_cache, photo_paths, width, height, workers)
+    prefetcher = None
+    if config in ("pooled", "cached"):
+        prefetcher = PhotoPrefetcher(photo_paths, width, height, depth=1, workers=workers,
+                                     frame_cache=frame_cache)
+
+    display_time = change_every / fps
+    frame_renderer = RENDERERS[renderer](width, height, shader_math=shader_math)
+    frame_times = []
+    load_times = []
+    bound = None
+    photos = {}
+    try:
+        for frame_number in range(frames):
+            start = time.perf_counter()
+            outgoing, incoming, crossfade = slideshow_state(frame_number / fps, len(photo_paths),
+                                                            display_time, display_time / 2)
+            if (outgoing, incoming) != bound:
+                load_start = time.perf_counter()
+                if prefetcher is not None:
+                    prefetcher.update(incoming)
+                    photos = {i: photos.get(i) if i in photos else prefetcher.get(i)
+                              for i in (outgoing, incoming)}
+                else:
+                    photos = {i: photos.get(i) if i in photos else prepare_photo(photo_paths[i], width, height)
+                              for i in (outgoing, incoming)}
+                frame_renderer.set_photos(photos[outgoing], photos[incoming])
+                bound = (outgoing, incoming)
+                load_times.append((time.perf_counter() - load_start) * 1000)
+            center_x, center_y, radius, strength = sphere_motion(frame_number / fps, width, height)
+            frame_renderer.render({"crossfade": crossfade, "sphere_center": [center_x, center_y],
+                                   "sphere_radius": radius, "strength": strength}, frame_number)
+            frame_times.append((time.perf_counter() - start) * 1000)
+        frame_renderer.finish()
+    finally:
+        frame_renderer.close()
+        if prefetcher is not None:
+            prefetcher.shutdown()
+
+    result = {"frame_ms": summarize(frame_times), "photo_load_ms": summarize(load_times),
+              "fps": round(1000 * len(frame_times) / sum(frame_times), 2)}
+    return result
+
+
+def bench_frame_cpu(width, height, frames=300, render_path="bounded", shader_math="lut"):
+    """CPU milliseconds to issue one frame's GL work, cycling through dissolves and steady frames"""
+    import pygame
+    from OpenGL.GL import glClear, glFinish, GL_COLOR_BUFFER_BIT
+    from lens_renderer import LensRenderer
+    from texture_pool import TexturePool
+
+    pygame.display.init()
+    pygame.display.set_mode((width, height), pygame.OPENGL | pygame.HIDDEN)
+    pool = TexturePool(width, height)
+    # Four channels, laid out like a prepared RGBX frame
+    texture1 = pool.upload(pool.acquire(), synthetic_pixels(width * 3 // 4, height, 1, alpha=True))
+    texture2 = pool.upload(pool.acquire(in_use=(texture1,)), synthetic_pixels(width, height * 3 // 4, 2, alpha=True))
+    renderer = LensRenderer(width, height, render_path, shader_math)
+    renderer.set_placement(*pool.placement(texture1), *pool.placement(texture2))
+    samples = []
+    try:
+        for frame_number in range(frames):
+            crossfade = min(1.0, (frame_number % 120) / 60)
+            shown = (texture1, texture2) if crossfade < 1.0 else (texture2, texture2)
+            start = time.perf_counter()
+            center_x, center_y, radius, strength = sphere_motion(frame_number / 60, width, height)
+            glClear(GL_COLOR_BUFFER_BIT)
+            renderer.draw(*shown, crossfade, (center_x, center_y), radius, strength)
+            samples.append((time.perf_counter() - start) * 1000)
+            glFinish()  # Outside the timing, so only the CPU side is measured
+    finally:
+        renderer.delete()
+        pool.delete()
+        pygame.display.quit()
+    return summarize(samples)
+
+
+def flatten_metrics(results):
+    """Flat {name: ms} map of everything comparable between runs"""
+    metrics = {}
+    for stage, summary in results["stages"].items():
+        metrics[f"stage.{stage}.mean_ms"] = summary["mean"]
+        metrics[f"stage.{stage}.p95_ms"] = summary["p95"]
+    for name, run in results["render"].items():
+        for key in ("p50", "p95", "p99"):
+            metrics[f"render.{name}.frame_{key}_ms"] = run["frame_ms"][key]
+        metrics[f"render.{name}.photo_load_max_ms"] = run["photo_load_ms"]["max"]
+    if "frame_cpu" in results:
+        metrics["frame_cpu.p50_ms"] = results["frame_cpu"]["p50"]
+        metrics["frame_cpu.p95_ms"] = results["frame_cpu"]["p95"]
+    return metrics
+
+
+def compare(results, baseline, threshold=0.10):
+    """Metrics that got slower than the baseline by more than threshold (and the noise floor)"""
+    regressions = []
+    for name, value in results["metrics"].items():
+        before = baseline.get("metrics", {}).get(name)
+        if before is None:
+            continue
+        change = (value - before) / before if before else 0.0
+        noise_floor = min(NOISE_FLOOR_MS, NOISE_FLOOR_FRACTION * before)
+        status = "ok"
+        if change > threshold and value - before > noise_floor:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif change < -threshold and before - value > noise_floor:
+            status = "faster"
+        print(f"[BENCH] {status:>10} {name}: {before:.3f} -> {value:.3f} ms ({change * 100:+.1f}%)")
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the photo pipeline and render loop")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR, help="Where the synthetic corpus is kept")
+    parser.add_argument("--corpus-scale", type=float, default=1.0,
+                        help="Scale the corpus resolutions (e.g. 0.25 for a quick run)")
+    parser.add_argument("--screen", default="1920x1080", help="Target screen for the stage timings")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per photo; the best is kept")
+    parser.add_argument("--no-gl", action="store_true", help="Skip the GL upload stage")
+    parser.add_argument("--render-sizes", default="640x360,1280x720",
+                        help="Comma-separated render loop resolutions")
+    parser.add_argument("--renderer", choices=["cpu", "gl"], default="cpu", help="Render loop renderer")
+    parser.add_argument("--shader-math", choices=SHADER_MATHS, default="lut",
+                        help="Render loop shader math: analytic or lookup tables (default: lut)")
+    parser.add_argument("--frames", type=int, default=60, help="Frames per render loop run")
+    parser.add_argument("--change-every", type=int, default=10, help="Frames between photo changes")
+    parser.add_argument("--workers", type=int, default=2, help="Prefetch pool size for pooled/cached")
+    parser.add_argument("--out", default="benchmark.json", help="JSON results file")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown reported as a regression (default: 0.10)")
+    parser.add_argument("--frame-cpu-budget-ms", type=float,
+                        help="Also fail when issuing a frame takes longer than this at p95, baseline "
+                             "or not (default: off; against a baseline a slowdown over 25%% is flagged)")
+    parser.add_argument("--verbose", action="store_true", help="Show pipeline log lines while timing")
+
+    args = parser.parse_args()
+    if not args.no_gl:
+        import OpenGL
+        OpenGL.ERROR_CHECKING = False  # As the demo runs; must be set before OpenGL.GL is imported
+    screen_width, screen_height = (int(n) for n in args.screen.lower().split("x"))
+    photo_paths = make_corpus(args.corpus_dir, args.corpus_scale)
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+
+    results = {
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": sys.version.split()[0],
+        "recorded": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"screen": args.screen, "corpus_scale": args.corpus_scale, "repeat": args.repeat,
+                   "renderer": args.renderer, "shader_math": args.shader_math, "frames": args.frames,
+                   "change_every": args.change_every, "workers": args.workers},
+        "render": {},
+    }
+
+    print(f"[BENCH] Stage timings for {len(photo_paths)} photos at {args.screen}")
+    with quiet:
+        results["per_photo"], results["stages"] = bench_stages(
+            photo_paths, screen_width, screen_height, args.repeat, gl_upload=not args.no_gl)
+    for stage, summary in results["stages"].items():
+        print(f"[BENCH] {stage:<15} mean {summary['mean']:8.2f} ms   p95 {summary['p95']:8.2f} ms")
+
+    cache_dir = tempfile.mkdtemp(prefix="bench_cache_")
+    try:
+        for size in args.render_sizes.split(","):
+            width, height = (int(n) for n in size.lower().split("x"))
+            for config in RENDER_CONFIGS:
+                name = f"{args.renderer}.{config}.{width}x{height}"
+                with quiet:
+                    run = bench_render_loop(photo_paths, width, height, config, args.renderer,
+                                            args.frames, args.change_every, args.workers, cache_dir,
+                                            shader_math=args.shader_math)
+                results["render"][name] = run
+                print(f"[BENCH] {name:<28} {run['fps']:7.2f} fps   p95 {run['frame_ms']['p95']:8.2f} ms   "
+                      f"worst photo load {run['photo_load_ms']['max']:8.2f} ms")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    over_budget = False
+    if not args.no_gl:
+        # Issuing a frame costs about the same at any size; the smallest render size keeps the GPU side short
+        width, height = (int(n) for n in args.render_sizes.split(",")[0].lower().split("x"))
+        with quiet:
+            results["frame_cpu"] = bench_frame_cpu(width, height, shader_math=args.shader_math)
+        budget_text = ""
+        if args.frame_cpu_budget_ms:
+            over_budget = results["frame_cpu"]["p95"] > args.frame_cpu_budget_ms
+            budget_text = f"   budget {args.frame_cpu_budget_ms:.3f} ms{'   OVER BUDGET' if over_budget else ''}"
+        print(f"[BENCH] frame CPU p50 {results['frame_cpu']['p50']:.3f} ms   "
+              f"p95 {results['frame_cpu']['p95']:.3f} ms{budget_text}")
+
+    results["metrics"] = flatten_metrics(results)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != results["config"]:
+            print(f"[BENCH] Warning: baseline config differs: {baseline.get('config')}")
+        regressions = compare(results, baseline, args.threshold)
+        results["baseline"] = {"path": args.baseline, "regressions": regressions}
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[BENCH] Results written to {args.out}")
+    if regressions:
+        print(f"[BENCH] {len(regressions)} regression(s) over {args.threshold * 100:.0f}%")
+    if regressions or over_budget:
+        sys.exit(1)
@@ -1,49 +1,237 @@
-import screen_brightness_control as sbc
+import math
+import os
 import time
 import threading
 import subprocess
 import sys
 
+# "hardware" fades the monitor, "shader" dims the demo's own output with no device
+# I/O, "hybrid" dims in the shader and switches the backlight off while the picture is black
+BRIGHTNESS_BACKENDS = ("hardware", "shader", "hybrid")
+
+# Floor for the fade tick; slower devices are ticked at their measured write latency
+FADE_TICK = 0.02
+
+# Hybrid backend: shader levels (percent) dark enough that switching the backlight off is
+# invisible, and the level that switches it back on. The gap keeps it from toggling at the edge
+HYBRID_BACKLIGHT_OFF_BELOW = 0.5
+HYBRID_BACKLIGHT_ON_ABOVE = 1.0
+
+# Seconds the picture has to stay dark before the backlight goes off. A fade that only touches
+# black (like the 100 -> 0 -> 100 cycle) keeps it on, so a slow "off" write can never land
+# after the shader has started brightening again
+HYBRID_BACKLIGHT_OFF_AFTER = 0.5
+
+# Weight of the newest write in the running device latency estimate
+LATENCY_SMOOTHING = 0.3
+
+
 class BrightnessController:
-    """API for controlling screen brightness"""
+    """API for controlling screen brightness.
+
+    Writes over DDC/CI or WMI can take tens to hundreds of milliseconds, so
+    fades go through an asynchronous writer: request_brightness() drops the
+    value into a single pending slot and returns at once, and a background
+    thread writes whatever is newest when the device is ready for it. Stale
+    intermediate values are overwritten rather than queued, unchanged values
+    are never written, and writes are spaced by the measured device latency.
+    The level last written is cached, so nothing re-queries the device.
+
+    With the "shader" and "hybrid" backends the level is instead read back
+    once per frame through shader_brightness() and applied by the lens
+    shaders' dimming stage (see dimming.py).
+    """
     
-    def __init__(self):
-        self.original_brightness = self.get_brightness()
-        print(f"[BRIGHTNESS] Original brightness: {self.original_brightness}%")
+    def __init__(self, backend="hardware"):
+        if backend not in BRIGHTNESS_BACKENDS:
+            raise ValueError(f"Unknown brightness backend {backend!r}")
+        self.backend = backend
+        # The shader backend never touches the monitor, so its "original" is undimmed output
+        self.original_brightness = 100 if backend == "shader" else self.get_brightness()
+        self.level = self.original_brightness  # Last level known to be on the device
+        # Last level asked for; the dimming stage renders it unless the monitor does the fading
+        self.shader_level = float(self.original_brightness) if backend == "hardware" else 100.0
+        self.latency = 0.0  # Smoothed seconds per device write
+        self.writes = 0
+        self.skipped = 0
+        self.dropped = 0
+        self._pending = None
+        self._writing = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._device_lock = threading.Lock()
+        self._writer = None
+        self._dark_since = None  # Hybrid: when the level last went below the "off" threshold
+        self._backlight_off = False
+        print(f"[BRIGHTNESS] {backend} backend, original brightness: {self.original_brightness}%")
     
     def get_brightness(self):
-        """Get current brightness (0-100)"""
+        """Get current brightness (0-100) from the device"""
         try:
+            # Deferred: the shader backend runs without screen_brightness_control installed
+            import screen_brightness_control as sbc
             return sbc.get_brightness()[0]  # Returns list, take first monitor
         except Exception as e:
             print(f"[BRIGHTNESS] Error getting brightness: {e}")
             return 100
     
-    def set_brightness(self, level):
-        """Set brightness (0-100)"""
-        try:
-            level = max(0, min(100, level))  # Clamp to 0-100
-            sbc.set_brightness(level)
+    def _write(self, level):
+        """Write to the device unless it already shows `level`; True on success"""
+        with self._device_lock:
+            if level == self.level:
+                self.skipped += 1
+                return True
+            start = time.perf_counter()
+            try:
+                import screen_brightness_control as sbc
+                sbc.set_brightness(level)
+            except Exception as e:
+                self.level = None  # Unknown now, so the next write is never skipped
+                print(f"[BRIGHTNESS] Error setting brightness: {e}")
+                return False
+            elapsed = time.perf_counter() - start
+            self.latency = elapsed if not self.writes else (
+                self.latency + LATENCY_SMOOTHING * (elapsed - self.latency))
+            self.writes += 1
+            self.level = level
             return True
-        except Exception as e:
-            print(f"[BRIGHTNESS] Error setting brightness: {e}")
-            return False
-    
-    def fade_to(self, target, duration=1.0, steps=10):
-        """Smoothly fade to target brightness"""
-        current = self.get_brightness()
-        step_size = (target - current) / steps
-        step_duration = duration / steps
-        
-        for i in range(steps):
-            new_level = current + (step_size * (i + 1))
-            self.set_brightness(int(new_level))
-            time.sleep(step_duration)
+    
+    def _device_level(self, level):
+        """Level the monitor should be at for `level`, or None to leave it alone"""
+        if self.backend == "hardware":
+            return int(round(self._clamp(level)))  # int() raises on NaN and infinity
+        if self.backend == "hybrid":
+            # Backlight off only once the shader has held the picture black for a while, back
+            # on as soon as it brightens past the band; inside the band it stays as it is
+            if level >= HYBRID_BACKLIGHT_ON_ABOVE:
+                self._dark_since = None
+                self._backlight_off = False
+            elif level < HYBRID_BACKLIGHT_OFF_BELOW:
+                now = time.perf_counter()
+                if self._dark_since is None:
+                    self._dark_since = now
+                if now - self._dark_since >= HYBRID_BACKLIGHT_OFF_AFTER:
+                    self._backlight_off = True
+            else:
+                self._dark_since = None
+            return 0 if self._backlight_off else self.original_brightness
+        return None
+    
+    def _clamp(self, level):
+        """`level` within 0-100; NaN keeps the last level rather than reaching the device"""
+        level = float(level)
+        if math.isnan(level):
+            return self.shader_level
+        return max(0.0, min(100.0, level))
+    
+    def set_brightness(self, level):
+        """Set brightness (0-100), blocking until the device has it"""
+        self.shader_level = self._clamp(level)
+        device_level = self._device_level(self.shader_level)
+        return True if device_level is None else self._write(device_level)
+    
+    def request_brightness(self, level):
+        """Set brightness (0-100) without blocking; device writes go to the background writer"""
+        self.shader_level = self._clamp(level)
+        device_level = self._device_level(self.shader_level)
+        if device_level is None:
+            return
+        with self._condition:
+            if device_level == (self.level if self._pending is None else self._pending):
+                self.skipped += 1  # Already there, or already on its way
+                return
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+                self._writer.start()
+            if self._pending is not None:
+                self.dropped += 1  # Never reached the device; the newest value wins
+            self._pending = device_level
+            self._condition.notify_all()
+    
+    def _writer_loop(self):
+        next_write = 0.0
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+            # Rate limit: let the device finish before handing it the next value
+            delay = next_write - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            with self._condition:
+                level, self._pending = self._pending, None
+                if level is None:
+                    continue
+                self._writing = True
+            start = time.perf_counter()
+            self._write(level)
+            next_write = start + self.latency
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+    
+    def flush(self, timeout=None):
+        """Wait until the pending value has been written; False on timeout"""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._pending is None and not self._writing, timeout)
+    
+    def close(self):
+        """Drop any pending value and stop the background writer"""
+        with self._condition:
+            if self._pending is not None:
+                self.dropped += 1
+                self._pending = None
+            self._closed = True
+            self._condition.notify_all()
+        if self._writer is not None and self._writer is not threading.current_thread():
+            self._writer.join(timeout=2)
+    
+    def fade_to(self, target, duration=1.0, stop=None):
+        """Smoothly fade to target brightness over `duration` seconds.
+
+        Levels come from a monotonic clock, so the fade ends on schedule
+        however slow the device is; the writer just skips levels it cannot
+        keep up with. Returns False if `stop` (a threading.Event) was set.
+        """
+        start_level = self.shader_level
+        start = time.perf_counter()
+        while True:
+            progress = min(1.0, (time.perf_counter() - start) / duration) if duration > 0 else 1.0
+            self.request_brightness(start_level + (target - start_level) * progress)
+            if progress >= 1.0:
+                return True
+            tick = max(FADE_TICK, self.latency)
+            if stop is not None:
+                if stop.wait(tick):
+                    return False
+            else:
+                time.sleep(tick)
+    
+    def shader_brightness(self):
+        """Share of full display light (0-1) the renderer's dimming stage should output"""
+        return 1.0 if self.backend == "hardware" else self.shader_level / 100.0
+    
+    def stats(self):
+        """Device writes, values skipped as unchanged or dropped as stale, and write latency"""
+        return {
+            "backend": self.backend,
+            "level": self.level,
+            "shader_level": round(self.shader_level, 1),
+            "writes": self.writes,
+            "skipped_unchanged": self.skipped,
+            "dropped_stale": self.dropped,
+            "latency_ms": round(self.latency * 1000, 1),
+        }
         
     def restore(self):
         """Restore original brightness"""
+        self.close()
         print(f"[BRIGHTNESS] Restoring to {self.original_brightness}%")
-        self.set_brightness(self.original_brightness)
+        # Undimmed output, and the monitor back where it started
+        self.set_brightness(self.original_brightness if self.backend == "hardware" else 100)
 
 def brightness_cycle_test():
     """
@@ -65,35 +253,35 @@ def brightness_cycle_test():
             cycle_count += 1
             print(f"\n[CYCLE {cycle_count}] Dimming to BLACK...")
             
-            # Fast fade to BLACK
-            for current in range(100, -1, -1):
-                controller.set_brightness(current)
-                print(f"[BRIGHTNESS] {current}%", end="\r")
-                time.sleep(0.05)  # 50ms = FAST!
-            
-            # Ensure absolute BLACK
-            controller.set_brightness(0)
+            # Fast fade to BLACK, 5 seconds by the clock however slow the display is
+            controller.fade_to(0, duration=5.0)
+            controller.flush()  # Ensure absolute BLACK
+            print(f"[BRIGHTNESS] {controller.level}% {controller.stats()}")
             
-            print(f"\n[CYCLE {cycle_count}] Brightening from BLACK...")
+            print(f"[CYCLE {cycle_count}] Brightening from BLACK...")
             
             # Fast fade from BLACK
-            for current in range(0, 101):
-                controller.set_brightness(current)
-                print(f"[BRIGHTNESS] {current}%", end="\r")
-                time.sleep(0.05)  # 50ms = FAST!
-            
-            print()  # New line after cycle
+            controller.fade_to(100, duration=5.0)
+            controller.flush()
+            print(f"[BRIGHTNESS] {controller.level}% {controller.stats()}")
         
     except KeyboardInterrupt:
         print("\n[INTERRUPTED] Stopping brightness cycle...")
     finally:
         controller.restore()
 
-def run_demo_with_brightness():
+def run_demo_with_brightness(backend="hardware", control_port=None):
     """
     Launch the crystal ball demo and run SMOOTH brightness cycle in background thread
+
+    A demo already listening on `control_port` is reused rather than started
+    again; otherwise one is started with its control channel on. With the
+    "shader" or "hybrid" backend the demo runs the cycle itself, evaluated
+    once per frame in its render loop, so the fade is frame-accurate and
+    nothing here touches the monitor. `control_port` defaults to the
+    control server's own port.
     """
-    controller = BrightnessController()
+    controller = BrightnessController() if backend == "hardware" else None
     stop_brightness = threading.Event()
     
     def brightness_worker():
@@ -105,35 +293,19 @@ def run_demo_with_brightness():
                 cycle += 1
                 print(f"\n[BRIGHTNESS] === CYCLE {cycle} === Dimming to BLACK...")
                 
-                # PHASE 1: Fast fade to BLACK (0%)
-                for current in range(100, -1, -1):
-                    if stop_brightness.is_set():
-                        break
-                    result = controller.set_brightness(current)
-                    if current % 20 == 0:  # Debug every 20%
-                        actual = controller.get_brightness()
-                        print(f"[BRIGHTNESS] Set:{current}% Actual:{actual}% OK:{result}")
-                    time.sleep(0.05)  # 50ms per step = 5 second fade
-                
-                controller.set_brightness(0)
-                print(f"[BRIGHTNESS] === DARKEST === 0%")
-                
-                if stop_brightness.is_set():
+                # PHASE 1: Fast fade to BLACK (0%), 5 seconds on the monotonic clock
+                if not controller.fade_to(0, duration=5.0, stop=stop_brightness):
                     break
+                controller.flush(timeout=1.0)
+                print(f"[BRIGHTNESS] === DARKEST === {controller.level}% {controller.stats()}")
                 
                 print(f"[BRIGHTNESS] === CYCLE {cycle} === Brightening from BLACK...")
                 
                 # PHASE 2: Fast fade from black to bright
-                for current in range(0, 101):
-                    if stop_brightness.is_set():
-                        break
-                    result = controller.set_brightness(current)
-                    if current % 20 == 0:  # Debug every 20%
-                        actual = controller.get_brightness()
-                        print(f"[BRIGHTNESS] Set:{current}% Actual:{actual}% OK:{result}")
-                    time.sleep(0.05)  # 50ms per step = 5 second fade
-                
-                print(f"[BRIGHTNESS] === BRIGHTEST === 100%")
+                if not controller.fade_to(100, duration=5.0, stop=stop_brightness):
+                    break
+                controller.flush(timeout=1.0)
+                print(f"[BRIGHTNESS] === BRIGHTEST === {controller.level}% {controller.stats()}")
                 # Loop immediately
                 
         except Exception as e:
@@ -151,35 +323,71 @@ def run_demo_with_brightness():
     print("Press ESC in demo window to exit")
     print("="*60 + "\n")
     
-    # Start brightness thread
-    brightness_thread = threading.Thread(target=brightness_worker, daemon=True)
-    brightness_thread.start()
-    print("[BRIGHTNESS] Smooth animation thread started")
+    # Deferred: the demo imports this module for its shader dimming, which needs no socket code
+    from control_server import connect, DEFAULT_CONTROL_PORT
     
-    # Start demo in subprocess
-    demo_process = subprocess.Popen(
-        [sys.executable, "crystal_ball_demo.py"],
-        cwd="C:\\code\\demoscene-crystal-ball"
-    )
+    if control_port is None:
+        control_port = DEFAULT_CONTROL_PORT
+    # Drive a demo that is already running, or start one we can talk to
+    demo_process = None
+    client = connect(control_port)
+    if client is not None:
+        print(f"[DEMO] Attached to the demo running on port {control_port}")
+    else:
+        demo_process = subprocess.Popen(
+            [sys.executable, "crystal_ball_demo.py", "--control-port", str(control_port)],
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        print(f"[DEMO] Started with PID: {demo_process.pid}")
+        client = connect(control_port, wait=60, process=demo_process)
+        if client is None:
+            print("[DEMO] No control channel; brightness only")
     
-    print(f"[DEMO] Started with PID: {demo_process.pid}")
+    # Start brightness thread
+    brightness_thread = None
+    if controller is not None:
+        brightness_thread = threading.Thread(target=brightness_worker, daemon=True)
+        brightness_thread.start()
+        print("[BRIGHTNESS] Smooth animation thread started")
+    elif client is not None:
+        # The demo dims its own output every frame, in step with its crossfade
+        print(f"[BRIGHTNESS] {client.send('brightness', backend=backend, cycle=5)}")
     
     try:
-        # Wait for demo to finish
-        demo_process.wait()
+        if demo_process is not None:
+            # Wait for demo to finish
+            demo_process.wait()
+        else:
+            # Until the attached demo exits (or CTRL+C leaves it running)
+            while client.send("ping").get("ok"):
+                time.sleep(1)
         
     except KeyboardInterrupt:
         print("\n[INTERRUPTED] Stopping...")
-        demo_process.terminate()
+        
+    except (OSError, ValueError):
+        print("[DEMO] Control connection closed")
         
     finally:
         # CRITICAL: Stop brightness thread and restore
         print("[CLEANUP] Stopping brightness control...")
         stop_brightness.set()
-        brightness_thread.join(timeout=2)
+        if brightness_thread is not None:
+            brightness_thread.join(timeout=2)
+        
+        if client is not None:
+            try:
+                if demo_process is None:
+                    client.send("brightness", cycle=0, level=100)  # Leave the attached demo undimmed
+                elif demo_process.poll() is None:
+                    client.send("quit")  # Clean exit: the demo restores brightness and writes its stats
+                    demo_process.wait(timeout=3)
+            except (OSError, ValueError, subprocess.TimeoutExpired):
+                pass
+            client.close()
         
         # Ensure demo is dead
-        if demo_process.poll() is None:
+        if demo_process is not None and demo_process.poll() is None:
             print("[CLEANUP] Terminating demo...")
             demo_process.terminate()
             try:
@@ -188,22 +396,28 @@ def run_demo_with_brightness():
                 demo_process.kill()
         
         # Final restore
-        controller.restore()
+        if controller is not None:
+            controller.restore()
         print("[COMPLETE] Demo and brightness control stopped. Brightness restored.")
 
 if __name__ == "__main__":
     import argparse
+    from control_server import DEFAULT_CONTROL_PORT
     
     parser = argparse.ArgumentParser(description="Brightness control for demoscene demo")
     parser.add_argument("--test-only", action="store_true", 
                        help="Run brightness cycle test without demo")
     parser.add_argument("--with-demo", action="store_true",
                        help="Run demo with brightness cycle")
+    parser.add_argument("--backend", choices=BRIGHTNESS_BACKENDS, default="hardware",
+                       help="Fade the monitor, the demo's shader output, or both (default: hardware)")
+    parser.add_argument("--control-port", type=int, default=DEFAULT_CONTROL_PORT,
+                       help=f"Port of the demo's control channel (default: {DEFAULT_CONTROL_PORT})")
     
     args = parser.parse_args()
     
     if args.with_demo:
-        run_demo_with_brightness()
+        run_demo_with_brightness(args.backend, args.control_port)
     elif args.test_only:
         brightness_cycle_test()
     else:
@@ -218,6 +432,6 @@ if __name__ == "__main__":
         if choice == "1":
             brightness_cycle_test()
         elif choice == "2":
-            run_demo_with_brightness()
+            run_demo_with_brightness(args.backend, args.control_port)
         else:
             print("Exiting.")
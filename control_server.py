@@ -0,0 +1,280 @@
+"""
+Local control channel for a running demo.
+
+The launcher used to start the demo as a subprocess it could only kill, so
+every change of photo, brightness or parameters meant a restart with a new
+interpreter, GL context and shader compile. With --control-port the demo
+serves newline-delimited JSON on localhost instead:
+
+    {"cmd": "next"}                        -> {"ok": true, "photo": 4, ...}
+    {"cmd": "goto", "photo": 12}           (an index or a path)
+    {"cmd": "brightness", "cycle": 5}      (or "level" with an optional "duration")
+    {"cmd": "stats"}
+
+The server runs an asyncio loop on its own thread and only queues
+commands; the render loop picks them up once per frame with poll() and
+answers through the reply callback, so all demo state stays on the render
+thread. A wake callback (the demo posts a pygame event) cuts idle waits
+short, so a command is answered within a frame; "ping" is answered by the
+server thread at once.
+
+ControlClient keeps one connection open for scripts that send many
+commands; `python control_server.py next` sends one from the shell.
+"""
+
+import asyncio
+from functools import partial
+import json
+import math
+import queue
+import socket
+import threading
+import time
+
+DEFAULT_CONTROL_HOST = "127.0.0.1"
+DEFAULT_CONTROL_PORT = 47215
+
+COMMANDS = ("ping", "next", "prev", "goto", "pause", "set", "brightness", "stats", "quit")
+
+# Longest a client waits for the render loop to answer
+REPLY_TIMEOUT = 5.0
+
+# Parameters "set" can change, with the lowest value each accepts. The render loop
+# divides by both durations; an ambient rate of 0 turns that tier off, as on the command line
+SETTINGS = {"photo_display_time": "above 0", "crossfade_duration": "above 0",
+            "ambient_fps": "0 or more", "show_stats": None}
+
+# Arguments of a "brightness" command; the level is clamped rather than refused
+BRIGHTNESS_ARGS = {"level": "0 to 100", "duration": "0 or more", "cycle": "0 or more", "backend": None}
+
+
+def parse_settings(args):
+    """Checked values of a "set" command; ValueError names the first bad one"""
+    values = {}
+    for name, value in args.items():
+        if name not in SETTINGS:
+            raise ValueError(f"unknown parameter {name!r}")
+        allowed = SETTINGS[name]
+        values[name] = bool(value) if allowed is None else _number(name, value, allowed)
+    return values
+
+
+def parse_brightness(args):
+    """Checked arguments of a "brightness" command; ValueError names the first bad one"""
+    values = {}
+    for name, value in args.items():
+        if name not in BRIGHTNESS_ARGS:
+            raise ValueError(f"unknown parameter {name!r}")
+        allowed = BRIGHTNESS_ARGS[name]
+        if allowed is None:
+            values[name] = str(value)
+        elif name == "level":
+            values[name] = max(0.0, min(100.0, _number(name, value, "finite")))
+        else:
+            values[name] = _number(name, value, allowed)
+    return values
+
+
+def _number(name, value, allowed):
+    value = float(value)
+    if not math.isfinite(value) or (allowed != "finite" and (
+            value < 0 or (value == 0 and allowed == "above 0"))):
+        raise ValueError(f"{name} must be {allowed}, got {value:g}")
+    return value
+
+
+def _encode(message):
+    # Stats carry NumPy scalars
+    return (json.dumps(message, default=lambda value: value.item() if hasattr(value, "item") else str(value))
+            + "\n").encode("utf-8")
+
+
+class ControlServer:
+    """JSON-lines command server on localhost, handing commands to the render thread"""
+
+    def __init__(self, port=DEFAULT_CONTROL_PORT, host=DEFAULT_CONTROL_HOST, wake=None):
+        self.host = host
+        self.port = port
+        self.wake = wake  # Called on the server thread after each command is queued
+        self.requests = queue.SimpleQueue()  # (command, args, future) for the render thread
+        self.commands = 0
+        self.errors = 0
+        self._loop = None
+        self._stopping = None
+        self._busy = 0  # Requests received but not yet answered
+        self._writers = set()
+        self._ready = threading.Event()
+        self._error = None
+        self._thread = None
+
+    def start(self):
+        """Listen in the background; False (with the reason printed) if the port is unavailable"""
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            print(f"[CONTROL] Not listening on {self.host}:{self.port}: {self._error}")
+            return False
+        print(f"[CONTROL] Listening on {self.host}:{self.port}")
+        return True
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        try:
+            server = await asyncio.start_server(self._client, self.host, self.port)
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        await self._stopping.wait()
+        server.close()
+        # Let replies already on their way (e.g. to "quit") reach their clients
+        for _ in range(100):
+            if not self._busy:
+                break
+            await asyncio.sleep(0.01)
+        for writer in list(self._writers):
+            writer.close()
+        await server.wait_closed()
+
+    async def _client(self, reader, writer):
+        self._writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self._busy += 1
+                try:
+                    writer.write(_encode(await self._handle(line)))
+                    await writer.drain()
+                finally:
+                    self._busy -= 1
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _handle(self, line):
+        try:
+            request = json.loads(line)
+            command = request.pop("cmd")
+        except (ValueError, AttributeError, KeyError, TypeError):
+            self.errors += 1
+            return {"ok": False, "error": 'expected a JSON object with a "cmd"'}
+        if command not in COMMANDS:
+            self.errors += 1
+            return {"ok": False, "error": f"unknown command {command!r}, expected one of {', '.join(COMMANDS)}"}
+        if command == "ping":
+            return {"ok": True}  # Liveness only, so no need to wait for a frame
+        future = self._loop.create_future()
+        self.requests.put((command, request, future))
+        if self.wake is not None:
+            self.wake()
+        try:
+            return await asyncio.wait_for(future, REPLY_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.errors += 1
+            return {"ok": False, "error": "the demo did not answer in time"}
+
+    def poll(self):
+        """Commands received since the last call, as (command, args, reply) for the render thread.
+
+        Call reply(**result) when a command is done, or reply(error="...")
+        when it cannot be carried out.
+        """
+        commands = []
+        while True:
+            try:
+                command, args, future = self.requests.get_nowait()
+            except queue.Empty:
+                return commands
+            self.commands += 1
+            commands.append((command, args, partial(self._reply, future)))
+
+    def _reply(self, future, error=None, **result):
+        if error is not None:
+            self.errors += 1
+            result = {"ok": False, "error": error}
+        else:
+            result = dict(result, ok=True)
+        self._loop.call_soon_threadsafe(lambda: future.done() or future.set_result(result))
+
+    def stats(self):
+        """Commands handled and requests refused or failed"""
+        return {"port": self.port, "commands": self.commands, "errors": self.errors}
+
+    def stop(self):
+        """Answer anything still queued, then close every connection and the listener"""
+        if self._stopping is None or self._error is not None:
+            return
+        for _, _, reply in self.poll():
+            reply(error="the demo is shutting down")
+        self._loop.call_soon_threadsafe(self._stopping.set)
+        self._thread.join(timeout=3)
+
+
+class ControlClient:
+    """Persistent connection to a demo's control server"""
+
+    def __init__(self, port=DEFAULT_CONTROL_PORT, host=DEFAULT_CONTROL_HOST, timeout=REPLY_TIMEOUT + 1):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Commands are tiny; send at once
+        self.replies = self.sock.makefile("rb")
+
+    def send(self, command, **args):
+        """Send one command and return the demo's reply"""
+        self.sock.sendall(_encode(dict(args, cmd=command)))
+        line = self.replies.readline()
+        if not line:
+            raise ConnectionError("the demo closed the control connection")
+        return json.loads(line)
+
+    def close(self):
+        self.replies.close()
+        self.sock.close()
+
+
+def connect(port=DEFAULT_CONTROL_PORT, host=DEFAULT_CONTROL_HOST, wait=0, process=None):
+    """ControlClient for a running demo, retrying for up to `wait` seconds; None if none answers.
+
+    With a subprocess.Popen `process`, gives up as soon as that process exits.
+    """
+    deadline = time.perf_counter() + wait
+    while True:
+        try:
+            return ControlClient(port, host)
+        except OSError:
+            if time.perf_counter() >= deadline or (process is not None and process.poll() is not None):
+                return None
+            time.sleep(0.1)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Send a command to a running crystal ball demo")
+    parser.add_argument("command", choices=COMMANDS)
+    parser.add_argument("args", nargs="*", metavar="KEY=VALUE",
+                        help="Command arguments; values are read as JSON when they parse, e.g. photo=12 cycle=5")
+    parser.add_argument("--port", type=int, default=DEFAULT_CONTROL_PORT,
+                        help=f"Control port the demo was started with (default: {DEFAULT_CONTROL_PORT})")
+    args = parser.parse_args()
+
+    command_args = {}
+    for arg in args.args:
+        key, _, value = arg.partition("=")
+        try:
+            command_args[key] = json.loads(value)
+        except ValueError:
+            command_args[key] = value
+    client = connect(args.port)
+    if client is None:
+        parser.exit(1, f"No demo is listening on port {args.port} (start it with --control-port)\n")
+    try:
+        print(json.dumps(client.send(args.command, **command_args), indent=2))
+    finally:
+        client.close()
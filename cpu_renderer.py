@@ -0,0 +1,398 @@
+"""
+Vectorized NumPy reference renderer for FRAGMENT_SHADER (lens_renderer.py).
+
+Renders exactly the math of the GLSL lens/dissolve shader - spherical
+distortion, chromatic aberration, both dissolve noise paths, the specular
+highlight, edge darkening and the dimming stage - as batched array
+operations over a whole frame, so frames can be rendered and
+regression-tested on machines without a GPU. Sampling reproduces GL_LINEAR
+with CLAMP_TO_EDGE and the shader's half-texel clamp inside each
+letterboxed photo.
+
+Frames are split into row tiles that can be rendered on a process pool.
+Photos are handed to workers as memory-mapped .npy files, so each worker
+maps them once instead of receiving a pickled copy per tile.
+
+With shader_math="lut" it samples the same noise tile and lens table as
+the GPU's "lut" shaders (lens_tables.py) instead of evaluating the
+analytic noise hash and lens curves.
+
+Compare against a GL capture (saved with F12 in the demo) with:
+    python cpu_renderer.py --capture capture_20250115_120000.json --diff diff.png
+
+Expect small differences: GPUs filter with reduced fractional precision and
+evaluate sin() on large arguments less accurately than NumPy, which moves
+individual dissolve-noise pixels. The lut noise is exact, so lut frames
+differ far less.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from image_pipeline import letterbox_rect
+from dimming import DISPLAY_GAMMA
+from lens_tables import SHADER_MATHS, NOISE_SIZE, noise_table, lens_table, strength_row
+
+F32 = np.float32
+
+# Worker-side cache of memory-mapped photos, keyed by file name
+_mapped_frames = {}
+
+# Lookup tables for shader_math="lut", built on first use in each process
+_tables = {}
+
+
+def _frame(source):
+    """Photo from an array or a .npy file (mapped once per worker process)"""
+    if not isinstance(source, str):
+        return source
+    if source not in _mapped_frames:
+        if len(_mapped_frames) >= 4:
+            _mapped_frames.pop(next(iter(_mapped_frames)))
+        _mapped_frames[source] = np.load(source, mmap_mode="r")
+    return _mapped_frames[source]
+
+
+def _same_source(a, b):
+    """Whether both texture units hold the same photo (same array or same mapped file)"""
+    return a is b or (isinstance(a, str) and a == b)
+
+
+def _fract(x):
+    return x - np.floor(x)
+
+
+def _random(x, y):
+    """GLSL random(): fract(sin(dot(st, vec2(12.9898, 78.233))) * 43758.5453123)"""
+    return _fract(np.sin(x * F32(12.9898) + y * F32(78.233)) * F32(43758.5453123))
+
+
+def _lookup_tables():
+    if not _tables:
+        _tables["noise"] = noise_table().astype(F32) / F32(255.0)
+        _tables["lens"] = lens_table()
+    return _tables["noise"], _tables["lens"]
+
+
+def _noise(noise, x, y, channel):
+    """texelFetch() of the tiling noise at integer texel coordinates"""
+    return noise[y & (NOISE_SIZE - 1), x & (NOISE_SIZE - 1), channel]
+
+
+def _lens_terms(lens, dist_sq, strength):
+    """lensTerms(): GL_LINEAR, CLAMP_TO_EDGE fetch of (distortion, edge darkening, highlight)"""
+    rows, width = lens.shape[:2]
+    x = np.clip(dist_sq, F32(0.0), F32(1.0)) * F32(width - 1)
+    y = F32(np.clip(strength_row(strength), 0.0, 1.0) * (rows - 1))
+    x0 = np.minimum(np.floor(x).astype(np.intp), width - 2)
+    y0 = min(int(y), rows - 2)
+    fx = (x - x0)[:, None]
+    fy = y - y0
+    bottom = lens[y0, x0] + (lens[y0, x0 + 1] - lens[y0, x0]) * fx
+    top = lens[y0 + 1, x0] + (lens[y0 + 1, x0 + 1] - lens[y0 + 1, x0]) * fx
+    return bottom + (top - bottom) * fy
+
+
+def _smoothstep(edge0, edge1, x):
+    t = np.clip((x - edge0) / (edge1 - edge0), F32(0.0), F32(1.0))
+    return t * t * (F32(3.0) - F32(2.0) * t)
+
+
+def _mix(a, b, t):
+    return a * (F32(1.0) - t) + b * t
+
+
+def sample_photo(frame, rect, u, v, channel=None):
+    """samplePhoto(): bilinear GL_LINEAR fetch of a letterboxed photo at screen UVs.
+
+    frame is a prepared (H, W, 4) RGBX uint8 photo, top row first, which the
+    shader flips through its texture coordinates. Returns (N, 3) floats, or
+    (N,) for a single channel, black outside the photo rectangle.
+    """
+    height, width = frame.shape[:2]
+    local_x = (u - F32(rect[0])) / F32(rect[2])
+    local_y = (v - F32(rect[1])) / F32(rect[3])
+    inside = (local_x >= 0) & (local_x <= 1) & (local_y >= 0) & (local_y <= 1)
+
+    # Texel space, clamped half a texel inside the photo like the shader
+    x = np.clip(local_x * width, F32(0.5), F32(width - 0.5)) - F32(0.5)
+    y = np.clip((F32(1.0) - local_y) * height, F32(0.5), F32(height - 0.5)) - F32(0.5)
+    x0 = np.floor(x)
+    y0 = np.floor(y)
+    fx = x - x0
+    fy = y - y0
+    x0 = x0.astype(np.intp)
+    y0 = y0.astype(np.intp)
+    x1 = np.minimum(x0 + 1, width - 1)
+    y1 = np.minimum(y0 + 1, height - 1)
+
+    channels = slice(0, 3) if channel is None else channel
+    c00 = frame[y0, x0, channels].astype(F32)
+    c10 = frame[y0, x1, channels].astype(F32)
+    c01 = frame[y1, x0, channels].astype(F32)
+    c11 = frame[y1, x1, channels].astype(F32)
+    if channel is None:
+        fx, fy, inside = fx[:, None], fy[:, None], inside[:, None]
+    row0 = c00 + (c10 - c00) * fx
+    row1 = c01 + (c11 - c01) * fx
+    return (row0 + (row1 - row0) * fy) * F32(1.0 / 255.0) * inside
+
+
+def render_tile(sources, rects, uniforms, width, height, row_start, row_end, shader_math="lut"):
+    """Shade rows [row_start, row_end) of the frame (GL row order, bottom first) as floats"""
+    frame1, frame2 = _frame(sources[0]), _frame(sources[1])
+    rect1, rect2 = rects
+    crossfade = F32(uniforms["crossfade"])
+    strength = F32(uniforms["strength"])
+
+    lut = shader_math == "lut"
+    if lut:
+        noise, lens_lut = _lookup_tables()
+
+    # fragCoord at pixel centers
+    xs = (np.arange(width, dtype=F32) + F32(0.5)) / F32(width)
+    ys = (np.arange(row_start, row_end, dtype=F32) + F32(0.5)) / F32(height)
+    u = np.tile(xs, row_end - row_start)
+    v = np.repeat(ys, width)
+
+    center_x = F32(uniforms["sphere_center"][0]) / F32(width)
+    center_y = F32(uniforms["sphere_center"][1]) / F32(height)
+    radius = F32(uniforms["sphere_radius"]) / F32(width)
+
+    delta_x = u - center_x
+    delta_y = v - center_y
+    if lut:
+        dist_sq = (delta_x * delta_x + delta_y * delta_y) / (radius * radius)
+    else:
+        dist = np.sqrt(delta_x * delta_x + delta_y * delta_y)
+
+    # One photo on both units with the dissolve finished: the "steady" shader
+    # variants, which skip the noise and the second photo
+    steady = crossfade >= 1.0 and _same_source(sources[0], sources[1]) and rect1 == rect2
+
+    # Background: dissolve between the undistorted photos
+    if steady:
+        color = sample_photo(frame1, rect1, u, v)
+    else:
+        if lut:
+            pixel_x = np.tile(np.arange(width), row_end - row_start)
+            pixel_y = np.repeat(np.arange(row_start, row_end), width)
+            dissolve_noise = _noise(noise, pixel_x, pixel_y, 0)
+        else:
+            dissolve_noise = _random(u * F32(500.0), v * F32(500.0))
+        dissolve_edge = F32(0.15)
+        dissolve_mix = _smoothstep(crossfade - dissolve_edge, crossfade + dissolve_edge, dissolve_noise)
+        color = _mix(sample_photo(frame1, rect1, u, v), sample_photo(frame2, rect2, u, v),
+                     dissolve_mix[:, None])
+
+    lens = np.nonzero(dist_sq < 1.0 if lut else dist < radius)[0]
+    if lens.size:
+        u, v = u[lens], v[lens]
+        delta_x, delta_y = delta_x[lens], delta_y[lens]
+
+        if lut:
+            terms = _lens_terms(lens_lut, dist_sq[lens], strength)
+            distortion = terms[:, 0]
+            # 0.01 * normDist * normalize(delta), without the sqrt
+            offset_x = delta_x * (F32(0.01) / radius)
+            offset_y = delta_y * (F32(0.01) / radius)
+        else:
+            dist = dist[lens]
+            norm_dist = dist / radius
+            z = np.sqrt(F32(1.0) - norm_dist * norm_dist)
+            distortion = F32(1.0) / (F32(1.0) + strength * (F32(1.0) - z))
+
+            # Chromatic aberration along normalize(delta)
+            aberration = F32(0.01) * norm_dist
+            with np.errstate(invalid="ignore", divide="ignore"):
+                offset_x = aberration * np.nan_to_num(delta_x / dist)
+                offset_y = aberration * np.nan_to_num(delta_y / dist)
+        source_u = center_x + delta_x * distortion
+        source_v = center_y + delta_y * distortion
+        red_u, red_v = source_u - offset_x, source_v - offset_y
+        blue_u, blue_v = source_u + offset_x, source_v + offset_y
+
+        distorted = []
+        for frame, rect in ((frame1, rect1),) if steady else ((frame1, rect1), (frame2, rect2)):
+            distorted.append(np.stack([
+                sample_photo(frame, rect, red_u, red_v, 0),
+                sample_photo(frame, rect, source_u, source_v, 1),
+                sample_photo(frame, rect, blue_u, blue_v, 2),
+            ], axis=1))
+
+        if steady:
+            lens_color = distorted[0]
+        else:
+            # Dissolve inside the sphere uses the distorted coordinates
+            if lut:
+                # ivec2(sourceUV * resolution) truncates toward zero
+                sphere_noise = _noise(noise, (source_u * F32(width)).astype(np.intp),
+                                      (source_v * F32(height)).astype(np.intp), 1)
+            else:
+                sphere_noise = _random(source_u * F32(100.0), source_v * F32(100.0))
+            threshold = crossfade + (sphere_noise - F32(0.5)) * F32(0.1)
+            sphere_mix = _smoothstep(threshold - F32(0.1), threshold + F32(0.1), sphere_noise)
+            lens_color = _mix(distorted[0], distorted[1], sphere_mix[:, None])
+
+        # Specular highlight
+        highlight_x = center_x - F32(0.3) * radius
+        highlight_y = center_y - F32(0.3) * radius
+        highlight_radius = radius * F32(0.3)
+        if lut:
+            highlight_du = (u - highlight_x) / highlight_radius
+            highlight_dv = (v - highlight_y) / highlight_radius
+            highlight_sq = highlight_du * highlight_du + highlight_dv * highlight_dv
+            lens_color += _lens_terms(lens_lut, highlight_sq, strength)[:, 2:3]
+
+            # Edge darkening
+            lens_color *= terms[:, 1:2]
+        else:
+            highlight_dist = np.sqrt((u - highlight_x) ** 2 + (v - highlight_y) ** 2)
+            intensity = np.where(highlight_dist < highlight_radius,
+                                 (F32(1.0) - highlight_dist / highlight_radius) ** 2, F32(0.0))
+            lens_color += (intensity * F32(0.5))[:, None]
+
+            # Edge darkening
+            lens_color *= (F32(1.0) - F32(0.4) * norm_dist ** 2)[:, None]
+        color[lens] = lens_color
+
+    # Dimming stage: scale linear light through the display gamma
+    brightness = F32(uniforms.get("brightness", 1.0))
+    if brightness < F32(1.0):
+        color *= brightness ** F32(1.0 / DISPLAY_GAMMA)
+
+    return color.reshape(row_end - row_start, width, 3)
+
+
+def to_uint8(color):
+    """Framebuffer write: clamp and round to 8-bit unorm"""
+    return np.round(np.clip(color, 0.0, 1.0) * 255.0).astype(np.uint8)
+
+
+class CPURenderer:
+    """Render shader frames on the CPU, optionally tiled across worker processes"""
+
+    def __init__(self, width, height, workers=1, tile_rows=64, shader_math="lut"):
+        self.width = width
+        self.height = height
+        self.shader_math = shader_math
+        self.tile_rows = tile_rows
+        self.pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        self.sources = None
+        self.rects = None
+        self._temp_dir = None
+
+    def _source(self, frame):
+        """What to send a worker for a photo: its file if memory-mapped, else a temp .npy"""
+        if self.pool is None:
+            return frame
+        if isinstance(frame, np.memmap) and frame.filename:
+            return frame.filename
+        if self._temp_dir is None:
+            self._temp_dir = tempfile.TemporaryDirectory(prefix="crystal_ball_cpu_")
+        path = os.path.join(self._temp_dir.name, f"photo_{id(frame)}_{time.monotonic_ns()}.npy")
+        np.save(path, frame)
+        return path
+
+    def set_photos(self, frame1, frame2):
+        """Prepared photos for tex1 and tex2 (as returned by prepare_photo)"""
+        self.sources = (self._source(frame1), self._source(frame2))
+        self.rects = tuple(letterbox_rect(f.shape[1], f.shape[0], self.width, self.height)
+                           for f in (frame1, frame2))
+
+    def render(self, uniforms):
+        """(H, W, 3) uint8 frame, top row first, for the given shader uniforms"""
+        bounds = [(y, min(y + self.tile_rows, self.height))
+                  for y in range(0, self.height, self.tile_rows)]
+        args = (self.sources, self.rects, uniforms, self.width, self.height)
+        if self.pool is None:
+            tiles = [render_tile(*args, start, end, self.shader_math) for start, end in bounds]
+        else:
+            futures = [self.pool.submit(render_tile, *args, start, end, self.shader_math)
+                       for start, end in bounds]
+            tiles = [future.result() for future in futures]
+        return to_uint8(np.concatenate(tiles)[::-1])
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+        if self._temp_dir is not None:
+            self._temp_dir.cleanup()
+
+
+def compare_images(reference, test):
+    """Per-pixel error of a CPU render against a GL capture (both (H, W, 3) uint8)"""
+    diff = np.abs(reference.astype(np.int16) - test.astype(np.int16))
+    worst = diff.max(axis=2)
+    mse = float(np.mean(diff.astype(np.float64) ** 2))
+    return {
+        "max_error": int(diff.max()),
+        "mean_error": round(float(diff.mean()), 4),
+        "psnr_db": round(10 * np.log10(255.0 ** 2 / mse), 2) if mse else float("inf"),
+        "pixels_over_2_pct": round(100 * float(np.mean(worst > 2)), 3),
+        "pixels_over_16_pct": round(100 * float(np.mean(worst > 16)), 3),
+    }, worst
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from PIL import Image
+
+    from animation import sphere_motion
+    from image_pipeline import prepare_photo
+
+    parser = argparse.ArgumentParser(description="Render crystal ball frames on the CPU")
+    parser.add_argument("photos", nargs="*", help="Photo for tex1 and (optionally) tex2")
+    parser.add_argument("--capture", help="GL capture .json from the demo (F12) to re-render and compare")
+    parser.add_argument("--size", default="1920x1080", help="Frame size WxH (default: 1920x1080)")
+    parser.add_argument("--time", type=float, default=0.0, help="Animation time in seconds")
+    parser.add_argument("--crossfade", type=float, default=0.0, help="Crossfade 0..1 from tex1 to tex2")
+    parser.add_argument("--brightness", type=float, default=1.0,
+                        help="Dimming stage, share of full display light 0..1 (default: 1.0)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Render processes")
+    parser.add_argument("--shader-math", choices=SHADER_MATHS, default="lut",
+                        help="Analytic noise and lens math, or the precomputed lookup tables "
+                             "(default: lut; a --capture uses the mode it was taken with)")
+    parser.add_argument("--out", default="cpu_frame.png", help="Rendered frame output")
+    parser.add_argument("--diff", help="Write an amplified error image when comparing")
+
+    args = parser.parse_args()
+    if args.capture:
+        with open(args.capture) as f:
+            capture = json.load(f)
+        width, height = capture["resolution"]
+        photos = capture["photos"]
+        uniforms = capture["uniforms"]
+        args.shader_math = capture.get("shader_math", "analytic")
+    else:
+        if not args.photos:
+            parser.error("give one or two photos, or --capture")
+        width, height = (int(n) for n in args.size.lower().split("x"))
+        photos = (args.photos * 2)[:2]
+        center_x, center_y, radius, strength = sphere_motion(args.time, width, height)
+        uniforms = {"crossfade": args.crossfade, "sphere_center": [center_x, center_y],
+                    "sphere_radius": radius, "strength": strength, "brightness": args.brightness}
+
+    renderer = CPURenderer(width, height, workers=args.workers, shader_math=args.shader_math)
+    renderer.set_photos(*(prepare_photo(p, width, height) for p in photos))
+    start = time.perf_counter()
+    frame = renderer.render(uniforms)
+    elapsed = time.perf_counter() - start
+    renderer.close()
+    Image.fromarray(frame).save(args.out)
+    print(f"[CPU] {width}x{height} in {elapsed:.2f}s with {args.workers} workers "
+          f"({width * height / elapsed / 1e6:.1f} Mpix/s) -> {args.out}")
+
+    if args.capture:
+        image_path = os.path.join(os.path.dirname(args.capture), capture["image"])
+        gl_frame = np.asarray(Image.open(image_path).convert("RGB"))
+        stats, worst = compare_images(gl_frame, frame)
+        print(f"[CPU] vs GL capture: {stats}")
+        if args.diff:
+            Image.fromarray(np.clip(worst.astype(np.int32) * 8, 0, 255).astype(np.uint8)).save(args.diff)
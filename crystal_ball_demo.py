@@ -1,175 +1,163 @@
-import pygame
-from pygame.locals import *
-from OpenGL.GL import *
-from OpenGL.GL.shaders import compileProgram, compileShader
-from PIL import Image, ImageOps
-import numpy as np
-import math
-import time
 import os
-import glob
+import sys
+import time
 
-# GLSL Fragment Shader - GPU-accelerated lens distortion with DISSOLVE effect
-FRAGMENT_SHADER = """
-#version 330 core
-in vec2 fragCoord;
-out vec4 fragColor;
+LAUNCH_TIME = time.perf_counter()  # Origin of the startup timeline
 
-uniform sampler2D tex1;
-uniform sampler2D tex2;
-uniform float crossfade;
-uniform vec2 sphereCenter;
-uniform float sphereRadius;
-uniform float strength;
-uniform vec2 resolution;
+import OpenGL
+# PyOpenGL calls glGetError after every GL call, which costs as much as many of the calls
+# themselves. Keep it for --gl-debug (or an explicit PYOPENGL_ERROR_CHECKING); it has to be
+# decided before OpenGL.GL is first imported
+if "PYOPENGL_ERROR_CHECKING" not in os.environ:
+    OpenGL.ERROR_CHECKING = "--gl-debug" in sys.argv[1:]
 
-// Random noise function for dissolve pattern
-float random(vec2 st) {
-    return fract(sin(dot(st.xy, vec2(12.9898,78.233))) * 43758.5453123);
-}
+import pygame
+from pygame.locals import *
+from OpenGL.GL import *
+import numpy as np
+import argparse
+import json
 
-void main() {
-    vec2 uv = fragCoord;
-    vec2 center = sphereCenter / resolution;
-    float radius = sphereRadius / resolution.x;
-    
-    vec2 delta = uv - center;
-    float dist = length(delta);
-    
-    // Generate dissolve pattern (organic random noise)
-    float dissolveNoise = random(uv * 500.0);  // Higher frequency for finer pattern
-    
-    // Smooth dissolve with wider soft edges for organic look
-    float dissolveEdge = 0.15;  // Wider soft edge for smoother transition
-    float dissolveMix = smoothstep(crossfade - dissolveEdge, crossfade + dissolveEdge, dissolveNoise);
-    
-    // Sample both textures with dissolve effect
-    vec3 color1 = texture(tex1, uv).rgb;
-    vec3 color2 = texture(tex2, uv).rgb;
-    vec3 baseColor = mix(color1, color2, dissolveMix);
-    
-    if (dist < radius) {
-        float normDist = dist / radius;
-        float z = sqrt(1.0 - normDist * normDist);
-        float distortion = 1.0 / (1.0 + strength * (1.0 - z));
-        
-        vec2 distortedDelta = delta * distortion;
-        vec2 sourceUV = center + distortedDelta;
-        
-        // Chromatic aberration on both textures with dissolve
-        float aberration = 0.01 * normDist;
-        vec3 color1_distorted, color2_distorted;
-        
-        color1_distorted.r = texture(tex1, sourceUV - aberration * normalize(delta)).r;
-        color1_distorted.g = texture(tex1, sourceUV).g;
-        color1_distorted.b = texture(tex1, sourceUV + aberration * normalize(delta)).b;
-        
-        color2_distorted.r = texture(tex2, sourceUV - aberration * normalize(delta)).r;
-        color2_distorted.g = texture(tex2, sourceUV).g;
-        color2_distorted.b = texture(tex2, sourceUV + aberration * normalize(delta)).b;
-        
-        // Apply dissolve pattern to distorted colors
-        float dissolveNoise_sphere = random(sourceUV * 100.0);
-        float dissolveThreshold_sphere = crossfade + (dissolveNoise_sphere - 0.5) * 0.1;
-        float dissolveMix_sphere = smoothstep(dissolveThreshold_sphere - 0.1, dissolveThreshold_sphere + 0.1, dissolveNoise_sphere);
-        
-        vec3 color = mix(color1_distorted, color2_distorted, dissolveMix_sphere);
-        
-        // Specular highlight
-        vec2 highlightPos = center + vec2(-0.3, -0.3) * radius;
-        float highlightDist = length(uv - highlightPos);
-        if (highlightDist < radius * 0.3) {
-            float intensity = pow(1.0 - highlightDist / (radius * 0.3), 2.0);
-            color += vec3(intensity * 0.5);
-        }
-        
-        // Edge darkening
-        float edgeDarken = 1.0 - 0.4 * pow(normDist, 2.0);
-        color *= edgeDarken;
-        
-        fragColor = vec4(color, 1.0);
-    } else {
-        fragColor = vec4(baseColor, 1.0);
-    }
-}
-"""
+from animation import sphere_motion, PHOTO_DISPLAY_TIME, CROSSFADE_DURATION
+from image_pipeline import thumbnail_size, DEFAULT_MAX_DECODE_MB
+from photo_library import (PhotoLibrary, path_index, DEFAULT_ROOTS, DEFAULT_EXTENSIONS,
+                           DEFAULT_INDEX_PATH)
+from prefetch import PhotoPrefetcher
+from frame_cache import FrameCache, DEFAULT_CACHE_DIR, DEFAULT_BUDGET_MB
+from memory_cache import MemoryFrameCache, DEFAULT_MEMORY_BUDGET_MB
+from texture_pool import TexturePool
+from texture_upload import create_uploader
+from frame_stats import FrameStats, PerfOverlay, DEFAULT_STATS_DIR
+from lens_renderer import LensRenderer, RENDER_PATHS, SHADER_MATHS
+from dynamic_resolution import ResolutionController, ScaledRenderTarget, scaled_size, DEFAULT_MIN_SCALE
+from power_modes import RefreshGovernor
+from frame_pacing import FrameScheduler, detect_refresh_rate
+from navigation import Navigator, DEFAULT_THUMBNAIL_DEPTH
+from startup import StartupTimeline
+from program_cache import ProgramCache, DEFAULT_PROGRAM_CACHE_DIR
+from brightness_api import BRIGHTNESS_BACKENDS
 
-VERTEX_SHADER = """
-#version 330 core
-layout(location = 0) in vec2 position;
-layout(location = 1) in vec2 texCoord;
-out vec2 fragCoord;
+# Posted by the control server's thread so a command wakes an idle wait at once
+CONTROL_EVENT = pygame.USEREVENT + 1
 
-void main() {
-    gl_Position = vec4(position, 0.0, 1.0);
-    fragCoord = texCoord;
-}
-"""
+CAPTURE_DIR = os.path.join(os.path.expanduser("~"), ".crystal_ball_cache", "captures")
 
-def load_texture_from_image(img, screen_width, screen_height):
-    """Convert PIL image to OpenGL texture, scaled to screen with proper orientation"""
-    # CRITICAL: Apply EXIF orientation to fix upside-down/rotated photos
-    img = ImageOps.exif_transpose(img)
-    
-    img_ratio = img.width / img.height
-    screen_ratio = screen_width / screen_height
-    
-    if img_ratio > screen_ratio:
-        new_width = screen_width
-        new_height = int(screen_width / img_ratio)
-    else:
-        new_height = screen_height
-        new_width = int(screen_height * img_ratio)
-    
-    img = img.resize((new_width, new_height), Image.LANCZOS)
-    
-    # Center on black background
-    bg = Image.new('RGB', (screen_width, screen_height), (0, 0, 0))
-    offset = ((screen_width - new_width) // 2, (screen_height - new_height) // 2)
-    bg.paste(img, offset)
-    
-    img = bg.transpose(Image.FLIP_TOP_BOTTOM)
-    img_data = np.array(img, dtype=np.uint8)
-    
-    texture = glGenTextures(1)
-    glBindTexture(GL_TEXTURE_2D, texture)
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, screen_width, screen_height,
-                 0, GL_RGB, GL_UNSIGNED_BYTE, img_data)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-    return texture
+def save_capture(screen_width, screen_height, photos, uniforms, shader_math, render_scale=1.0):
+    """Save the frame just drawn plus the inputs cpu_renderer.py needs to re-render it"""
+    from PIL import Image
+    
+    glPixelStorei(GL_PACK_ALIGNMENT, 1)
+    pixels = glReadPixels(0, 0, screen_width, screen_height, GL_RGB, GL_UNSIGNED_BYTE)
+    frame = np.frombuffer(pixels, dtype=np.uint8).reshape(screen_height, screen_width, 3)[::-1]
+    
+    os.makedirs(CAPTURE_DIR, exist_ok=True)
+    name = time.strftime("capture_%Y%m%d_%H%M%S")
+    Image.fromarray(frame).save(os.path.join(CAPTURE_DIR, name + ".png"))
+    with open(os.path.join(CAPTURE_DIR, name + ".json"), "w") as f:
+        json.dump({"image": name + ".png", "resolution": [screen_width, screen_height],
+                   "photos": photos, "uniforms": uniforms, "shader_math": shader_math,
+                   "render_scale": render_scale}, f, indent=2)
+    print(f"[CAPTURE] Saved {os.path.join(CAPTURE_DIR, name)}.png/.json")
 
-def create_fullscreen_quad():
-    """Create fullscreen quad"""
-    vertices = np.array([
-        -1.0, -1.0,  0.0, 0.0,
-         1.0, -1.0,  1.0, 0.0,
-         1.0,  1.0,  1.0, 1.0,
-        -1.0, -1.0,  0.0, 0.0,
-         1.0,  1.0,  1.0, 1.0,
-        -1.0,  1.0,  0.0, 1.0
-    ], dtype=np.float32)
-    
-    vao = glGenVertexArrays(1)
-    vbo = glGenBuffers(1)
-    
-    glBindVertexArray(vao)
-    glBindBuffer(GL_ARRAY_BUFFER, vbo)
-    glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
-    
-    glEnableVertexAttribArray(0)
-    glVertexAttribPointer(0, 2, GL_FLOAT, GL_FALSE, 16, ctypes.c_void_p(0))
-    glEnableVertexAttribArray(1)
-    glVertexAttribPointer(1, 2, GL_FLOAT, GL_FALSE, 16, ctypes.c_void_p(8))
-    
-    glBindVertexArray(0)
-    return vao
+def parse_args(argv=None):
+    """Command line options for the demo"""
+    parser = argparse.ArgumentParser(description="Demoscene crystal ball photo slideshow")
+    parser.add_argument("--photo-root", action="append", dest="photo_roots",
+                        help="Folder to show photos from, repeatable (default: P:\\)")
+    parser.add_argument("--extensions", default=",".join(DEFAULT_EXTENSIONS),
+                        help="Comma-separated photo file extensions")
+    parser.add_argument("--no-recursive", action="store_true",
+                        help="Only show photos directly inside each root")
+    parser.add_argument("--index-path", default=DEFAULT_INDEX_PATH,
+                        help="SQLite index of the photo library")
+    parser.add_argument("--rescan-interval", type=float, default=0,
+                        help="Seconds between background library rescans (default: startup only)")
+    parser.add_argument("--prefetch-depth", type=int, default=2,
+                        help="Photos to decode ahead in each direction (default: 2)")
+    parser.add_argument("--prefetch-workers", type=int, default=2,
+                        help="Decode workers in the prefetch pool (default: 2)")
+    parser.add_argument("--prefetch-processes", action="store_true",
+                        help="Decode in worker processes instead of threads")
+    parser.add_argument("--thumbnail-depth", type=int, default=DEFAULT_THUMBNAIL_DEPTH,
+                        help="Thumbnails to keep ready in each direction for instant LEFT/RIGHT "
+                             f"previews, 0 to disable (default: {DEFAULT_THUMBNAIL_DEPTH})")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help="Directory for the on-disk frame cache")
+    parser.add_argument("--cache-budget-mb", type=int, default=DEFAULT_BUDGET_MB,
+                        help=f"Disk budget for the frame cache in MB (default: {DEFAULT_BUDGET_MB})")
+    parser.add_argument("--no-frame-cache", action="store_true",
+                        help="Always decode photos instead of using the frame cache")
+    parser.add_argument("--memory-cache-mb", type=int, default=DEFAULT_MEMORY_BUDGET_MB,
+                        help="RAM kept for recently shown and prefetched frames, so going back to "
+                             f"them never decodes; 0 to disable (default: {DEFAULT_MEMORY_BUDGET_MB})")
+    parser.add_argument("--frame-store", action="store_true",
+                        help="Get frames from the host's shared-memory frame store, so demo instances "
+                             "on one machine decode each photo once (starts the service if needed)")
+    parser.add_argument("--frame-store-port", type=int,
+                        help="Localhost port of the frame store service (default: frame_store.py's)")
+    parser.add_argument("--frame-store-budget-mb", type=int,
+                        help="Shared memory budget of a frame store service this instance starts "
+                             "(default: frame_store.py's)")
+    parser.add_argument("--max-decode-mb", type=int, default=DEFAULT_MAX_DECODE_MB,
+                        help="Per-image decode memory ceiling in MB; larger photos are decoded "
+                             f"in strips or skipped (default: {DEFAULT_MAX_DECODE_MB})")
+    parser.add_argument("--upload-mode", choices=["sync", "pbo"], default="pbo",
+                        help="Texture upload path: synchronous glTexSubImage2D or "
+                             "streamed through pixel buffer objects (default: pbo)")
+    parser.add_argument("--render-path", choices=RENDER_PATHS, default="bounded",
+                        help="Background pass plus a lens pass bounded to the sphere, or the "
+                             "original single fullscreen pass (default: bounded)")
+    parser.add_argument("--shader-math", choices=SHADER_MATHS, default="lut",
+                        help="Evaluate the dissolve noise and lens curves per pixel, or sample "
+                             "precomputed lookup textures (default: lut)")
+    parser.add_argument("--dynamic-resolution", action="store_true",
+                        help="Render at a reduced internal resolution when frames run over budget "
+                             "and upscale to the display")
+    parser.add_argument("--frame-budget-ms", type=float,
+                        help="Frame-time budget for --dynamic-resolution (default: one frame at the target rate)")
+    parser.add_argument("--min-render-scale", type=float, default=DEFAULT_MIN_SCALE,
+                        help=f"Lowest internal resolution as a fraction of the screen (default: {DEFAULT_MIN_SCALE})")
+    parser.add_argument("--target-fps", type=float,
+                        help="Frame rate to render at (default: the display's refresh rate)")
+    parser.add_argument("--uncapped", action="store_true",
+                        help="Turn vsync off and render as fast as possible (for measuring)")
+    parser.add_argument("--ambient-fps", type=float, default=0,
+                        help="Redraw at this rate while only the sphere moves between photo changes "
+                             "(default: 0, full rate)")
+    parser.add_argument("--no-idle", action="store_true",
+                        help="Keep redrawing at full rate while paused instead of waiting for input")
+    parser.add_argument("--gl-debug", action="store_true",
+                        help="Check for GL errors after every call (slower; read before OpenGL loads)")
+    parser.add_argument("--program-cache-dir", default=DEFAULT_PROGRAM_CACHE_DIR,
+                        help="Directory for cached shader program binaries")
+    parser.add_argument("--no-program-cache", action="store_true",
+                        help="Compile shaders from source on every start")
+    parser.add_argument("--brightness-cycle", type=float, default=0,
+                        help="Fade 100%% -> 0%% -> 100%% continuously, this many seconds each way "
+                             "(default: 0, off)")
+    parser.add_argument("--brightness-backend", choices=BRIGHTNESS_BACKENDS, default="shader",
+                        help="What the brightness cycle dims: the shader output (no device I/O), "
+                             "the monitor, or both (default: shader)")
+    parser.add_argument("--control-port", type=int, default=0,
+                        help="Accept remote control commands (control_server.py) on this localhost "
+                             "port (default: 0, off)")
+    parser.add_argument("--show-stats", action="store_true",
+                        help="Start with the frame-time overlay shown (toggle with F3)")
+    parser.add_argument("--gpu-timing", action="store_true",
+                        help="Measure GPU draw time with GL_TIME_ELAPSED queries")
+    parser.add_argument("--stats-out",
+                        help="Base path for the frame-time .json/.csv written on exit "
+                             f"(default: timestamped files in {DEFAULT_STATS_DIR})")
+    return parser.parse_args(argv)
 
-def main():
-    pygame.init()
+def main(options=None):
+    if options is None:
+        options = parse_args([])
     
-    # Initialize font for on-screen text
-    pygame.font.init()
+    startup = StartupTimeline(LAUNCH_TIME)
+    startup.mark("imports")
+    # Only the display: nothing here plays audio, and fonts are loaded with the stats overlay
+    pygame.display.init()
     
     # FULLSCREEN with VSYNC for smooth display
     display_info = pygame.display.Info()
@@ -177,76 +165,253 @@ def main():
     screen_height = display_info.current_h
     
     # Enable VSYNC (swap_control)
-    pygame.display.gl_set_attribute(pygame.GL_SWAP_CONTROL, 1)
+    pygame.display.gl_set_attribute(pygame.GL_SWAP_CONTROL, 0 if options.uncapped else 1)
     
     pygame.display.set_mode((screen_width, screen_height), 
                            DOUBLEBUF | OPENGL | FULLSCREEN)
     pygame.display.set_caption("DEMOSCENE CRYSTAL BALL")
-    
-    # Compile shaders
-    shader = compileProgram(
-        compileShader(VERTEX_SHADER, GL_VERTEX_SHADER),
-        compileShader(FRAGMENT_SHADER, GL_FRAGMENT_SHADER)
-    )
-    
-    # Load ALL photos from P: drive and SORT them
-    print("Loading photos from P: drive...")
-    photo_paths = glob.glob('P:\\*.jpg') + glob.glob('P:\\*.JPG') + glob.glob('P:\\*.png')
-    photo_paths = [p for p in photo_paths if os.path.isfile(p)]
-    photo_paths.sort()  # Sort alphabetically by filename
-    print(f"Found {len(photo_paths)} photos (sorted by filename)")
-    print(f"First: {os.path.basename(photo_paths[0])}")
-    print(f"Last: {os.path.basename(photo_paths[-1])}")
+    startup.mark("window")
+    
+    # Linked shader programs are loaded from binaries cached by earlier starts
+    program_cache = None if options.no_program_cache else ProgramCache(options.program_cache_dir)
+    lens_renderer = LensRenderer(screen_width, screen_height, options.render_path, options.shader_math,
+                                 program_cache=program_cache)
+    startup.mark("shaders")
+    
+    # Start from the cached library index and rescan the photo roots in the background
+    library = PhotoLibrary(options.photo_roots or DEFAULT_ROOTS, options.index_path,
+                           options.extensions.split(","), recursive=not options.no_recursive)
+    print(f"Loading photos from {', '.join(library.roots)}...")
+    photo_paths = library.load_index()  # Sorted alphabetically by path
+    library.start_rescan(options.rescan_interval)
+    if not photo_paths:
+        print("Library index is empty, waiting for the first scan...")
+        photo_paths = library.wait_for_photos()
     
     if not photo_paths:
         print("No photos found!")
+        library.stop()
         return
     
-    # Load first two photos for cross-fade
-    current_photo_idx = 0
-    next_photo_idx = 1
-    
-    current_img = Image.open(photo_paths[current_photo_idx]).convert('RGB')
-    next_img = Image.open(photo_paths[next_photo_idx]).convert('RGB')
-    
-    texture1 = load_texture_from_image(current_img, screen_width, screen_height)
-    texture2 = load_texture_from_image(next_img, screen_width, screen_height)
-    
-    quad_vao = create_fullscreen_quad()
-    glUseProgram(shader)
-    
-    # Get uniform locations
-    loc_tex1 = glGetUniformLocation(shader, "tex1")
-    loc_tex2 = glGetUniformLocation(shader, "tex2")
-    loc_crossfade = glGetUniformLocation(shader, "crossfade")
-    loc_sphere_center = glGetUniformLocation(shader, "sphereCenter")
-    loc_sphere_radius = glGetUniformLocation(shader, "sphereRadius")
-    loc_strength = glGetUniformLocation(shader, "strength")
-    loc_resolution = glGetUniformLocation(shader, "resolution")
+    startup.mark("library index")
+    print(f"Found {len(photo_paths)} photos (sorted by filename)")
+    print(f"First: {os.path.basename(photo_paths[0])}")
+    print(f"Last: {os.path.basename(photo_paths[-1])}")
     
-    glUniform2f(loc_resolution, screen_width, screen_height)
-    glUniform1i(loc_tex1, 0)  # Texture unit 0
-    glUniform1i(loc_tex2, 1)  # Texture unit 1
+    # Screen-ready frames persist on disk between loops of the slideshow
+    frame_cache = None
+    if not options.no_frame_cache:
+        frame_cache = FrameCache(options.cache_dir, options.cache_budget_mb * 1024 * 1024)
+        print(f"[CACHE] {frame_cache.total_bytes / 1024 / 1024:.0f} MB cached in {options.cache_dir}")
+    
+    # Instances on one host share decoded frames through one decoder service
+    frame_store = None
+    if options.frame_store:
+        # Deferred: multiprocessing's shared memory and connection modules are only needed here
+        from frame_store import connect_frame_store, DEFAULT_FRAME_STORE_PORT, DEFAULT_STORE_BUDGET_MB
+        
+        port = options.frame_store_port or DEFAULT_FRAME_STORE_PORT
+        try:
+            frame_store = connect_frame_store(port, options.frame_store_budget_mb or DEFAULT_STORE_BUDGET_MB,
+                                              None if options.no_frame_cache else options.cache_dir)
+            print(f"[FRAMESTORE] Connected to the frame store on port {port}")
+        except OSError as e:
+            print(f"[FRAMESTORE] Frame store unavailable ({e}), decoding in this instance")
+    
+    # Recently seen frames stay in RAM for auto-advance, LEFT/RIGHT and control commands alike
+    memory_cache = None
+    if options.memory_cache_mb > 0:
+        memory_cache = MemoryFrameCache(options.memory_cache_mb * 1024 * 1024)
+        print(f"[MEMCACHE] Keeping up to {options.memory_cache_mb} MB of frames in memory")
+    
+    # Decode photos in the background; the render loop only uploads finished buffers
+    prefetcher = PhotoPrefetcher(photo_paths, screen_width, screen_height,
+                                 depth=options.prefetch_depth,
+                                 workers=options.prefetch_workers,
+                                 use_processes=options.prefetch_processes,
+                                 frame_cache=frame_cache,
+                                 decode_options={"max_decode_bytes": options.max_decode_mb * 1024 * 1024},
+                                 frame_store=frame_store, memory_cache=memory_cache)
+    
+    # Small frames for showing each LEFT/RIGHT step at once, refined when the full frame lands
+    thumbnails = None
+    if options.thumbnail_depth > 0:
+        thumbnails = PhotoPrefetcher(photo_paths, *thumbnail_size(screen_width, screen_height),
+                                     depth=options.thumbnail_depth, workers=1, frame_cache=frame_cache,
+                                     decode_options={"max_decode_bytes": options.max_decode_mb * 1024 * 1024},
+                                     frame_store=frame_store)
+    navigator = Navigator()
     
-    clock = pygame.time.Clock()
-    start_time = time.time()
+    current_photo_idx = 0
+    next_photo_idx = 0
+    pending_photo_idx = None  # Photo waiting for its prefetched buffer
+    pending_step = 1  # Direction to keep going if the pending photo cannot be loaded
+    loading_path = None  # Photo being uploaded; an upload for any other path was superseded
+    thumbnail_idx = None  # Navigation target whose thumbnail should be shown
+    queue_after_refine = False  # Started on a cached thumbnail: go on to photo 2 once it is refined
+    
+    # Textures are allocated once and refilled in place
+    texture_pool = TexturePool(screen_width, screen_height)
+    if thumbnails is not None:
+        # Thumbnails are tiny, so they get their own pool and upload synchronously. The ring
+        # writes the least recently shown one, never the frame the GPU may still be reading
+        thumbnail_pool = TexturePool(*thumbnail_size(screen_width, screen_height), count=3)
+    
+    # The first frame shows the first photo straight from the frame cache when it can: its
+    # full frame, or its thumbnail until the full frame is decoded. Only a cold cache waits
+    texture1 = None
+    if frame_cache is not None:
+        pixels = frame_cache.lookup(photo_paths[0], screen_width, screen_height)
+        if pixels is not None:
+            texture1 = texture_pool.upload(texture_pool.acquire(), pixels)
+            first_frame_source = "cached frame"
+        elif thumbnails is not None:
+            pixels = frame_cache.lookup(photo_paths[0], *thumbnail_size(screen_width, screen_height))
+            if pixels is not None:
+                texture1 = thumbnail_pool.upload(thumbnail_pool.acquire(), pixels)
+                first_frame_source = "cached thumbnail"
+                pending_photo_idx = 0  # Refined in place once decoded
+                queue_after_refine = len(photo_paths) > 1
+    if texture1 is None:
+        # Like the loop, skip photos that cannot be loaded (e.g. over the decode memory ceiling)
+        for first_idx in range(len(photo_paths)):
+            pixels = prefetcher.get(first_idx)
+            if pixels is not None:
+                break
+        else:
+            print("No photo could be loaded!")
+            prefetcher.shutdown()
+            if thumbnails is not None:
+                thumbnails.shutdown()
+            if frame_store is not None:
+                frame_store.close()
+            library.stop()
+            return
+        texture1 = texture_pool.upload(texture_pool.acquire(), pixels)
+        current_photo_idx = next_photo_idx = first_idx
+        first_frame_source = "decoded photo"
+    texture2 = texture1
+    if pending_photo_idx is None and len(photo_paths) > 1:
+        # Dissolve to the following photo as soon as it is decoded
+        pending_photo_idx = (current_photo_idx + 1) % len(photo_paths)
+    prefetcher.update(pending_photo_idx if pending_photo_idx is not None else current_photo_idx)
+    
+    def is_thumbnail(texture):
+        return thumbnails is not None and texture in thumbnail_pool.textures
+    
+    def update_photo_placement():
+        """Letterbox uniforms for whatever texture1/texture2 currently hold"""
+        lens_renderer.set_placement(*(thumbnail_pool if is_thumbnail(texture1) else texture_pool).placement(texture1),
+                                    *(thumbnail_pool if is_thumbnail(texture2) else texture_pool).placement(texture2))
+    
+    def draw_first_frame():
+        glClear(GL_COLOR_BUFFER_BIT)
+        center_x, center_y, radius, strength = sphere_motion(0, screen_width, screen_height)
+        lens_renderer.draw(texture1, texture2, 1.0, (center_x, center_y), radius, strength)
+    
+    update_photo_placement()
+    draw_first_frame()
+    pygame.display.flip()
+    startup.mark("first frame")
+    print(f"[STARTUP] First frame from the {first_frame_source}")
+    if not is_thumbnail(texture1):
+        startup.mark("full-quality photo")
+    
+    # Pace frames to the panel's real refresh rate (120/144 Hz panels included) on a monotonic clock.
+    # If swaps do not block, vsync is not in effect and the scheduler paces frames itself.
+    # The calibration swaps keep presenting the first frame
+    refresh_hz, refresh_source = detect_refresh_rate(draw=draw_first_frame)
+    startup.mark("refresh rate")
+    scheduler = FrameScheduler(refresh_hz, options.target_fps, options.uncapped,
+                               vsync=refresh_source != "default")
+    print(f"[PACING] {refresh_hz:g} Hz display ({refresh_source}), target "
+          f"{f'{scheduler.target_fps:g} fps' if scheduler.target_fps else 'uncapped'}, "
+          f"{'software pacing' if scheduler.software_pacing else 'paced by vsync' if scheduler.vsync else 'no pacing'}")
+    
+    uploader = create_uploader(options.upload_mode, texture_pool)
+    if thumbnails is not None:
+        thumbnails.update(current_photo_idx)
+    
+    frame_stats = FrameStats(target_fps=scheduler.target_fps or refresh_hz, gpu_timing=options.gpu_timing)
+    overlay = None  # Created (with its fonts) the first time the stats are shown
+    show_stats = options.show_stats
+    
+    # Let the driver compile the dissolve variants for the real photo textures before the first one
+    lens_renderer.warm_up(texture1, texture2)
+    
+    # Dynamic resolution draws offscreen at a scaled size; at full size this draws straight to the window
+    render_target = ScaledRenderTarget(screen_width, screen_height, program_cache=program_cache)
+    resolution = None
+    texture_scale = 1.0
+    if options.dynamic_resolution:
+        resolution = ResolutionController(options.frame_budget_ms or 1000.0 / frame_stats.target_fps,
+                                          min_scale=options.min_render_scale)
+        print(f"[RESOLUTION] Dynamic resolution, budget {resolution.budget_ms:.1f} ms, "
+              f"down to {resolution.min_scale:.0%}")
+        render_target.warm_up(lambda: lens_renderer.warm_up(texture1, texture2), resolution.warm_up_scales())
+    
+    # Redraws at full rate only while something changes; static frames wait for input
+    governor = RefreshGovernor(scheduler, options.ambient_fps, idle=not options.no_idle)
+    start_time = time.perf_counter()
+    
+    # Brightness fades are evaluated per frame on the loop's clock, in step with the crossfade
+    brightness = None
+    dimmer = None
+    if options.brightness_cycle > 0 or options.control_port:
+        # Deferred: fades are only set up for the brightness cycle or a remote "brightness" command
+        from brightness_api import BrightnessController
+        from dimming import FadeScheduler
+    if options.brightness_cycle > 0:
+        brightness = BrightnessController(options.brightness_backend)
+        dimmer = FadeScheduler()
+        dimmer.start_cycle(start_time, seconds=options.brightness_cycle)
+    
+    # Remote control: the server thread only queues commands; they are carried out below, once per frame
+    control = None
+    if options.control_port:
+        # Deferred: asyncio and the socket code load only with the control channel on
+        from control_server import ControlServer, parse_brightness, parse_settings
+        
+        control = ControlServer(options.control_port,
+                                wake=lambda: pygame.event.post(pygame.event.Event(CONTROL_EVENT)))
+        if not control.start():
+            control = None
+    
+    def step_photo(step, now):
+        """LEFT/RIGHT: a new burst starts from the photo the slideshow is heading to"""
+        if navigator.target is None:
+            prefetcher.cancel_queued()
+        origin = next_photo_idx
+        if loading_path is not None:
+            origin = path_index(photo_paths, loading_path)
+        if pending_photo_idx is not None:
+            origin = pending_photo_idx
+        navigator.press(step, origin, len(photo_paths), now)
     photo_change_time = start_time
-    crossfade_start = start_time
-    crossfade_duration = 8.0  # 8 SECOND slow dissolve
-    photo_display_time = 30.0  # 30 SECONDS per photo
+    crossfade_duration = CROSSFADE_DURATION  # 8 SECOND slow dissolve
+    crossfade_start = start_time - crossfade_duration  # Dissolve starts when the second photo is ready
+    photo_display_time = PHOTO_DISPLAY_TIME  # 30 SECONDS per photo
     running = True
     paused = False
+    capture_requested = False
     frame_count = 0
+    startup.mark("running")
     
     print("DEMOSCENE SHADER RUNNING!")
     print("CONTROLS:")
     print("  ESC = Exit")
     print("  SPACE = Pause motion")
-    print("  LEFT/RIGHT = Change photo manually")
+    print("  LEFT/RIGHT = Change photo manually (hold or tap repeatedly to skip ahead)")
+    print("  F3 = Show/hide frame-time stats")
+    print("  F12 = Save a GL capture for the CPU reference renderer")
     print("  Photos display for 30 seconds with 8-second smooth dissolve")
     
     while running:
-        for event in pygame.event.get():
+        frame_stats.begin_frame()
+        # Every loop time is perf_counter(), sampled for when this frame will be on screen
+        current_time = scheduler.begin_frame()
+        moved = False  # A LEFT/RIGHT step this frame
+        for event in governor.events():
             if event.type == QUIT:
                 running = False
             if event.type == KEYDOWN:
@@ -254,22 +419,136 @@ def main():
                     running = False
                 elif event.key == K_SPACE:
                     paused = not paused
+                elif event.key == K_F3:
+                    show_stats = not show_stats
+                elif event.key == K_F12:
+                    capture_requested = True
                 elif event.key == K_RIGHT or event.key == K_LEFT:
-                    # Manual photo change with cross-fade
-                    if event.key == K_RIGHT:
-                        next_photo_idx = (current_photo_idx + 1) % len(photo_paths)
-                    else:
-                        next_photo_idx = (current_photo_idx - 1) % len(photo_paths)
-                    
-                    print(f"Loading: {os.path.basename(photo_paths[next_photo_idx])}")
-                    next_img = Image.open(photo_paths[next_photo_idx]).convert('RGB')
-                    glDeleteTextures([texture2])
-                    texture2 = load_texture_from_image(next_img, screen_width, screen_height)
-                    crossfade_start = time.time()
-                    photo_change_time = time.time()
+                    # Manual photo change
+                    step_photo(1 if event.key == K_RIGHT else -1, current_time)
+                    moved = True
+            if event.type == KEYUP and event.key in (K_RIGHT, K_LEFT):
+                navigator.release(1 if event.key == K_RIGHT else -1)
+        
+        # Remote commands act like the keys, so they coalesce and refine the same way
+        for command, args, reply in control.poll() if control is not None else ():
+            try:
+                if command in ("next", "prev"):
+                    step = 1 if command == "next" else -1
+                    step_photo(step, current_time)
+                    navigator.release(step)
+                    moved = True
+                    reply(photo=navigator.target, path=photo_paths[navigator.target])
+                elif command == "goto":
+                    photo = args["photo"]
+                    if isinstance(photo, str):
+                        if photo not in photo_paths:
+                            reply(error=f"{photo} is not in the photo list")
+                            continue
+                        photo = photo_paths.index(photo)
+                    if navigator.target is None:
+                        prefetcher.cancel_queued()
+                    navigator.jump(int(photo) % len(photo_paths), current_time)
+                    moved = True
+                    reply(photo=navigator.target, path=photo_paths[navigator.target])
+                elif command == "pause":
+                    paused = bool(args.get("paused", not paused))
+                    reply(paused=paused)
+                elif command == "set":
+                    values = parse_settings(args)  # Nothing is applied unless every value is valid
+                    if "photo_display_time" in values:
+                        photo_display_time = values["photo_display_time"]
+                    if "crossfade_duration" in values:
+                        if current_time - crossfade_start >= crossfade_duration:
+                            # Keep a finished dissolve finished
+                            crossfade_start = current_time - values["crossfade_duration"]
+                        crossfade_duration = values["crossfade_duration"]
+                    if "ambient_fps" in values:
+                        governor.ambient_fps = values["ambient_fps"]
+                    if "show_stats" in values:
+                        show_stats = values["show_stats"]
+                    reply(photo_display_time=photo_display_time, crossfade_duration=crossfade_duration,
+                          ambient_fps=governor.ambient_fps, show_stats=show_stats)
+                elif command == "brightness":
+                    args = parse_brightness(args)  # Nothing is applied unless every value is valid
+                    backend = args.get("backend", brightness.backend if brightness is not None else "shader")
+                    if brightness is None or brightness.backend != backend:
+                        # Raises on an unknown backend while the current controller still runs
+                        controller = BrightnessController(backend)
+                        if brightness is not None:
+                            brightness.restore()
+                        brightness = controller
+                        dimmer = FadeScheduler(brightness.shader_level)
+                    if "cycle" in args:
+                        if args["cycle"] > 0:
+                            dimmer.start_cycle(current_time, seconds=args["cycle"])
+                        else:
+                            dimmer.stop_cycle(current_time)
+                    if "level" in args:
+                        dimmer.fade_to(args["level"], args.get("duration", 0.0), current_time)
+                    reply(**brightness.stats())
+                elif command == "stats":
+                    frame_ms = frame_stats.percentiles("frame")
+                    reply(photo=current_photo_idx, path=photo_paths[current_photo_idx], photos=len(photo_paths),
+                          paused=paused, refresh_mode=governor.mode, fps=round(frame_stats.rolling_fps(), 1),
+                          frame_ms_p99=round(frame_ms[2], 2) if frame_ms else None,
+                          navigation=navigator.stats(), control=control.stats(),
+                          brightness=brightness.stats() if brightness is not None else None)
+                elif command == "quit":
+                    running = False
+                    reply()
+            except (KeyError, TypeError, ValueError) as e:
+                reply(error=f"bad {command} command: {e}")
+        
+        # Every step (including auto-repeat of a held arrow) moves the target; nothing
+        # full-size is loaded until the burst settles, and older loads are superseded
+        if navigator.repeat(len(photo_paths), current_time) is not None:
+            moved = True
+        if moved:
+            pending_photo_idx = None
+            loading_path = None
+            queue_after_refine = False
+            thumbnail_idx = navigator.target
+            if thumbnails is not None:
+                thumbnails.update(navigator.target)
+            photo_change_time = current_time
+        settled_idx = navigator.settled(current_time)
+        if settled_idx is not None:
+            pending_step = navigator.step
+            pending_photo_idx = settled_idx
+            print(f"Loading: {os.path.basename(photo_paths[pending_photo_idx])}")
+            prefetcher.update(pending_photo_idx)
         
-        current_time = time.time()
         t = current_time - start_time if not paused else 0
+        frame_stats.mark("events")
+        
+        # Merge photos the background rescan added or removed, keeping our place by path
+        new_paths = library.poll()
+        if new_paths is not None and not new_paths:
+            # A root that dropped out (e.g. an offline share) lists nothing: keep showing what we have
+            print(f"[LIBRARY] Rescan found no photos, keeping the current {len(photo_paths)}")
+        elif new_paths:
+            current_path = photo_paths[current_photo_idx]
+            next_path = photo_paths[next_photo_idx]
+            pending_path = photo_paths[pending_photo_idx] if pending_photo_idx is not None else None
+            target_path = photo_paths[navigator.target] if navigator.target is not None else None
+            thumbnail_path = photo_paths[thumbnail_idx] if thumbnail_idx is not None else None
+            print(f"[LIBRARY] Photo list updated: {len(photo_paths)} -> {len(new_paths)} photos")
+            photo_paths = new_paths
+            prefetcher.set_paths(photo_paths)
+            current_photo_idx = path_index(photo_paths, current_path)
+            next_photo_idx = path_index(photo_paths, next_path)
+            if pending_path is not None:
+                pending_photo_idx = path_index(photo_paths, pending_path)
+            if target_path is not None:
+                navigator.target = path_index(photo_paths, target_path)
+            if thumbnail_path is not None:
+                thumbnail_idx = path_index(photo_paths, thumbnail_path)
+            prefetcher.update(pending_photo_idx if pending_photo_idx is not None else next_photo_idx)
+            if thumbnails is not None:
+                thumbnails.set_paths(photo_paths)
+                thumbnails.update(navigator.target if navigator.target is not None else current_photo_idx)
+        frame_stats.mark("decode")
         
         # Show countdown every 5 seconds
         time_on_photo = current_time - photo_change_time
@@ -279,20 +558,72 @@ def main():
         
         # Auto-change photo with cross-fade every 30 seconds
         if current_time - photo_change_time > photo_display_time:
-            next_photo_idx = (current_photo_idx + 1) % len(photo_paths)
+            pending_step = 1
+            pending_photo_idx = (current_photo_idx + 1) % len(photo_paths)
             print("\n" + "="*60)
-            print(f"[{int(current_time - start_time)}s] PHOTO CHANGE #{next_photo_idx + 1}/{len(photo_paths)}")
-            print(f"Cross-fading to: {os.path.basename(photo_paths[next_photo_idx])}")
+            print(f"[{int(current_time - start_time)}s] PHOTO CHANGE #{pending_photo_idx + 1}/{len(photo_paths)}")
+            print(f"Cross-fading to: {os.path.basename(photo_paths[pending_photo_idx])}")
             print("="*60 + "\n")
             
-            # Load NEXT photo into texture2 for dissolve
-            next_img = Image.open(photo_paths[next_photo_idx]).convert('RGB')
-            glDeleteTextures([texture2])
-            texture2 = load_texture_from_image(next_img, screen_width, screen_height)
-            
-            # Start dissolve and reset timer
-            crossfade_start = current_time
+            # Queue NEXT photo for dissolve and reset timer
+            prefetcher.update(pending_photo_idx)
             photo_change_time = current_time
+        frame_stats.mark("events")
+        
+        # Show the navigation target's thumbnail as soon as it is decoded, with no dissolve
+        if thumbnail_idx is not None and thumbnails is not None and thumbnails.ready(thumbnail_idx):
+            img_data = thumbnails.get(thumbnail_idx)
+            if img_data is not None:
+                texture1 = texture2 = thumbnail_pool.upload(
+                    thumbnail_pool.acquire(in_use=(texture1, texture2)), img_data)
+                current_photo_idx = next_photo_idx = thumbnail_idx
+                update_photo_placement()
+                crossfade_start = current_time - crossfade_duration
+                navigator.thumbnails_shown += 1
+            thumbnail_idx = None
+        
+        # Upload the pending photo as soon as its buffer is decoded (one upload in flight)
+        if (pending_photo_idx is not None and not uploader.busy()
+                and prefetcher.ready(pending_photo_idx)):
+            img_data = prefetcher.get(pending_photo_idx)
+            frame_stats.mark("decode")
+            if img_data is None:
+                # Unloadable (e.g. over the decode memory ceiling): skip to the next one
+                pending_photo_idx = (pending_photo_idx + pending_step) % len(photo_paths)
+                if pending_photo_idx == current_photo_idx:
+                    pending_photo_idx = None
+                else:
+                    prefetcher.update(pending_photo_idx)
+            elif uploader.begin(texture_pool.acquire(in_use=(texture1, texture2)),
+                                img_data, photo_paths[pending_photo_idx]):
+                loading_path = photo_paths[pending_photo_idx]
+                pending_photo_idx = None
+        
+        # Once the upload is issued, the new photo goes into texture2 for the dissolve
+        for uploaded_texture, uploaded_path in uploader.poll():
+            if uploaded_path != loading_path:
+                navigator.dropped_uploads += 1  # The user navigated past it while it uploaded
+                continue
+            loading_path = None
+            thumbnail_idx = None
+            uploaded_idx = path_index(photo_paths, uploaded_path)
+            if is_thumbnail(texture1) and current_photo_idx == uploaded_idx:
+                # The thumbnail on screen is refined in place
+                texture1 = texture2 = uploaded_texture
+                update_photo_placement()
+                navigator.refined += 1
+                startup.mark("full-quality photo")
+                if queue_after_refine and pending_photo_idx is None:
+                    # Like a start from a decoded photo, dissolve to the following one once it is ready
+                    pending_photo_idx = (current_photo_idx + 1) % len(photo_paths)
+                    prefetcher.update(pending_photo_idx)
+                queue_after_refine = False
+                continue
+            texture2 = uploaded_texture
+            next_photo_idx = uploaded_idx
+            update_photo_placement()
+            # Start dissolve
+            crossfade_start = current_time
         
         # Calculate cross-fade amount (0.0 = texture1, 1.0 = texture2)
         crossfade_progress = min(1.0, (current_time - crossfade_start) / crossfade_duration)
@@ -300,77 +631,175 @@ def main():
         # When cross-fade complete (ONCE per cycle), swap textures
         if crossfade_progress >= 1.0 and current_photo_idx != next_photo_idx:
             print(f"[CROSSFADE COMPLETE] Photo #{next_photo_idx + 1} now showing")
-            glDeleteTextures([texture1])
+            # Both units show the same texture so nothing goes black while
+            # waiting for the next 30-second timer - no copy or re-decode needed
             texture1 = texture2
-            
-            # Create a COPY of texture2 for texture1 so both show same photo
-            # This prevents black screen while waiting for next 30-second timer
-            duplicate_img = Image.open(photo_paths[next_photo_idx]).convert('RGB')
-            texture2 = load_texture_from_image(duplicate_img, screen_width, screen_height)
+            update_photo_placement()
             
             current_photo_idx = next_photo_idx
             # Keep crossfade at 1.0 so we keep showing the current photo
             crossfade_start = current_time - crossfade_duration
+            if thumbnails is not None:
+                thumbnails.update(current_photo_idx)
+        frame_stats.mark("upload")
         
-        # IMPROVED DEMOSCENE MOTION - More complex Lissajous with rotation
-        # Multiple sine waves with different frequencies and phases
-        center_x = screen_width/2 + math.sin(t * 0.8) * (screen_width * 0.3)
-        center_x += math.cos(t * 1.3) * (screen_width * 0.15)
-        center_x += math.sin(t * 2.1) * (screen_width * 0.05)  # Extra detail
-        
-        center_y = screen_height/2 + math.cos(t * 1.2) * (screen_height * 0.25)
-        center_y += math.sin(t * 0.9) * (screen_height * 0.12)
-        center_y += math.cos(t * 1.7) * (screen_height * 0.08)  # Extra detail
+        center_x, center_y, radius, strength = sphere_motion(t, screen_width, screen_height)
+        if dimmer is not None:
+            # Never blocks: the monitor (if it takes part) is written in the background
+            brightness.request_brightness(dimmer.level(current_time))
+            lens_renderer.set_brightness(brightness.shader_brightness())
+        frame_stats.mark("uniforms")
         
-        # Pulsing radius with multiple frequencies
-        base_radius = min(screen_width, screen_height) * 0.18
-        radius = base_radius + math.sin(t * 3.2) * (base_radius * 0.12)
-        radius += math.cos(t * 5.1) * (base_radius * 0.05)  # Extra pulse
-        
-        # Varying distortion strength (breathing effect)
-        strength = 2.3 + math.sin(t * 1.8) * 0.4
-        strength += math.cos(t * 3.5) * 0.2  # Extra variation
-        
-        # Update shader uniforms
-        glUniform1f(loc_crossfade, crossfade_progress)
-        glUniform2f(loc_sphere_center, center_x, center_y)
-        glUniform1f(loc_sphere_radius, radius)
-        glUniform1f(loc_strength, strength)
-        
-        # Render with both textures
+        # Render with both textures (uniforms are set per pass)
+        render_target.bind()
         glClear(GL_COLOR_BUFFER_BIT)
         
-        glActiveTexture(GL_TEXTURE0)
-        glBindTexture(GL_TEXTURE_2D, texture1)
-        glActiveTexture(GL_TEXTURE1)
-        glBindTexture(GL_TEXTURE_2D, texture2)
+        frame_stats.begin_gpu()
+        # Sphere uniforms in internal pixels; the radius is measured in widths, like the shader does
+        scale_x = render_target.width / screen_width
+        scale_y = render_target.height / screen_height
+        lens_renderer.draw(texture1, texture2, crossfade_progress,
+                           (center_x * scale_x, center_y * scale_y), radius * scale_x, strength)
+        render_target.present()
+        frame_stats.end_gpu()
+        
+        if capture_requested:
+            capture_requested = False
+            save_capture(screen_width, screen_height,
+                         [photo_paths[current_photo_idx], photo_paths[next_photo_idx]],
+                         {"crossfade": crossfade_progress, "sphere_center": [center_x, center_y],
+                          "sphere_radius": radius, "strength": strength,
+                          "brightness": brightness.shader_brightness() if brightness is not None else 1.0},
+                         options.shader_math,
+                         render_target.scale)
         
-        glBindVertexArray(quad_vao)
-        glDrawArrays(GL_TRIANGLES, 0, 6)
+        if show_stats:
+            if overlay is None:
+                pygame.font.init()
+                overlay = PerfOverlay(screen_width, screen_height, program_cache=program_cache)
+            lines = frame_stats.overlay_lines()
+            if resolution is not None:
+                lines.append(f"render {render_target.width}x{render_target.height} "
+                             f"({render_target.scale:.0%}), photos at {texture_scale:.0%}")
+            overlay.update(lines)
+            overlay.draw()
+        frame_stats.mark("draw")
         
         pygame.display.flip()
+        scheduler.presented()
         
-        # FPS counter with timing info
+        # FPS counter with timing info (rolling, so stalls show up)
         frame_count += 1
         if frame_count % 60 == 0:
-            fps = frame_count / (time.time() - start_time)
+            fps = frame_stats.rolling_fps()
+            frame_p99 = frame_stats.percentiles("frame")[2]
             photo_name = os.path.basename(photo_paths[current_photo_idx])
             pause_text = " [PAUSED]" if paused else ""
+            render_text = f" @ {render_target.scale:.0%}" if resolution is not None else ""
             fade_pct = int(crossfade_progress * 100)
             time_on_photo = int(current_time - photo_change_time)
             time_remaining = int(photo_display_time - (current_time - photo_change_time))
             pygame.display.set_caption(
-                f"DEMOSCENE - {fps:.0f} FPS - {photo_name} ({time_remaining}s left, fade:{fade_pct}%){pause_text}"
+                f"DEMOSCENE - {fps:.0f} FPS{render_text} (p99 {frame_p99:.1f} ms) - {photo_name} ({time_remaining}s left, fade:{fade_pct}%){pause_text}"
             )
         
-        clock.tick(60)  # 60 FPS with VSYNC
-    
+        # Nothing but the sphere moving is "steady"; paused on top of that, the frame is static
+        steady = (crossfade_progress >= 1.0 and current_photo_idx == next_photo_idx
+                  and pending_photo_idx is None and loading_path is None and not uploader.busy()
+                  and navigator.target is None and thumbnail_idx is None
+                  and not (dimmer is not None and dimmer.active(current_time)))
+        mode = governor.choose(steady, static=steady and paused)
+        if mode != "idle":
+            governor.pace()  # Target rate (vsync or the scheduler), or the ambient rate
+        frame_stats.mark("swap")  # Includes the wait for the next frame slot
+        frame_stats.end_frame(governor.frame_interval())
+        
+        if resolution is not None and mode == "full":
+            if resolution.update(frame_stats.last_frame_ms, frame_stats.last_gpu_ms):
+                render_target.resize(resolution.scale)
+                lens_renderer.resize(render_target.width, render_target.height)
+                print(f"[RESOLUTION] Rendering at {render_target.width}x{render_target.height} "
+                      f"({resolution.scale:.0%})")
+            if resolution.texture_scale != texture_scale:
+                # Photos entering the prefetch window are decoded for the internal resolution
+                texture_scale = resolution.texture_scale
+                prefetcher.set_target_size(*scaled_size(screen_width, screen_height, texture_scale))
+                print(f"[RESOLUTION] Preparing photos at {texture_scale:.0%} of the screen")
+        
+        if mode == "idle":
+            # The static frame stays on screen; sleep until input or the next photo change.
+            # This is outside the frame timing, so it never shows up as a stalled frame
+            governor.pace(photo_change_time + photo_display_time - time.perf_counter())
+        governor.end_frame()
+    
+    if control is not None:
+        control.stop()  # Flushes the reply to a "quit"
+        print(f"[CONTROL] {control.stats()}")
+    library.stop()
+    brightness_stats = brightness.stats() if brightness is not None else None
+    if brightness is not None:
+        print(f"[BRIGHTNESS] {brightness_stats}")
+        brightness.restore()
+    prefetcher.shutdown()
+    if thumbnails is not None:
+        thumbnails.shutdown()
+        thumbnail_pool.delete()
+    navigation_stats = navigator.stats()
+    print(f"[NAVIGATION] {navigation_stats}")
+    upload_stats = uploader.stats()
+    print(f"[UPLOAD] {upload_stats}")
+    uploader.shutdown()
+    texture_stats = texture_pool.stats()
+    print(f"[TEXTURES] {texture_stats}")
+    print(f"[TEXTURES] Native-aspect frames saved {texture_stats['upload_saving_pct']}% of upload bytes "
+          f"and {texture_stats['texture_saving_pct']}% of texture memory vs full-screen textures")
+    texture_pool.delete()
+    print(f"[RENDER] {lens_renderer.stats()}")
+    lens_renderer.delete()
+    render_target.delete()
+    resolution_stats = resolution.stats() if resolution is not None else None
+    if resolution_stats is not None:
+        print(f"[RESOLUTION] {resolution_stats}")
+    if frame_cache is not None:
+        print(f"[CACHE] {frame_cache.stats()}")
+    memory_cache_stats = memory_cache.stats() if memory_cache is not None else None
+    if memory_cache_stats is not None:
+        print(f"[MEMCACHE] {memory_cache_stats}")
+    frame_store_stats = None
+    if frame_store is not None:
+        try:
+            frame_store_stats = frame_store.stats()
+            print(f"[FRAMESTORE] {frame_store_stats}")
+        except (OSError, EOFError) as e:
+            print(f"[FRAMESTORE] Lost the frame store service: {e}")
+        frame_store.close()
+    power_stats = governor.stats()
+    print(f"[POWER] {power_stats}")
+    pacing_stats = scheduler.stats()
+    print(f"[PACING] {pacing_stats}")
+    program_stats = program_cache.stats() if program_cache is not None else None
+    if program_stats is not None:
+        print(f"[PROGRAMS] {program_stats}")
+    startup_stats = dict(startup.stats(), first_frame_source=first_frame_source, programs=program_stats)
+    print(f"[STATS] {frame_stats.summary()}")
+    stats_out = options.stats_out or os.path.join(DEFAULT_STATS_DIR, time.strftime("frames_%Y%m%d_%H%M%S"))
+    frame_stats.dump(stats_out, {"resolution": [screen_width, screen_height],
+                                 "gl_renderer": glGetString(GL_RENDERER).decode(errors="replace"),
+                                 "options": vars(options), "upload": upload_stats,
+                                 "textures": texture_stats, "render": lens_renderer.stats(),
+                                 "dynamic_resolution": resolution_stats, "power": power_stats,
+                                 "pacing": pacing_stats, "navigation": navigation_stats,
+                                 "startup": startup_stats, "brightness": brightness_stats,
+                                 "frame_store": frame_store_stats, "memory_cache": memory_cache_stats})
+    frame_stats.delete()
+    if overlay is not None:
+        overlay.delete()
     pygame.quit()
     print("Demo closed.")
 
 if __name__ == "__main__":
     try:
-        main()
+        main(parse_args())
     except Exception as e:
         print(f"ERROR: {e}")
         import traceback
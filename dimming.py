@@ -0,0 +1,65 @@
+"""
+Frame-accurate brightness fades.
+
+Fading the monitor itself (brightness_api.py) goes through DDC/CI or WMI
+from another process, so each step lands tens to hundreds of milliseconds
+late and never lines up with the crossfade. FadeScheduler instead gives
+the brightness level as a function of the render loop's perf_counter()
+time; the demo evaluates it once per frame and hands it to the
+BrightnessController, whose "shader" backend turns it into the lens
+shaders' dimming uniform. The classic 100% -> 0% -> 100% cycle then runs at
+the display's refresh rate with no device I/O at all.
+"""
+
+# Transfer curve between encoded pixel values and display light, shared by
+# the GPU dimming stage and the CPU reference renderer
+DISPLAY_GAMMA = 2.2
+
+# Seconds per direction of the brightness cycle, as the hardware demo ran it
+DEFAULT_CYCLE_SECONDS = 5.0
+
+
+class FadeScheduler:
+    """Brightness level (0-100) over time: single fades or a continuous cycle"""
+
+    def __init__(self, level=100.0):
+        self.start_level = self.end_level = float(level)
+        self.start_time = 0.0
+        self.duration = 0.0
+        self.cycle = None  # (low, high, seconds per direction) while cycling
+
+    def fade_to(self, target, duration, now):
+        """Fade linearly from the current level to `target` over `duration` seconds"""
+        self.start_level = self.level(now)
+        self.end_level = float(target)
+        self.start_time = now
+        self.duration = max(0.0, duration)
+        self.cycle = None
+
+    def start_cycle(self, now, low=0.0, high=100.0, seconds=DEFAULT_CYCLE_SECONDS):
+        """Fade high -> low -> high continuously, `seconds` each way"""
+        self.start_time = now
+        self.cycle = (float(low), float(high), max(1e-3, seconds))
+
+    def stop_cycle(self, now):
+        """Hold the level the cycle has reached"""
+        self.start_level = self.end_level = self.level(now)
+        self.duration = 0.0
+        self.cycle = None
+
+    def level(self, now):
+        """Brightness (0-100) at perf_counter() time `now`"""
+        if self.cycle is not None:
+            low, high, seconds = self.cycle
+            phase = ((now - self.start_time) / seconds) % 2.0
+            # Triangle wave: down for the first half of each period, back up for the second
+            share = 1.0 - phase if phase < 1.0 else phase - 1.0
+            return low + (high - low) * share
+        if self.duration <= 0.0 or now - self.start_time >= self.duration:
+            return self.end_level
+        progress = max(0.0, (now - self.start_time) / self.duration)
+        return self.start_level + (self.end_level - self.start_level) * progress
+
+    def active(self, now):
+        """True while the level is still changing, so frames cannot be treated as static"""
+        return self.cycle is not None or now - self.start_time < self.duration
@@ -0,0 +1,295 @@
+"""
+Dynamic resolution scaling for the lens pass.
+
+On 4K/5K displays the full-resolution pass can miss the refresh on weaker
+GPUs. With --dynamic-resolution the scene is drawn into an offscreen
+framebuffer at a fraction of the screen size and stretched (linearly
+filtered) up to the window. ResolutionController picks that fraction from
+measured frame times:
+
+- The scale drops as soon as a window of frames runs over the budget, by
+  enough to bring the cost back under it (pixel cost goes with scale²).
+- It rises one step at a time, and only after a run of windows with
+  headroom. With GPU timer queries the headroom is measured directly.
+  Without them, vsync hides it, so the controller probes upwards after a
+  quiet period and doubles that period whenever a probe has to be undone.
+
+When the scale stays low for a while, the texture scale follows it and
+photos are decoded at the internal resolution too, saving decode time,
+upload bandwidth and texture memory. It snaps back up with the render
+scale.
+"""
+
+import time
+
+from OpenGL.GL import *
+import numpy as np
+
+from program_cache import link_program
+
+DEFAULT_MIN_SCALE = 0.5
+SCALE_STEP = 0.1
+
+# Frames per decision window
+WINDOW_FRAMES = 30
+
+# A window is over budget when its p90 GPU time passes budget * GPU_OVER, or
+# without GPU timings, when its p90 frame time passes budget * FRAME_OVER
+FRAME_OVER = 1.2
+GPU_OVER = 0.9
+# ...and has headroom when its p90 GPU time is under budget * GPU_HEADROOM
+GPU_HEADROOM = 0.7
+HEADROOM_WINDOWS = 3
+
+# Quiet time before probing a step up without GPU timings, and its ceiling after failed probes
+PROBE_SECONDS = 10.0
+MAX_PROBE_SECONDS = 160.0
+
+# How long the scale must stay low before photos are decoded at the lower resolution
+TEXTURE_SETTLE_SECONDS = 15.0
+
+
+class ResolutionController:
+    """Internal render scale driven by frame times against a budget, with hysteresis"""
+
+    def __init__(self, budget_ms, min_scale=DEFAULT_MIN_SCALE, max_scale=1.0, step=SCALE_STEP,
+                 window=WINDOW_FRAMES):
+        self.budget_ms = budget_ms
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.step = step
+        self.window = window
+        self.scale = max_scale
+        self.texture_scale = max_scale
+        self.frame_samples = []
+        self.gpu_samples = []
+        self.headroom_windows = 0
+        self.probe_seconds = PROBE_SECONDS
+        self.probing = False
+
+        self.last_update = None  # Clock starts with the first frame
+        self.last_change = None
+        self.settle_start = None
+        self.settle_peak = max_scale
+        self.time_at_scale = {}  # scale -> seconds rendered at it
+        self.drops = 0
+        self.raises = 0
+        self.failed_probes = 0
+
+    def _quantize(self, scale):
+        """Nearest scale on the step grid, within the allowed range"""
+        steps = round((self.max_scale - scale) / self.step)
+        return round(min(self.max_scale, max(self.min_scale, self.max_scale - steps * self.step)), 4)
+
+    def update(self, frame_ms, gpu_ms=None, now=None):
+        """Feed one frame's time (and the latest GPU time, if measured); True when the scale changed"""
+        now = time.perf_counter() if now is None else now
+        if self.last_update is None:
+            self.last_update = self.last_change = self.settle_start = now
+        self.time_at_scale[self.scale] = self.time_at_scale.get(self.scale, 0.0) + now - self.last_update
+        self.last_update = now
+        self._settle_texture_scale(now)
+
+        self.frame_samples.append(frame_ms)
+        if gpu_ms is not None:
+            self.gpu_samples.append(gpu_ms)
+        if len(self.frame_samples) < self.window:
+            return False
+
+        frame_p90 = float(np.percentile(self.frame_samples, 90))
+        gpu_p90 = float(np.percentile(self.gpu_samples, 90)) if self.gpu_samples else None
+        self.frame_samples = []
+        self.gpu_samples = []
+
+        # With GPU times, a frame that is late for CPU reasons is no cause to drop pixels
+        if gpu_p90 is not None:
+            over = gpu_p90 > self.budget_ms * GPU_OVER
+        else:
+            over = frame_p90 > self.budget_ms * FRAME_OVER
+        if over:
+            self.headroom_windows = 0
+            if self.probing:
+                # The step up did not fit: undo it and wait longer before the next probe
+                self.failed_probes += 1
+                self.probe_seconds = min(MAX_PROBE_SECONDS, self.probe_seconds * 2)
+                self.probing = False
+                return self._set_scale(self.scale - self.step, now)
+            if self.scale <= self.min_scale:
+                return False
+            # Pixel cost goes with scale², so aim the cost just under the budget
+            cost = max(frame_p90 if gpu_p90 is None else gpu_p90, 1e-3)
+            wanted = self.scale * min(1.0, (0.9 * self.budget_ms / cost) ** 0.5)
+            return self._set_scale(min(self.scale - self.step, self._quantize(wanted)), now)
+
+        if self.probing and now - self.last_change >= self.probe_seconds:
+            self.probing = False  # The last probe held; the next one can come sooner
+            self.probe_seconds = max(PROBE_SECONDS, self.probe_seconds / 2)
+        if self.scale >= self.max_scale:
+            return False
+        if gpu_p90 is not None:
+            self.headroom_windows = self.headroom_windows + 1 if gpu_p90 < self.budget_ms * GPU_HEADROOM else 0
+            if self.headroom_windows < HEADROOM_WINDOWS:
+                return False
+            self.headroom_windows = 0
+        elif now - self.last_change < self.probe_seconds:
+            return False
+        else:
+            self.probing = True
+        return self._set_scale(self.scale + self.step, now)
+
+    def _set_scale(self, scale, now):
+        scale = self._quantize(scale)
+        if scale == self.scale:
+            return False
+        if scale < self.scale:
+            self.drops += 1
+        else:
+            self.raises += 1
+        self.scale = scale
+        self.last_change = now
+        self._settle_texture_scale(now)
+        return True
+
+    def _settle_texture_scale(self, now):
+        """Follow the render scale up at once, and down once it has stayed low for a while"""
+        if self.scale > self.texture_scale:
+            self.texture_scale = self.scale
+        self.settle_peak = max(self.settle_peak, self.scale)
+        if now - self.settle_start >= TEXTURE_SETTLE_SECONDS:
+            if self.settle_peak < self.texture_scale:
+                self.texture_scale = self.settle_peak
+            self.settle_start = now
+            self.settle_peak = self.scale
+
+    def warm_up_scales(self):
+        """Every scale below the maximum on the step grid"""
+        steps = round((self.max_scale - self.min_scale) / self.step)
+        return sorted({self._quantize(self.max_scale - i * self.step) for i in range(1, steps + 1)}, reverse=True)
+
+    def stats(self):
+        """Scale changes and the share of time spent at each scale"""
+        total = sum(self.time_at_scale.values()) or 1.0
+        return {
+            "budget_ms": round(self.budget_ms, 2),
+            "scale": self.scale,
+            "texture_scale": self.texture_scale,
+            "drops": self.drops,
+            "raises": self.raises,
+            "failed_probes": self.failed_probes,
+            "time_at_scale_pct": {f"{scale:g}": round(100 * seconds / total, 1)
+                                  for scale, seconds in sorted(self.time_at_scale.items(), reverse=True)},
+        }
+
+
+def scaled_size(width, height, scale):
+    """Internal resolution for a scale of the screen"""
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+# Fullscreen triangle from gl_VertexID, sampling the internal frame with bilinear filtering
+UPSCALE_VERTEX_SHADER = """
+#version 330 core
+void main() {
+    vec2 corner = vec2((gl_VertexID << 1) & 2, gl_VertexID & 2);
+    gl_Position = vec4(corner * 2.0 - 1.0, 0.0, 1.0);
+}
+"""
+
+UPSCALE_FRAGMENT_SHADER = """
+#version 330 core
+uniform sampler2D frame;
+uniform vec2 screenSize;
+out vec4 fragColor;
+
+void main() {
+    fragColor = texture(frame, gl_FragCoord.xy / screenSize);
+}
+"""
+
+
+class ScaledRenderTarget:
+    """Offscreen framebuffer at a fraction of the screen, upscaled into the window.
+
+    At scale 1.0 there is no framebuffer: bind() selects the window and
+    present() does nothing, so full resolution costs no extra pass. The
+    upscale is a textured fullscreen triangle rather than glBlitFramebuffer,
+    which some drivers implement as a slow path recompiled per scale ratio.
+    """
+
+    def __init__(self, screen_width, screen_height, scale=1.0, program_cache=None):
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.program = link_program(UPSCALE_VERTEX_SHADER, UPSCALE_FRAGMENT_SHADER, program_cache)
+        glUseProgram(self.program)
+        glUniform1i(glGetUniformLocation(self.program, "frame"), 0)
+        glUniform2f(glGetUniformLocation(self.program, "screenSize"), screen_width, screen_height)
+        self.vao = glGenVertexArrays(1)  # Core profile needs one bound, even with no attributes
+        self.framebuffer = None
+        self.color_texture = None
+        self.scale = None
+        self.width, self.height = screen_width, screen_height
+        self.resize(scale)
+
+    def resize(self, scale):
+        """Reallocate the framebuffer for a new scale"""
+        if scale == self.scale:
+            return
+        self._release()
+        self.scale = scale
+        self.width, self.height = scaled_size(self.screen_width, self.screen_height, scale)
+        if scale >= 1.0:
+            return
+        self.color_texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.color_texture)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, self.width, self.height, 0, GL_RGBA, GL_UNSIGNED_BYTE, None)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        self.framebuffer = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+        glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_TEXTURE_2D, self.color_texture, 0)
+        if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError(f"{self.width}x{self.height} framebuffer is not supported")
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+
+    def bind(self):
+        """Direct drawing at the internal resolution"""
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer or 0)
+        glViewport(0, 0, self.width, self.height)
+
+    def present(self):
+        """Upscale into the window and leave the window bound for overlays"""
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        glViewport(0, 0, self.screen_width, self.screen_height)
+        if self.framebuffer is not None:
+            glUseProgram(self.program)
+            glActiveTexture(GL_TEXTURE0)
+            glBindTexture(GL_TEXTURE_2D, self.color_texture)
+            glBindVertexArray(self.vao)
+            glDrawArrays(GL_TRIANGLES, 0, 3)
+            glBindVertexArray(0)
+
+    def warm_up(self, draw, scales):
+        """Run draw() once through the offscreen path at each scale, so drivers compile
+        for the framebuffer and texture shapes before the first real scale change"""
+        previous = self.scale
+        for scale in scales:
+            self.resize(scale)
+            self.bind()
+            draw()
+            self.present()
+        glFinish()
+        self.resize(previous)
+
+    def _release(self):
+        if self.framebuffer is not None:
+            glDeleteFramebuffers(1, [self.framebuffer])
+            glDeleteTextures([self.color_texture])
+        self.framebuffer = None
+        self.color_texture = None
+
+    def delete(self):
+        self._release()
+        glDeleteVertexArrays(1, [self.vao])
+        glDeleteProgram(self.program)
@@ -0,0 +1,384 @@
+"""
+Offline export of the slideshow as an image sequence or a video file.
+
+Renders what the demo would show for an uninterrupted run - Lissajous
+motion, radius pulse, strength breathing and the 30 s / 8 s dissolve
+timeline - on a fixed timestep of 1/fps, so every frame is a pure function
+of its frame number. That makes frame ranges independent: they are split
+into contiguous chunks and rendered by a process pool, so a long loop
+renders in time roughly proportional to the core count.
+
+Two renderers are available:
+- cpu: the NumPy reference renderer (cpu_renderer.py), no GPU needed.
+- gl:  the demo's shader drawn into an offscreen framebuffer, read back
+       asynchronously through a ring of pixel pack buffers.
+
+Frames go to a numbered image sequence, or are piped raw into ffmpeg. For
+video each worker encodes its own segment and the segments are joined with
+ffmpeg's concat demuxer without re-encoding.
+
+    python export_video.py --size 3840x2160 --fps 60 --duration 3600 --out loop.mp4
+    python export_video.py "P:\\*.jpg" --duration 60 --out export/frame_%06d.png
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import ctypes
+import math
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import time
+
+from OpenGL.GL import *
+import numpy as np
+from PIL import Image
+import pygame
+
+from animation import sphere_motion, slideshow_state, PHOTO_DISPLAY_TIME, CROSSFADE_DURATION
+from cpu_renderer import CPURenderer
+from frame_cache import FrameCache, warm_cache, DEFAULT_CACHE_DIR, DEFAULT_BUDGET_MB
+from image_decode import DEFAULT_MAX_DECODE_MB
+from image_pipeline import letterbox_rect
+from lens_renderer import LensRenderer
+from lens_tables import SHADER_MATHS
+from texture_pool import load_texture_from_pixels
+
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".mov", ".webm", ".avi")
+DEFAULT_ENCODER_ARGS = "-c:v libx264 -preset medium -crf 18 -pix_fmt yuv420p"
+
+
+def frame_uniforms(frame_number, fps, width, height):
+    """Shader uniforms (minus the crossfade) for a frame on the fixed timestep"""
+    center_x, center_y, radius, strength = sphere_motion(frame_number / fps, width, height)
+    return {"sphere_center": [center_x, center_y], "sphere_radius": radius, "strength": strength}
+
+
+class CPUFrameRenderer:
+    """cpu_renderer.CPURenderer behind the export renderer interface"""
+
+    def __init__(self, width, height, shader_math="lut"):
+        self.renderer = CPURenderer(width, height, shader_math=shader_math)
+
+    def set_photos(self, frame1, frame2):
+        self.renderer.set_photos(frame1, frame2)
+
+    def render(self, uniforms, tag):
+        """Render one frame; returns [(tag, pixels)] for frames whose pixels are ready"""
+        return [(tag, self.renderer.render(uniforms))]
+
+    def finish(self):
+        return []
+
+    def close(self):
+        self.renderer.close()
+
+
+class GLFrameRenderer:
+    """The demo's shader in an offscreen framebuffer with asynchronous readback.
+
+    Each frame is read into the next pixel pack buffer of a ring, and only
+    mapped once the ring wraps around, so the GPU keeps drawing while
+    earlier frames are copied out.
+    """
+
+    def __init__(self, width, height, readback_slots=3, render_path="bounded", shader_math="lut"):
+        self.width = width
+        self.height = height
+        self.frame_bytes = width * height * 3
+
+        # A hidden window only provides the context; frames never touch it
+        pygame.display.init()
+        pygame.display.set_mode((64, 64), pygame.OPENGL | pygame.HIDDEN)
+
+        self.framebuffer = glGenFramebuffers(1)
+        self.color_buffer = glGenRenderbuffers(1)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.color_buffer)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, width, height)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, self.color_buffer)
+        if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError(f"{width}x{height} framebuffer is not supported")
+        glViewport(0, 0, width, height)
+
+        self.lens_renderer = LensRenderer(width, height, render_path, shader_math)
+
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        self.pack_buffers = [int(b) for b in np.atleast_1d(glGenBuffers(readback_slots))]
+        for buffer in self.pack_buffers:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, buffer)
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.frame_bytes, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.in_flight = []  # (slot, tag) in render order
+        self.next_slot = 0
+        # id(frame) -> (frame, texture); holding the frame keeps its id from being reused
+        self.textures = {}
+        self.bound = None
+
+    def set_photos(self, frame1, frame2):
+        frames = {id(frame1): frame1, id(frame2): frame2}
+        for key in [k for k in self.textures if k not in frames]:
+            glDeleteTextures([self.textures.pop(key)[1]])
+            self.lens_renderer.invalidate_bindings()  # A new texture may reuse the deleted name
+        for key, frame in frames.items():
+            if key not in self.textures:
+                self.textures[key] = (frame, load_texture_from_pixels(frame))
+
+        self.bound = (self.textures[id(frame1)][1], self.textures[id(frame2)][1])
+        # Textures are sized to the frame, so the whole texture is photo
+        self.lens_renderer.set_placement(
+            letterbox_rect(frame1.shape[1], frame1.shape[0], self.width, self.height), (1.0, 1.0),
+            letterbox_rect(frame2.shape[1], frame2.shape[0], self.width, self.height), (1.0, 1.0))
+
+    def _collect(self):
+        """Map the oldest pending readback and copy its frame out, top row first"""
+        slot, tag = self.in_flight.pop(0)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self.pack_buffers[slot])
+        ptr = glMapBufferRange(GL_PIXEL_PACK_BUFFER, 0, self.frame_bytes, GL_MAP_READ_BIT)
+        address = ptr if isinstance(ptr, int) else ctypes.cast(ptr, ctypes.c_void_p).value
+        mapped = np.ctypeslib.as_array((ctypes.c_ubyte * self.frame_bytes).from_address(address))
+        pixels = mapped.reshape(self.height, self.width, 3)[::-1].copy()
+        glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        return tag, pixels
+
+    def render(self, uniforms, tag):
+        """Draw one frame and queue its readback; returns [(tag, pixels)] of finished frames"""
+        glClear(GL_COLOR_BUFFER_BIT)
+        self.lens_renderer.draw(*self.bound, uniforms["crossfade"], uniforms["sphere_center"],
+                                uniforms["sphere_radius"], uniforms["strength"])
+
+        finished = []
+        if len(self.in_flight) == len(self.pack_buffers):
+            finished.append(self._collect())
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self.pack_buffers[self.next_slot])
+        # Into the bound pack buffer, so this returns without waiting for the GPU
+        glReadPixels(0, 0, self.width, self.height, GL_RGB, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.in_flight.append((self.next_slot, tag))
+        self.next_slot = (self.next_slot + 1) % len(self.pack_buffers)
+        return finished
+
+    def finish(self):
+        """Collect every readback still in flight"""
+        finished = []
+        while self.in_flight:
+            finished.append(self._collect())
+        return finished
+
+    def close(self):
+        if self.textures:
+            glDeleteTextures([texture for _, texture in self.textures.values()])
+        self.lens_renderer.delete()
+        glDeleteBuffers(len(self.pack_buffers), self.pack_buffers)
+        glDeleteFramebuffers(1, [self.framebuffer])
+        glDeleteRenderbuffers(1, [self.color_buffer])
+        pygame.display.quit()
+
+
+RENDERERS = {"cpu": CPUFrameRenderer, "gl": GLFrameRenderer}
+
+
+class ImageSequenceWriter:
+    """Numbered image files from a printf-style pattern such as frame_%06d.png"""
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        os.makedirs(os.path.dirname(pattern) or ".", exist_ok=True)
+
+    def write(self, frame_number, pixels):
+        Image.fromarray(pixels).save(self.pattern % frame_number)
+
+    def close(self):
+        pass
+
+
+class FFmpegWriter:
+    """Raw RGB frames piped into an ffmpeg encoder"""
+
+    def __init__(self, path, width, height, fps, encoder_args=DEFAULT_ENCODER_ARGS):
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            raise RuntimeError("ffmpeg not found on PATH (export to an image sequence instead)")
+        command = [ffmpeg, "-y", "-loglevel", "error",
+                   "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps),
+                   "-i", "-", *shlex.split(encoder_args), path]
+        self.path = path
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write(self, frame_number, pixels):
+        self.process.stdin.write(memoryview(np.ascontiguousarray(pixels)))
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed encoding {self.path}")
+
+
+def concat_segments(segments, path):
+    """Join encoded segments into one file without re-encoding"""
+    list_path = path + ".segments.txt"
+    with open(list_path, "w") as f:
+        for segment in segments:
+            f.write(f"file '{os.path.abspath(segment)}'\n")
+    try:
+        subprocess.run([shutil.which("ffmpeg") or "ffmpeg", "-y", "-loglevel", "error",
+                        "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", path], check=True)
+    finally:
+        os.remove(list_path)
+
+
+def render_range(photo_paths, width, height, fps, first_frame, end_frame, output,
+                 renderer="cpu", shader_math="lut", cache_dir=DEFAULT_CACHE_DIR, cache_budget_bytes=DEFAULT_BUDGET_MB * 1024 * 1024,
+                 display_time=PHOTO_DISPLAY_TIME, crossfade_duration=CROSSFADE_DURATION,
+                 encoder_args=DEFAULT_ENCODER_ARGS, decode_options=None):
+    """Render frames [first_frame, end_frame) to an image pattern or a video segment (worker entry point)"""
+    start = time.perf_counter()
+    cache = FrameCache(cache_dir, cache_budget_bytes)
+    if output.lower().endswith(VIDEO_EXTENSIONS):
+        writer = FFmpegWriter(output, width, height, fps, encoder_args)
+    else:
+        writer = ImageSequenceWriter(output)
+    frame_renderer = RENDERERS[renderer](width, height, shader_math=shader_math)
+
+    photos = {}  # Photo index -> prepared frame, only the two currently bound
+    bound = None
+    try:
+        for frame_number in range(first_frame, end_frame):
+            outgoing, incoming, crossfade = slideshow_state(frame_number / fps, len(photo_paths),
+                                                            display_time, crossfade_duration)
+            if (outgoing, incoming) != bound:
+                photos = {i: photos.get(i) if i in photos else
+                          cache.load_or_prepare(photo_paths[i], width, height, **(decode_options or {}))
+                          for i in (outgoing, incoming)}
+                frame_renderer.set_photos(photos[outgoing], photos[incoming])
+                bound = (outgoing, incoming)
+            uniforms = frame_uniforms(frame_number, fps, width, height)
+            uniforms["crossfade"] = crossfade
+            for number, pixels in frame_renderer.render(uniforms, frame_number):
+                writer.write(number, pixels)
+        for number, pixels in frame_renderer.finish():
+            writer.write(number, pixels)
+    finally:
+        frame_renderer.close()
+        writer.close()
+    return end_frame - first_frame, time.perf_counter() - start
+
+
+def export(photo_paths, width, height, fps, first_frame, end_frame, output, workers=1, **options):
+    """Render a frame range in parallel chunks and assemble the output"""
+    start = time.time()
+    total = end_frame - first_frame
+    video = output.lower().endswith(VIDEO_EXTENSIONS)
+    # Video needs one segment per worker; image sequences balance better in smaller chunks
+    chunk_count = max(1, min(total, workers if video else workers * 4))
+    bounds = [first_frame + total * i // chunk_count for i in range(chunk_count + 1)]
+
+    segment_dir = None
+    outputs = [output] * chunk_count
+    if video:
+        segment_dir = tempfile.mkdtemp(prefix="segments_", dir=os.path.dirname(os.path.abspath(output)))
+        extension = os.path.splitext(output)[1]
+        outputs = [os.path.join(segment_dir, f"segment_{i:04d}{extension}") for i in range(chunk_count)]
+
+    print(f"[EXPORT] {total} frames at {width}x{height}/{fps} fps in {chunk_count} chunks on {workers} workers")
+    rendered = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(render_range, photo_paths, width, height, fps,
+                                   bounds[i], bounds[i + 1], outputs[i], **options)
+                       for i in range(chunk_count)]
+            for future in as_completed(futures):
+                frames, seconds = future.result()
+                rendered += frames
+                print(f"[EXPORT] {rendered}/{total} frames ({frames / seconds:.1f} fps in this worker)")
+        if video:
+            concat_segments(outputs, output)
+    finally:
+        if segment_dir is not None:
+            shutil.rmtree(segment_dir, ignore_errors=True)
+
+    elapsed = time.time() - start
+    print(f"[EXPORT] {total} frames in {elapsed:.1f}s ({total / elapsed:.1f} fps, "
+          f"{total / fps / elapsed:.2f}x realtime) -> {output}")
+
+
+def usable_photos(photo_paths, needed, cache, width, height, workers, **decode_options):
+    """First `needed` photos (or all, if fewer) that can be prepared, warming the cache for them"""
+    usable = []
+    position = 0
+    while len(usable) < needed and position < len(photo_paths):
+        batch = photo_paths[position:position + needed - len(usable)]
+        position += len(batch)
+        usable += warm_cache(cache, batch, width, height, workers, **decode_options)
+    return usable
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from image_pipeline import find_photos
+
+    parser = argparse.ArgumentParser(description="Export the crystal ball slideshow to frames or video")
+    parser.add_argument("patterns", nargs="*",
+                        help="Photo files or glob patterns (default: every photo in the library index)")
+    parser.add_argument("--out", default=os.path.join("export", "frame_%06d.png"),
+                        help="Image pattern like frame_%%06d.png, or a video file "
+                             f"({' '.join(VIDEO_EXTENSIONS)}) encoded with ffmpeg")
+    parser.add_argument("--size", default="3840x2160", help="Frame size WxH (default: 3840x2160)")
+    parser.add_argument("--fps", type=float, default=60, help="Frames per second (default: 60)")
+    parser.add_argument("--duration", type=float,
+                        help="Seconds to render (default: one full loop through the photos)")
+    parser.add_argument("--start-frame", type=int, default=0, help="First frame to render")
+    parser.add_argument("--end-frame", type=int, help="Stop before this frame (overrides --duration)")
+    parser.add_argument("--renderer", choices=sorted(RENDERERS), default="cpu",
+                        help="NumPy reference renderer or offscreen GL (default: cpu)")
+    parser.add_argument("--shader-math", choices=SHADER_MATHS, default="lut",
+                        help="Analytic noise and lens math, or precomputed lookup tables (default: lut)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Render processes; GL workers share the GPU")
+    parser.add_argument("--display-time", type=float, default=PHOTO_DISPLAY_TIME,
+                        help=f"Seconds per photo (default: {PHOTO_DISPLAY_TIME:g})")
+    parser.add_argument("--crossfade-duration", type=float, default=CROSSFADE_DURATION,
+                        help=f"Seconds of dissolve per photo (default: {CROSSFADE_DURATION:g})")
+    parser.add_argument("--encoder-args", default=DEFAULT_ENCODER_ARGS,
+                        help=f"ffmpeg output options for video (default: {DEFAULT_ENCODER_ARGS})")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Frame cache directory")
+    parser.add_argument("--cache-budget-mb", type=int, default=DEFAULT_BUDGET_MB,
+                        help=f"Frame cache disk budget in MB (default: {DEFAULT_BUDGET_MB})")
+    parser.add_argument("--max-decode-mb", type=int, default=DEFAULT_MAX_DECODE_MB,
+                        help=f"Per-image decode memory ceiling in MB (default: {DEFAULT_MAX_DECODE_MB})")
+
+    args = parser.parse_args()
+    width, height = (int(n) for n in args.size.lower().split("x"))
+    if args.patterns:
+        photo_paths = find_photos(args.patterns)
+    else:
+        from photo_library import PhotoLibrary
+        photo_paths = PhotoLibrary().scan()
+    if not photo_paths:
+        parser.error("no photos found")
+
+    if args.out.lower().endswith(VIDEO_EXTENSIONS) and shutil.which("ffmpeg") is None:
+        parser.error("ffmpeg not found on PATH; export an image sequence instead")
+
+    duration = args.duration or len(photo_paths) * args.display_time
+    end_frame = args.end_frame if args.end_frame is not None else round(duration * args.fps)
+    if end_frame <= args.start_frame:
+        parser.error("nothing to render: the end frame is not after the start frame")
+
+    # Prepare every photo the timeline reaches up front, in parallel, dropping
+    # ones that cannot be decoded so all workers agree on the sequence
+    decode_options = {"max_decode_bytes": args.max_decode_mb * 1024 * 1024}
+    cache = FrameCache(args.cache_dir, args.cache_budget_mb * 1024 * 1024)
+    needed = math.ceil(end_frame / args.fps / args.display_time) + 1
+    photo_paths = usable_photos(photo_paths, needed, cache, width, height, args.workers, **decode_options)
+    if not photo_paths:
+        parser.error("none of the photos could be prepared")
+
+    export(photo_paths, width, height, args.fps, args.start_frame, end_frame, args.out,
+           workers=args.workers, renderer=args.renderer, shader_math=args.shader_math,
+           cache_dir=args.cache_dir, cache_budget_bytes=args.cache_budget_mb * 1024 * 1024,
+           display_time=args.display_time, crossfade_duration=args.crossfade_duration,
+           encoder_args=args.encoder_args, decode_options=decode_options)
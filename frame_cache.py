@@ -0,0 +1,206 @@
+"""
+Persistent on-disk cache of screen-ready frames.
+
+Every prepared frame is stored as a .npy file so it can be memory-mapped
+and handed straight to glTexImage2D without a decode or a copy. Entries are
+keyed by source path, mtime, file size and target resolution, so an edited
+photo or a different display never sees a stale frame. The cache keeps to a
+byte budget by evicting the least recently used files (file mtime is bumped
+on every hit and doubles as the LRU clock).
+
+Warm the cache ahead of time with:
+    python frame_cache.py --width 3840 --height 2160 "P:\\*.jpg"
+(add --thumbnails to also pre-generate the small frames shown while
+skipping through photos with LEFT/RIGHT).
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+from image_pipeline import prepare_photo, find_photos, thumbnail_size, DEFAULT_MAX_DECODE_MB
+
+# Bump when the layout of prepared frames changes so old entries are ignored
+FRAME_FORMAT = 3
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".crystal_ball_cache", "frames")
+DEFAULT_BUDGET_MB = 4096
+
+
+class FrameCache:
+    """Byte-budgeted LRU cache of prepared frames stored as memory-mappable .npy files"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, budget_bytes=DEFAULT_BUDGET_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.budget_bytes = budget_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.total_bytes = sum(size for _, size, _ in self._entries())
+
+    def __getstate__(self):
+        # Picklable for process pools; each process gets its own lock
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def key(self, path, width, height):
+        """Cache file for a photo at a target resolution (changes when the file changes)"""
+        st = os.stat(path)
+        ident = f"{FRAME_FORMAT}|{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}|{width}x{height}"
+        return os.path.join(self.cache_dir, hashlib.sha1(ident.encode("utf-8")).hexdigest() + ".npy")
+
+    def _entries(self):
+        """(file, size, last use) for every cached frame"""
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".npy"):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((entry.path, st.st_size, st.st_mtime))
+        return entries
+
+    def lookup(self, path, width, height):
+        """Memory-mapped frame for a photo, or None when it is not cached"""
+        cache_file = self.key(path, width, height)
+        try:
+            pixels = np.load(cache_file, mmap_mode="r")
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(cache_file)  # Mark as recently used
+        except OSError:
+            pass
+        self.hits += 1
+        return pixels
+
+    def store(self, path, width, height, pixels):
+        """Write a prepared frame to the cache and evict old entries if over budget"""
+        cache_file = self.key(path, width, height)
+        tmp_file = f"{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, "wb") as f:
+            np.save(f, np.ascontiguousarray(pixels))
+        with self._lock:
+            try:
+                replaced_bytes = os.path.getsize(cache_file)  # Another worker stored it first
+            except OSError:
+                replaced_bytes = 0
+            os.replace(tmp_file, cache_file)  # Atomic, so readers never see half a frame
+            self.total_bytes += os.path.getsize(cache_file) - replaced_bytes
+            if self.total_bytes > self.budget_bytes:
+                self.evict()
+        return cache_file
+
+    def evict(self):
+        """Delete least recently used frames until the cache fits its budget"""
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for cache_file, size, _ in entries:
+            if total <= self.budget_bytes:
+                break
+            try:
+                os.remove(cache_file)
+            except OSError:
+                continue  # Still mapped (Windows) or already gone
+            total -= size
+            self.evictions += 1
+        self.total_bytes = total
+
+    def load_or_prepare(self, path, width, height, **decode_options):
+        """Cached frame for a photo, preparing and storing it on a miss"""
+        pixels = self.lookup(path, width, height)
+        if pixels is None:
+            pixels = prepare_photo(path, width, height, **decode_options)
+            self.store(path, width, height, pixels)
+        return pixels
+
+    def build(self, path, width, height, **decode_options):
+        """Make sure a photo is cached and return its cache file (process pool entry point)"""
+        cache_file = self.key(path, width, height)
+        if os.path.exists(cache_file):
+            return cache_file
+        return self.store(path, width, height, prepare_photo(path, width, height, **decode_options))
+
+    def open_file(self, cache_file):
+        """Memory-map a cache file returned by build()"""
+        os.utime(cache_file)
+        return np.load(cache_file, mmap_mode="r")
+
+    def stats(self):
+        """Hit/miss/eviction counters and disk usage"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "bytes": self.total_bytes,
+            "budget_bytes": self.budget_bytes,
+        }
+
+
+def warm_cache(cache, photo_paths, width, height, workers=4, **decode_options):
+    """Prepare and store every photo that is not cached yet; returns the photos now cached"""
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    start = time.time()
+    built = set()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(cache.build, p, width, height, **decode_options): p for p in photo_paths}
+        for i, future in enumerate(as_completed(futures), 1):
+            try:
+                future.result()
+                built.add(futures[future])
+            except Exception as e:
+                print(f"\n[CACHE] Failed {os.path.basename(futures[future])}: {e}")
+            print(f"[CACHE] {i}/{len(photo_paths)} frames ready", end="\r")
+    print()
+    # Workers track their own totals, so settle the budget once they are done
+    cache.evict()
+    print(f"[CACHE] Warmed {len(built)} frames at {width}x{height} in {time.time() - start:.1f}s "
+          f"({cache.total_bytes / 1024 / 1024:.0f} MB on disk)")
+    return [p for p in photo_paths if p in built]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Warm the crystal ball frame cache")
+    parser.add_argument("patterns", nargs="*",
+                        help="Photo files or glob patterns (default: every photo in the library index)")
+    parser.add_argument("--width", type=int, required=True, help="Target screen width")
+    parser.add_argument("--height", type=int, required=True, help="Target screen height")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Cache directory")
+    parser.add_argument("--budget-mb", type=int, default=DEFAULT_BUDGET_MB,
+                        help=f"Disk budget in MB (default: {DEFAULT_BUDGET_MB})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4,
+                        help="Parallel decode processes")
+    parser.add_argument("--max-decode-mb", type=int, default=DEFAULT_MAX_DECODE_MB,
+                        help=f"Per-image decode memory ceiling in MB (default: {DEFAULT_MAX_DECODE_MB})")
+    parser.add_argument("--thumbnails", action="store_true",
+                        help="Also warm the thumbnail tier shown while skipping through photos")
+
+    args = parser.parse_args()
+    cache = FrameCache(args.cache_dir, args.budget_mb * 1024 * 1024)
+    if args.patterns:
+        photo_paths = find_photos(args.patterns)
+    else:
+        from photo_library import PhotoLibrary
+        photo_paths = PhotoLibrary().scan()
+    print(f"[CACHE] {len(photo_paths)} photos -> {args.cache_dir}")
+    warm_cache(cache, photo_paths, args.width, args.height, args.workers,
+               max_decode_bytes=args.max_decode_mb * 1024 * 1024)
+    if args.thumbnails:
+        warm_cache(cache, photo_paths, *thumbnail_size(args.width, args.height), args.workers,
+                   max_decode_bytes=args.max_decode_mb * 1024 * 1024)
@@ -0,0 +1,177 @@
+"""
+Frame pacing on a monotonic clock.
+
+The render loop used to read time.time() several times a frame and call
+pygame's Clock.tick(60) on top of vsync. That capped 120/144 Hz panels at
+60 fps, stacked a millisecond-granular sleep on top of the swap's own
+wait, and made animation jump whenever NTP stepped the wall clock.
+
+FrameScheduler keeps every loop time on time.perf_counter():
+
+- The target rate defaults to the display's refresh rate (from SDL when
+  pygame exposes it, otherwise measured from a few vsync'd flips). With
+  vsync on and the target at the refresh rate, the swap alone paces
+  frames; slower targets sleep to a deadline, finishing the last stretch
+  with a short spin because sleep() overshoots. Uncapped mode turns vsync
+  off and never waits.
+- begin_frame() predicts when the frame being built will be shown (the
+  next refresh after the expected render time), so animation is sampled
+  for the moment the viewer sees it rather than when drawing started.
+- Present-to-present intervals and prediction errors are kept for
+  jitter statistics.
+"""
+
+from collections import deque
+import math
+import time
+
+from OpenGL.GL import *
+import numpy as np
+import pygame
+
+DEFAULT_REFRESH_HZ = 60.0
+CALIBRATION_FLIPS = 30
+MAX_REFRESH_HZ = 500.0  # Faster "refreshes" mean the swap is not synced to anything
+
+# sleep() can overshoot by a millisecond or more; spin out the final stretch before a deadline
+SPIN_SECONDS = 0.002
+
+# Intervals kept for the jitter statistics, and the smoothing of the render-time estimate
+ROLLING_FRAMES = 600
+LATENCY_SMOOTHING = 0.1
+
+# An interval this many target intervals long or more is a missed deadline
+LATE_THRESHOLD = 1.5
+
+
+def detect_refresh_rate(flips=CALIBRATION_FLIPS, draw=None):
+    """(Hz, source) for the current window: from SDL, from timed vsync'd flips, or the 60 Hz default.
+
+    draw() renders what the timed flips present (a cleared screen without it).
+    """
+    get_rate = getattr(pygame.display, "get_current_refresh_rate", None)  # pygame-ce only
+    if get_rate is not None:
+        try:
+            rate = get_rate()
+            if rate > 0:
+                return float(rate), "display"
+        except pygame.error:
+            pass
+
+    stamps = []
+    for _ in range(flips + 1):
+        if draw is not None:
+            draw()
+        else:
+            glClear(GL_COLOR_BUFFER_BIT)
+        pygame.display.flip()
+        stamps.append(time.perf_counter())
+    interval = float(np.median(np.diff(stamps)))
+    if interval < 1.0 / MAX_REFRESH_HZ:
+        return DEFAULT_REFRESH_HZ, "default"
+    return round(1.0 / interval, 2), "measured"
+
+
+class FrameScheduler:
+    """Deadlines, presentation-time prediction and jitter statistics for the render loop.
+
+    Call begin_frame() at the top of the loop for the frame's animation
+    time, presented() right after the swap and pace() before the next
+    frame. resync() drops the interval across a deliberate wait.
+    """
+
+    def __init__(self, refresh_hz, target_fps=None, uncapped=False, vsync=True):
+        self.refresh_hz = refresh_hz
+        self.refresh_interval = 1.0 / refresh_hz
+        self.uncapped = uncapped
+        self.vsync = vsync and not uncapped
+        self.target_fps = None if uncapped else (target_fps or refresh_hz)
+        self.interval = 1.0 / self.target_fps if self.target_fps else None
+        # With vsync the swap already waits for the refresh; only slower targets need sleeping
+        self.software_pacing = self.interval is not None and (
+            not self.vsync or self.interval > self.refresh_interval * 1.02)
+
+        self.frame_begin = None
+        self.predicted = None
+        self.last_present = None
+        self.next_deadline = None
+        self.latency = None  # Smoothed begin_frame() -> swap time
+        self.present_intervals = deque(maxlen=ROLLING_FRAMES)
+        self.prediction_errors = deque(maxlen=ROLLING_FRAMES)
+        self.frames = 0
+        self.late_frames = 0
+        self.pacing_sleep = 0.0
+
+    def begin_frame(self):
+        """Start a frame; returns the perf_counter() time it is predicted to be shown at"""
+        now = time.perf_counter()
+        self.frame_begin = now
+        ready = now + (self.latency or 0.0)
+        if self.vsync and self.last_present is not None:
+            # First refresh after the frame is ready, on the grid of past presents
+            refreshes = max(1, math.ceil((ready - self.last_present) / self.refresh_interval))
+            ready = self.last_present + refreshes * self.refresh_interval
+        self.predicted = ready
+        return ready
+
+    def presented(self):
+        """Record that the frame's swap returned (the best CPU-side estimate of when it was shown)"""
+        now = time.perf_counter()
+        self.frames += 1
+        latency = now - self.frame_begin
+        self.latency = latency if self.latency is None else (
+            self.latency + LATENCY_SMOOTHING * (latency - self.latency))
+        self.prediction_errors.append((now - self.predicted) * 1000)
+        if self.last_present is not None:
+            interval = now - self.last_present
+            self.present_intervals.append(interval * 1000)
+            if interval >= LATE_THRESHOLD * (self.interval or self.refresh_interval):
+                self.late_frames += 1
+        self.last_present = now
+
+    def pace(self):
+        """Wait for the next frame's deadline (only when the swap does not pace frames itself)"""
+        if not self.software_pacing:
+            return
+        now = time.perf_counter()
+        if self.next_deadline is None or now - self.next_deadline > self.interval:
+            self.next_deadline = now  # Fell behind (or first frame): restart the grid instead of bursting
+        self.next_deadline += self.interval
+        remaining = self.next_deadline - now
+        if remaining > SPIN_SECONDS:
+            time.sleep(remaining - SPIN_SECONDS)
+        while time.perf_counter() < self.next_deadline:
+            pass
+        self.pacing_sleep += time.perf_counter() - now
+
+    def resync(self):
+        """Forget the last present after a deliberate wait, so it neither counts as jitter nor anchors prediction"""
+        self.last_present = None
+        self.next_deadline = None
+
+    def stats(self):
+        """Target and refresh rates, present-interval jitter and prediction error"""
+        stats = {
+            "refresh_hz": self.refresh_hz,
+            "target_fps": self.target_fps or "uncapped",
+            "vsync": self.vsync,
+            "software_pacing": self.software_pacing,
+            "frames": self.frames,
+            "late_frames": self.late_frames,
+            "pacing_sleep_s": round(self.pacing_sleep, 2),
+        }
+        if self.present_intervals:
+            intervals = np.fromiter(self.present_intervals, float)
+            target_ms = 1000 * (self.interval or self.refresh_interval)
+            stats["interval_ms"] = {
+                "mean": round(float(intervals.mean()), 3),
+                "std": round(float(intervals.std()), 3),
+                "p50": round(float(np.percentile(intervals, 50)), 3),
+                "p99": round(float(np.percentile(intervals, 99)), 3),
+            }
+            stats["jitter_ms_p95"] = round(float(np.percentile(np.abs(intervals - target_ms), 95)), 3)
+        if self.prediction_errors:
+            errors = np.abs(np.fromiter(self.prediction_errors, float))
+            stats["prediction_error_ms"] = {"p50": round(float(np.percentile(errors, 50)), 3),
+                                            "p95": round(float(np.percentile(errors, 95)), 3)}
+        return stats
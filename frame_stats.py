@@ -0,0 +1,358 @@
+"""
+Per-frame timing for the render loop.
+
+The window caption used to show frame_count / elapsed, a lifetime average
+that hides every stall. FrameStats times each phase of every frame on the
+CPU (events, decode, upload, uniforms, draw, swap) and optionally the GPU
+draw time with GL_TIME_ELAPSED queries. It keeps rolling p50/p95/p99 per
+phase, logs frames that overran the refresh interval with the phase that
+ate the time, and dumps a JSON summary plus per-frame CSV on exit so runs
+on different builds and kiosks can be compared.
+
+PerfOverlay draws the rolling numbers as a text panel over the demo.
+"""
+
+from collections import deque
+import csv
+import ctypes
+import json
+import os
+import platform as platform_info  # OpenGL.GL exports its own "platform"
+import time
+
+from OpenGL.GL import *
+import numpy as np
+import pygame
+
+from program_cache import link_program
+
+PHASES = ("events", "decode", "upload", "uniforms", "draw", "swap")
+DEFAULT_STATS_DIR = os.path.join(os.path.expanduser("~"), ".crystal_ball_cache", "stats")
+
+# Frames in the rolling percentile window, and per-frame rows kept for the CSV
+ROLLING_FRAMES = 600
+MAX_HISTORY = 60 * 60 * 60
+
+# A frame counts as dropped when it takes this many refresh intervals or more
+DROP_THRESHOLD = 1.5
+
+# Timer queries in flight; results are read a few frames late so we never stall
+GPU_QUERY_COUNT = 4
+MAX_GPU_NS = 10 ** 10
+
+
+class GPUTimer:
+    """GL_TIME_ELAPSED queries around the draw, read back without waiting"""
+
+    def __init__(self, count=GPU_QUERY_COUNT):
+        self.queries = [int(q) for q in np.atleast_1d(glGenQueries(count))]
+        self.pending = deque()  # (frame number, query) issued but not yet read
+        self.free = list(self.queries)
+        # ctypes buffers: PyOpenGL has no numpy mapping for 64-bit query results
+        self.result = (GLuint64 * 1)()
+        self.available = (GLint * 1)()
+
+    def begin(self, frame_number):
+        """Start timing; returns False when every query is still in flight"""
+        if not self.free:
+            return False
+        query = self.free.pop()
+        glBeginQuery(GL_TIME_ELAPSED, query)
+        self.pending.append((frame_number, query))
+        return True
+
+    def end(self):
+        glEndQuery(GL_TIME_ELAPSED)
+
+    def poll(self):
+        """[(frame number, GPU ms)] for queries whose results have arrived"""
+        finished = []
+        while self.pending:
+            frame_number, query = self.pending[0]
+            glGetQueryObjectiv(query, GL_QUERY_RESULT_AVAILABLE, self.available)
+            if not self.available[0]:
+                break
+            glGetQueryObjectui64v(query, GL_QUERY_RESULT, self.result)
+            self.pending.popleft()
+            self.free.append(query)
+            if self.result[0] < MAX_GPU_NS:  # Some drivers report garbage for the first query
+                finished.append((frame_number, self.result[0] / 1e6))
+        return finished
+
+    def delete(self):
+        glDeleteQueries(len(self.queries), self.queries)
+
+
+class FrameStats:
+    """Phase timings, rolling percentiles and dropped-frame detection for the render loop.
+
+    Call begin_frame() at the top of the loop, mark(phase) after each phase
+    and end_frame() after the swap. Time between marks is charged to the
+    phase named by the mark.
+    """
+
+    def __init__(self, target_fps=60, gpu_timing=False):
+        self.target_fps = target_fps
+        self.frame_interval = 1.0 / target_fps
+        self.gpu_timer = None
+        self.gpu_timing_frame = False
+        if gpu_timing:
+            try:
+                self.gpu_timer = GPUTimer()
+            except Exception as e:
+                print(f"[STATS] GPU timer queries unavailable: {e}")
+        self.rolling = {name: deque(maxlen=ROLLING_FRAMES) for name in PHASES + ("frame", "gpu")}
+        self.history = deque(maxlen=MAX_HISTORY)
+        self.history_by_frame = {}  # Frame number -> history row still waiting for its GPU time
+        self.frame_number = 0
+        self.last_frame_ms = None
+        self.last_gpu_ms = None  # Newest GPU time, which arrives a few frames late
+        self.dropped_frames = 0
+        self.drop_events = 0
+        self.start_time = time.perf_counter()
+        self.frame_start = None
+        self.last_mark = None
+        self.phase_times = {}
+
+    def begin_frame(self):
+        now = time.perf_counter()
+        self.frame_start = now
+        self.last_mark = now
+        self.phase_times = dict.fromkeys(PHASES, 0.0)
+
+    def mark(self, phase):
+        """Charge the time since the previous mark to a phase"""
+        now = time.perf_counter()
+        self.phase_times[phase] += now - self.last_mark
+        self.last_mark = now
+
+    def begin_gpu(self):
+        if self.gpu_timer is not None:
+            self.gpu_timing_frame = self.gpu_timer.begin(self.frame_number)
+
+    def end_gpu(self):
+        if self.gpu_timer is not None and self.gpu_timing_frame:
+            self.gpu_timer.end()
+
+    def end_frame(self, interval=None):
+        """Close the frame, record it and report it if it missed the refresh interval.
+
+        interval overrides the refresh interval for frames paced slower on
+        purpose (ambient refresh), so they are not counted as dropped.
+        """
+        interval = interval or self.frame_interval
+        gpu_results = []
+        if self.gpu_timer is not None:
+            # Reading query results can wait on the GPU much like the swap does
+            gpu_results = self.gpu_timer.poll()
+            self.mark("swap")
+        now = time.perf_counter()
+        frame_time = now - self.frame_start
+        for phase, seconds in self.phase_times.items():
+            self.rolling[phase].append(seconds * 1000)
+        self.rolling["frame"].append(frame_time * 1000)
+        self.last_frame_ms = frame_time * 1000
+
+        dropped = 0
+        if frame_time >= DROP_THRESHOLD * interval:
+            dropped = max(1, round(frame_time / interval) - 1)  # Refreshes that repeated a frame
+        if dropped:
+            self.dropped_frames += dropped
+            self.drop_events += 1
+            worst = max(self.phase_times, key=self.phase_times.get)
+            breakdown = ", ".join(f"{p} {s * 1000:.1f}" for p, s in self.phase_times.items() if s >= 0.001)
+            print(f"[STATS] Frame {self.frame_number} took {frame_time * 1000:.1f} ms "
+                  f"(~{dropped} dropped, worst: {worst}) [{breakdown}]")
+
+        row = {"frame": self.frame_number, "t": round(self.frame_start - self.start_time, 4),
+               "frame_ms": round(frame_time * 1000, 3)}
+        row.update((phase, round(seconds * 1000, 3)) for phase, seconds in self.phase_times.items())
+        row["gpu_ms"] = None
+        row["dropped"] = dropped
+        self.history.append(row)
+
+        if self.gpu_timer is not None:
+            self.history_by_frame[self.frame_number] = row
+            for frame_number, gpu_ms in gpu_results:
+                self.rolling["gpu"].append(gpu_ms)
+                self.last_gpu_ms = gpu_ms
+                finished = self.history_by_frame.pop(frame_number, None)
+                if finished is not None:
+                    finished["gpu_ms"] = round(gpu_ms, 3)
+            # Frames whose query was skipped never get a result
+            while len(self.history_by_frame) > 4 * GPU_QUERY_COUNT:
+                self.history_by_frame.pop(next(iter(self.history_by_frame)))
+        self.frame_number += 1
+
+    def percentiles(self, name):
+        """Rolling (p50, p95, p99) in ms for a phase, "frame" or "gpu" - None if no samples"""
+        samples = self.rolling[name]
+        if not samples:
+            return None
+        return tuple(float(v) for v in np.percentile(np.fromiter(samples, float), (50, 95, 99)))
+
+    def rolling_fps(self):
+        """Frames per second over the rolling window"""
+        samples = self.rolling["frame"]
+        return 1000 * len(samples) / sum(samples) if samples else 0.0
+
+    def overlay_lines(self):
+        """Text for the on-screen panel"""
+        lines = [f"{self.rolling_fps():5.1f} fps   dropped {self.dropped_frames} in {self.drop_events} stalls",
+                 "phase       p50     p95     p99  ms"]
+        for name in ("frame",) + PHASES + ("gpu",):
+            values = self.percentiles(name)
+            if values is not None:
+                lines.append(f"{name:<8}" + "".join(f"{v:8.2f}" for v in values))
+        return lines
+
+    def summary(self):
+        """Whole-run numbers: overall rates plus percentiles over every recorded frame"""
+        elapsed = time.perf_counter() - self.start_time
+        summary = {
+            "frames": self.frame_number,
+            "seconds": round(elapsed, 2),
+            "average_fps": round(self.frame_number / elapsed, 2) if elapsed else 0.0,
+            "target_fps": self.target_fps,
+            "dropped_frames": self.dropped_frames,
+            "drop_events": self.drop_events,
+            "phases_ms": {},
+        }
+        rows = list(self.history)
+        for name in ("frame_ms",) + PHASES + ("gpu_ms",):
+            values = np.array([row[name] for row in rows if row[name] is not None], dtype=float)
+            if values.size:
+                p50, p95, p99 = np.percentile(values, (50, 95, 99))
+                summary["phases_ms"][name] = {
+                    "mean": round(float(values.mean()), 3), "p50": round(float(p50), 3),
+                    "p95": round(float(p95), 3), "p99": round(float(p99), 3),
+                    "max": round(float(values.max()), 3),
+                }
+        return summary
+
+    def dump(self, path_base, metadata=None):
+        """Write <path_base>.json (summary and run metadata) and <path_base>.csv (one row per frame)"""
+        os.makedirs(os.path.dirname(path_base) or ".", exist_ok=True)
+        report = {
+            "host": platform_info.node(),
+            "platform": platform_info.platform(),
+            "python": platform_info.python_version(),
+            "recorded": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            **(metadata or {}),
+            "summary": self.summary(),
+        }
+        with open(path_base + ".json", "w") as f:
+            json.dump(report, f, indent=2)
+        with open(path_base + ".csv", "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["frame", "t", "frame_ms", *PHASES, "gpu_ms", "dropped"])
+            writer.writeheader()
+            writer.writerows(self.history)
+        print(f"[STATS] Wrote {path_base}.json and {path_base}.csv")
+
+    def delete(self):
+        if self.gpu_timer is not None:
+            self.gpu_timer.delete()
+
+
+OVERLAY_VERTEX_SHADER = """
+#version 330 core
+layout(location = 0) in vec2 position;
+layout(location = 1) in vec2 texCoord;
+out vec2 uv;
+
+void main() {
+    gl_Position = vec4(position, 0.0, 1.0);
+    uv = texCoord;
+}
+"""
+
+OVERLAY_FRAGMENT_SHADER = """
+#version 330 core
+in vec2 uv;
+out vec4 fragColor;
+uniform sampler2D panel;
+
+void main() {
+    fragColor = texture(panel, uv);
+}
+"""
+
+
+class PerfOverlay:
+    """Text panel in the top-left corner, re-rendered a few times a second"""
+
+    REFRESH_INTERVAL = 0.5
+
+    def __init__(self, screen_width, screen_height, font_size=18, program_cache=None):
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.font = pygame.font.SysFont("monospace", font_size)
+        self.program = link_program(OVERLAY_VERTEX_SHADER, OVERLAY_FRAGMENT_SHADER, program_cache)
+        self.texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        self.vao = glGenVertexArrays(1)
+        self.vbo = glGenBuffers(1)
+        glBindVertexArray(self.vao)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, 6 * 4 * 4, None, GL_DYNAMIC_DRAW)
+        glEnableVertexAttribArray(0)
+        glVertexAttribPointer(0, 2, GL_FLOAT, GL_FALSE, 16, ctypes.c_void_p(0))
+        glEnableVertexAttribArray(1)
+        glVertexAttribPointer(1, 2, GL_FLOAT, GL_FALSE, 16, ctypes.c_void_p(8))
+        glBindVertexArray(0)
+        self.last_update = 0.0
+        self.has_panel = False
+
+    def update(self, lines):
+        """Re-render the panel text if it is due"""
+        now = time.perf_counter()
+        if now - self.last_update < self.REFRESH_INTERVAL:
+            return
+        self.last_update = now
+        line_height = self.font.get_linesize()
+        width = max(self.font.size(line)[0] for line in lines) + 16
+        height = line_height * len(lines) + 12
+        surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 170))
+        for i, line in enumerate(lines):
+            surface.blit(self.font.render(line, True, (120, 255, 120)), (8, 6 + i * line_height))
+        pixels = pygame.image.tostring(surface, "RGBA", True)
+
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+
+        # Pixel-exact quad anchored at the top-left corner
+        left, top = -1.0, 1.0
+        right = left + 2.0 * width / self.screen_width
+        bottom = top - 2.0 * height / self.screen_height
+        vertices = np.array([
+            left, bottom, 0.0, 0.0,   right, bottom, 1.0, 0.0,   right, top, 1.0, 1.0,
+            left, bottom, 0.0, 0.0,   right, top, 1.0, 1.0,      left, top, 0.0, 1.0,
+        ], dtype=np.float32)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, vertices.nbytes, vertices)
+        self.has_panel = True
+
+    def draw(self):
+        """Blend the panel over the frame, leaving the caller's program bound"""
+        if not self.has_panel:
+            return
+        previous_program = glGetIntegerv(GL_CURRENT_PROGRAM)
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glUseProgram(self.program)
+        glActiveTexture(GL_TEXTURE0)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glBindVertexArray(self.vao)
+        glDrawArrays(GL_TRIANGLES, 0, 6)
+        glDisable(GL_BLEND)
+        glUseProgram(previous_program)
+
+    def delete(self):
+        glDeleteTextures([self.texture])
+        glDeleteBuffers(1, [self.vbo])
+        glDeleteVertexArrays(1, [self.vao])
+        glDeleteProgram(self.program)
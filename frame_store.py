@@ -0,0 +1,448 @@
+"""
+Screen-ready frames shared between demo instances through shared memory.
+
+A video wall runs one demo per output on the same machine, all cycling the
+same library, and each instance used to decode and resize every photo for
+itself. With --frame-store the instances ask one decoder service instead:
+
+- FrameStoreService decodes each (photo, resolution) once, into a
+  multiprocessing.shared_memory segment, and answers every other request
+  for it from there. Decodes of the same frame are never run twice at once.
+- SharedFrameStore (in each instance) maps the segment read-only. The
+  service counts one reference per frame an instance holds; the reference
+  is released when the instance's array is garbage-collected (or the
+  instance disconnects), so frames in use are never evicted.
+- Unreferenced segments are evicted least recently used first once the
+  store is over its byte budget.
+
+Connections are pickled in both directions, so they are authenticated
+with a key the service draws at random when it starts. It is written to a
+file only the user can read (key_path()), which instances on the same
+account read before connecting; other users and a stale key from an earlier
+service are turned away at the handshake.
+
+Host decode work then scales with the number of distinct frames, not
+frames x instances. The first instance starts the service if none is
+running (it exits once no instance has been connected for a while), or run
+one by hand:
+    python frame_store.py --budget-mb 4096 --cache-dir ~/.crystal_ball_cache/frames
+"""
+
+from collections import OrderedDict, deque
+import hashlib
+from multiprocessing import AuthenticationError, shared_memory
+from multiprocessing.connection import Client, Listener
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+import weakref
+
+import numpy as np
+
+from frame_cache import FrameCache, FRAME_FORMAT, DEFAULT_BUDGET_MB as DEFAULT_CACHE_BUDGET_MB
+from image_pipeline import prepare_photo
+
+DEFAULT_FRAME_STORE_PORT = 47216
+DEFAULT_STORE_BUDGET_MB = 2048
+FRAME_STORE_HOST = "127.0.0.1"
+AUTHKEY_BYTES = 32
+
+# An auto-started service exits after this long without any instance connected
+AUTO_EXIT_SECONDS = 30.0
+
+
+def frame_key(path, width, height):
+    """Identity of a prepared frame (changes when the photo file changes)"""
+    st = os.stat(path)
+    ident = f"{FRAME_FORMAT}|{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}|{width}x{height}"
+    return hashlib.sha1(ident.encode("utf-8")).hexdigest()
+
+
+def key_path(port=DEFAULT_FRAME_STORE_PORT):
+    """File holding the running service's key, in a directory only this user can read"""
+    directory = os.environ.get("XDG_RUNTIME_DIR") or os.path.join(os.path.expanduser("~"), ".crystal_ball_cache")
+    return os.path.join(directory, f"frame_store_{port}.key")
+
+
+def _write_key(path, key):
+    """Write the key readable by this user only, replacing any key of an earlier service"""
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)  # Left by a crashed service with this pid; O_EXCL keeps its mode from being reused
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    os.replace(tmp, path)
+
+
+def _read_key(port):
+    """The running service's key; OSError (like a refused connection) when there is none"""
+    with open(key_path(port), "rb") as f:
+        return f.read()
+
+
+def _attach(name):
+    """Map an existing segment without this process taking ownership of it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":
+            # Older Pythons track attached segments too, and unlink them when this process exits
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class _Segment:
+    def __init__(self, shm, shape):
+        self.shm = shm
+        self.shape = shape
+        self.refs = 0
+
+
+class FrameStoreService:
+    """Decodes frames once into shared memory and hands them out by reference"""
+
+    def __init__(self, port=DEFAULT_FRAME_STORE_PORT, budget_bytes=DEFAULT_STORE_BUDGET_MB * 1024 * 1024,
+                 frame_cache=None, workers=None):
+        self.port = port
+        self.budget_bytes = budget_bytes
+        self.frame_cache = frame_cache
+        self.segments = OrderedDict()  # frame key -> _Segment, least recently used first
+        self.total_bytes = 0
+        self.hits = 0
+        self.decodes = 0
+        self.evictions = 0
+        self._decoding = {}  # frame key -> Event set when its decode finishes
+        self._decode_slots = threading.Semaphore(workers or os.cpu_count() or 2)
+        self._lock = threading.Lock()
+        self._clients = {}  # client id -> {frame key: references}
+        self._connections = {}  # client id -> open connections
+        self._idle_since = time.perf_counter()
+        self._closing = False
+        self.authkey = secrets.token_bytes(AUTHKEY_BYTES)  # Drawn per run, never a constant in the source
+
+    def acquire(self, client, path, width, height, decode_options):
+        """(segment name, shape) of a frame, decoding it on the first request; takes a reference"""
+        key = frame_key(path, width, height)
+        while True:
+            with self._lock:
+                segment = self.segments.get(key)
+                if segment is not None:
+                    self.segments.move_to_end(key)
+                    self.hits += 1
+                    return self._reference(client, key, segment)
+                pending = self._decoding.get(key)
+                if pending is None:
+                    pending = self._decoding[key] = threading.Event()
+                    break
+            pending.wait()  # Another instance is decoding it; take its result (or retry if it failed)
+        try:
+            with self._decode_slots:
+                if self.frame_cache is not None:
+                    pixels = self.frame_cache.load_or_prepare(path, width, height, **decode_options)
+                else:
+                    pixels = prepare_photo(path, width, height, **decode_options)
+            shm = shared_memory.SharedMemory(create=True, size=max(1, pixels.nbytes))
+            np.ndarray(pixels.shape, np.uint8, buffer=shm.buf)[...] = pixels
+            segment = _Segment(shm, pixels.shape)
+            with self._lock:
+                self.segments[key] = segment
+                self.total_bytes += shm.size
+                self.decodes += 1
+                reply = self._reference(client, key, segment)
+                self._evict()
+            return reply
+        finally:
+            with self._lock:
+                self._decoding.pop(key).set()
+
+    def drop_stale(self, name):
+        """Forget a segment an instance could not map (unlinked behind the store's back)"""
+        with self._lock:
+            for key, segment in list(self.segments.items()):
+                if segment.shm.name != name:
+                    continue
+                del self.segments[key]
+                self.total_bytes -= segment.shm.size
+                segment.shm.close()
+                for references in self._clients.values():
+                    references.pop(key, None)
+                break
+
+    def _reference(self, client, key, segment):
+        segment.refs += 1
+        held = self._clients[client]
+        held[key] = held.get(key, 0) + 1
+        return segment.shm.name, segment.shape
+
+    def release(self, client, names):
+        """Drop a client's references to the named segments"""
+        with self._lock:
+            held = self._clients.get(client, {})
+            by_name = {self.segments[key].shm.name: key for key in held if key in self.segments}
+            for name in names:
+                key = by_name.get(name)
+                if key is None or not held.get(key):
+                    continue
+                held[key] -= 1
+                if not held[key]:
+                    del held[key]
+                self.segments[key].refs -= 1
+            self._evict()
+
+    def _evict(self):
+        """Unlink unreferenced segments, oldest first, until the store fits its budget"""
+        for key in list(self.segments):
+            if self.total_bytes <= self.budget_bytes:
+                break
+            segment = self.segments[key]
+            if segment.refs:
+                continue  # Mapped by an instance
+            del self.segments[key]
+            self.total_bytes -= segment.shm.size
+            segment.shm.close()
+            segment.shm.unlink()  # Instances that still map it keep their pages until they close
+            self.evictions += 1
+
+    def stats(self):
+        """Frames decoded and served, evictions and shared memory in use"""
+        with self._lock:
+            return {
+                "decodes": self.decodes,
+                "hits": self.hits,
+                "evictions": self.evictions,
+                "frames": len(self.segments),
+                "referenced_frames": sum(1 for s in self.segments.values() if s.refs),
+                "bytes": self.total_bytes,
+                "budget_bytes": self.budget_bytes,
+                "instances": len(self._connections),
+            }
+
+    def _serve_connection(self, connection):
+        client = None
+        try:
+            client = connection.recv()  # Hello: the instance's id, shared by all its connections
+            with self._lock:
+                self._clients.setdefault(client, {})
+                self._connections[client] = self._connections.get(client, 0) + 1
+            while True:
+                request = connection.recv()
+                if request[0] == "release":
+                    self.release(client, request[1])  # One-way: no reply
+                    continue
+                if request[0] == "stale":
+                    self.drop_stale(request[1])  # One-way: the next acquire decodes again
+                    continue
+                try:
+                    if request[0] == "acquire":
+                        reply = self.acquire(client, *request[1:])
+                    else:
+                        reply = self.stats()
+                except Exception as e:
+                    connection.send(("error", e))
+                else:
+                    connection.send(("ok", reply))
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.close()
+            if client is not None:
+                self._disconnect(client)
+
+    def _disconnect(self, client):
+        with self._lock:
+            self._connections[client] -= 1
+            if self._connections[client]:
+                return
+            del self._connections[client]
+            # The instance is gone: everything it still held is free
+            for key, count in self._clients.pop(client).items():
+                if key in self.segments:
+                    self.segments[key].refs -= count
+            if not self._connections:
+                self._idle_since = time.perf_counter()
+            self._evict()
+
+    def serve_forever(self, exit_when_idle=None):
+        """Accept instances until interrupted, or until none has been connected for exit_when_idle seconds"""
+        listener = Listener((FRAME_STORE_HOST, self.port), authkey=self.authkey)
+        # Published only once the port is ours, so a second service never replaces the first one's key
+        _write_key(key_path(self.port), self.authkey)
+        print(f"[FRAMESTORE] Serving on {FRAME_STORE_HOST}:{self.port}, "
+              f"budget {self.budget_bytes / 1024 / 1024:.0f} MB")
+
+        if exit_when_idle:
+            def watchdog():
+                while not self._closing:
+                    time.sleep(1.0)
+                    with self._lock:
+                        idle = not self._connections and time.perf_counter() - self._idle_since > exit_when_idle
+                    if idle:
+                        self._closing = True
+                        # accept() is not interrupted by closing the listener everywhere; wake it up
+                        try:
+                            Client(listener.address, authkey=self.authkey).close()
+                        except (OSError, AuthenticationError):
+                            pass
+            threading.Thread(target=watchdog, daemon=True).start()
+
+        try:
+            while True:
+                try:
+                    connection = listener.accept()
+                except (OSError, EOFError, AuthenticationError) as e:
+                    print(f"[FRAMESTORE] Refused a connection: {e!r}")  # Wrong key, or a failed handshake
+                    continue
+                if self._closing:
+                    connection.close()
+                    break
+                threading.Thread(target=self._serve_connection, args=(connection,), daemon=True).start()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            listener.close()
+            try:
+                if _read_key(self.port) == self.authkey:
+                    os.remove(key_path(self.port))
+            except OSError:
+                pass
+            self.close()
+
+    def close(self):
+        """Unlink every segment"""
+        with self._lock:
+            for segment in self.segments.values():
+                segment.shm.close()
+                segment.shm.unlink()
+            self.segments.clear()
+            self.total_bytes = 0
+        print(f"[FRAMESTORE] Stopped after {self.decodes} decodes and {self.hits} shared hits")
+
+
+class SharedFrameStore:
+    """An instance's read-only view of the frame store service (thread-safe)"""
+
+    def __init__(self, port=DEFAULT_FRAME_STORE_PORT, authkey=None):
+        self.address = (FRAME_STORE_HOST, port)
+        self.authkey = authkey if authkey is not None else _read_key(port)
+        self.client_id = f"{os.getpid()}-{id(self)}"
+        self.frames = 0
+        self._local = threading.local()  # One connection per worker thread, so decodes overlap
+        self._connections = []
+        self._lock = threading.Lock()
+        self._released = deque()  # Segment names whose arrays were collected, not yet reported
+        self._connection()  # Fail here, not in a worker, when no service is running
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = Client(self.address, authkey=self.authkey)
+            connection.send(self.client_id)
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _call(self, *request):
+        connection = self._connection()
+        self._flush_releases(connection)
+        connection.send(request)
+        status, value = connection.recv()
+        if status == "error":
+            raise value
+        return value
+
+    def _flush_releases(self, connection):
+        names = []
+        while self._released:
+            names.append(self._released.popleft())
+        if names:
+            connection.send(("release", names))
+
+    def _unmap(self, name, shm):
+        # Runs wherever the array is collected, possibly mid-call on this thread's connection,
+        # so it only queues the release for the next request to send
+        shm.close()
+        self._released.append(name)
+
+    def get(self, path, width, height, **decode_options):
+        """Read-only (H, W, 4) frame for a photo, decoded by the service if no instance has yet"""
+        name, shape = self._call("acquire", path, width, height, decode_options)
+        try:
+            shm = _attach(name)
+        except FileNotFoundError:
+            # The segment was unlinked outside the store; have it dropped (with every reference) and decoded again
+            self._connection().send(("stale", name))
+            name, shape = self._call("acquire", path, width, height, decode_options)
+            shm = _attach(name)
+        pixels = np.ndarray(shape, np.uint8, buffer=shm.buf)
+        pixels.flags.writeable = False
+        weakref.finalize(pixels, self._unmap, name, shm)
+        self.frames += 1
+        return pixels
+
+    def stats(self):
+        """The service's counters, plus the frames this instance mapped"""
+        return dict(self._call("stats"), mapped_here=self.frames)
+
+    def close(self):
+        """Report collected frames and disconnect; the service frees whatever is still held"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            try:
+                self._flush_releases(connection)
+            except OSError:
+                pass
+            connection.close()
+
+
+def connect_frame_store(port=DEFAULT_FRAME_STORE_PORT, budget_mb=DEFAULT_STORE_BUDGET_MB, cache_dir=None,
+                        wait=10.0):
+    """SharedFrameStore for the running service, starting one in the background if there is none"""
+    try:
+        return SharedFrameStore(port)
+    except (OSError, AuthenticationError):
+        pass  # No service, or a key file left behind by one that is gone
+    command = [sys.executable, os.path.abspath(__file__), "--port", str(port), "--budget-mb", str(budget_mb),
+               "--exit-when-idle", str(AUTO_EXIT_SECONDS)]
+    if cache_dir:
+        command += ["--cache-dir", cache_dir]
+    # Its own process group, so stopping this instance (e.g. CTRL+C) leaves it serving the others
+    flags = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP} if os.name == "nt" else {"start_new_session": True}
+    subprocess.Popen(command, **flags)
+    print(f"[FRAMESTORE] Started the frame store service on port {port}")
+    deadline = time.perf_counter() + wait
+    while True:
+        time.sleep(0.1)
+        try:
+            return SharedFrameStore(port)
+        except (OSError, AuthenticationError):
+            if time.perf_counter() >= deadline:
+                raise
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Shared frame store service for demo instances on one host")
+    parser.add_argument("--port", type=int, default=DEFAULT_FRAME_STORE_PORT,
+                        help=f"Localhost port instances connect to (default: {DEFAULT_FRAME_STORE_PORT})")
+    parser.add_argument("--budget-mb", type=int, default=DEFAULT_STORE_BUDGET_MB,
+                        help=f"Shared memory for unreferenced frames in MB (default: {DEFAULT_STORE_BUDGET_MB})")
+    parser.add_argument("--cache-dir",
+                        help="Read and fill this on-disk frame cache instead of always decoding")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2,
+                        help="Decodes to run at once")
+    parser.add_argument("--exit-when-idle", type=float,
+                        help="Exit after this many seconds with no instance connected (default: run until CTRL+C)")
+    args = parser.parse_args()
+
+    cache = FrameCache(args.cache_dir, DEFAULT_CACHE_BUDGET_MB * 1024 * 1024) if args.cache_dir else None
+    FrameStoreService(args.port, args.budget_mb * 1024 * 1024, cache, args.workers).serve_forever(args.exit_when_idle)
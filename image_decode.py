@@ -0,0 +1,237 @@
+"""
+Bounded-memory decode stage for photos of any size.
+
+Decoding a 100+ MP panorama at full resolution just to shrink it to the
+screen costs gigabytes of RAM and seconds of CPU. decode_photo() decodes no
+more than the screen needs:
+
+- JPEGs use draft mode, so libjpeg's DCT scaling (1/2, 1/4, 1/8) picks the
+  smallest scale that is still at least the fitted target size.
+- Non-interlaced 8-bit PNGs whose full decode would exceed the memory
+  ceiling are decoded in horizontal strips and box-reduced strip by strip,
+  so only one strip is ever held at full resolution.
+- Anything else over the ceiling raises OversizedImageError so the
+  slideshow can skip it instead of exhausting memory.
+
+Every decode logs its size, decoded bytes, time and the process peak RSS.
+"""
+
+import io
+import os
+import struct
+import sys
+import time
+import zlib
+
+from PIL import Image
+
+from image_pipeline import fit_size, DEFAULT_MAX_DECODE_MB, EXIF_ORIENTATION
+
+try:
+    import resource  # Peak RSS is only reported where getrusage exists (not Windows)
+except ImportError:
+    resource = None
+
+# PIL's decompression-bomb guard would reject big panoramas at open(); the
+# ceiling below is enforced per image instead
+Image.MAX_IMAGE_PIXELS = None
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}  # Color type -> samples per pixel
+INFLATE_CHUNK = 1 << 20
+
+# Full-resolution bytes held per strip pixel at peak: the wrapped strip PNG
+# plus PIL's 4-byte pixels, and a palette-to-RGB conversion on top
+STRIP_BYTES_PER_PIXEL = 12
+
+
+class OversizedImageError(Exception):
+    """Photo cannot be decoded within the per-image memory ceiling"""
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux and the BSDs KB
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def exif_orientation(img):
+    """EXIF orientation from the header, without decoding any pixels.
+
+    img.getexif() on a PNG loads the whole image looking for a late eXIf
+    chunk, which is exactly the full decode this module avoids.
+    """
+    exif = Image.Exif()
+    if "exif" in img.info:
+        exif.load(img.info["exif"])
+    return exif.get(EXIF_ORIENTATION, 1)
+
+
+def target_size(img, screen_width, screen_height):
+    """Fitted size in the file's stored orientation (EXIF rotation swaps the axes)"""
+    rotated = exif_orientation(img) in (5, 6, 7, 8)
+    width, height = (img.height, img.width) if rotated else img.size
+    fit_width, fit_height = fit_size(width, height, screen_width, screen_height)
+    return (fit_height, fit_width) if rotated else (fit_width, fit_height)
+
+
+def decoded_bytes(width, height):
+    """Memory PIL uses for a decoded multi-band image (4 bytes per pixel)"""
+    return width * height * 4
+
+
+def decode_photo(path, screen_width, screen_height, max_decode_bytes=DEFAULT_MAX_DECODE_MB * 1024 * 1024):
+    """Decode a photo to an RGB PIL image no larger than needed for the screen"""
+    start = time.perf_counter()
+    img = Image.open(path)
+    full_size = img.size
+    target = target_size(img, screen_width, screen_height)
+    method = "full"
+
+    if img.format == "JPEG":
+        img.draft("RGB", target)
+        if img.size != full_size:
+            method = f"draft 1/{full_size[0] // img.size[0]}"
+
+    if decoded_bytes(*img.size) <= max_decode_bytes:
+        img = img.convert("RGB") if img.mode != "RGB" else img
+        img.load()
+    elif img.format == "PNG":
+        img = decode_png_strips(img, path, target, max_decode_bytes)
+        method = f"strips 1/{full_size[0] // img.width}"
+    else:
+        img.close()
+        raise OversizedImageError(
+            f"{full_size[0]}x{full_size[1]} {img.format} needs "
+            f"{decoded_bytes(*img.size) / 1024 / 1024:.0f} MB, ceiling is {max_decode_bytes / 1024 / 1024:.0f} MB")
+
+    peak = peak_rss_mb()
+    peak_text = f", peak RSS {peak:.0f} MB" if peak is not None else ""
+    print(f"[DECODE] {os.path.basename(path)}: {full_size[0]}x{full_size[1]} -> "
+          f"{img.width}x{img.height} ({method}), {decoded_bytes(*img.size) / 1024 / 1024:.1f} MB, "
+          f"{time.perf_counter() - start:.2f}s{peak_text}")
+    return img
+
+
+def _png_chunks(f):
+    """Yield (type, data) for each PNG chunk, splitting IDAT into bounded pieces"""
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        length, chunk_type = struct.unpack(">I4s", header)
+        if chunk_type == b"IDAT":
+            while length:
+                piece = f.read(min(length, INFLATE_CHUNK))
+                if not piece:
+                    return
+                length -= len(piece)
+                yield chunk_type, piece
+        else:
+            yield chunk_type, f.read(length)
+        f.read(4)  # CRC
+        if chunk_type == b"IEND":
+            return
+
+
+def _png_chunk(chunk_type, data):
+    crc = zlib.crc32(chunk_type + data) & 0xffffffff
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", crc)
+
+
+def decode_png_strips(img, path, target, max_decode_bytes):
+    """Decode an 8-bit non-interlaced PNG strip by strip, box-reducing as it goes.
+
+    Each strip is re-wrapped as a small standalone PNG whose first row is the
+    previous strip's last reconstructed row, stored unfiltered. PIL's C
+    decoder then undoes the Up/Average/Paeth filters of the strip correctly,
+    and that extra row is dropped afterwards.
+    """
+    width, height = img.size
+    exif = img.info.get("exif")
+    img.close()
+
+    factor = max(1, min(width // target[0], height // target[1]))
+    out_width, out_height = -(-width // factor), -(-height // factor)
+    strip_budget = max_decode_bytes - decoded_bytes(out_width, out_height)
+    strip_rows = strip_budget // (width * STRIP_BYTES_PER_PIXEL) // factor * factor
+    if strip_rows < factor:
+        raise OversizedImageError(
+            f"{width}x{height} PNG cannot be reduced 1/{factor} within "
+            f"{max_decode_bytes / 1024 / 1024:.0f} MB")
+
+    with open(path, "rb") as f:
+        if f.read(8) != PNG_SIGNATURE:
+            raise OversizedImageError("not a PNG file")
+        chunks = _png_chunks(f)
+        ihdr = None
+        side_chunks = []
+        idat_pieces = []
+        for chunk_type, data in chunks:
+            if chunk_type == b"IHDR":
+                ihdr = data
+            elif chunk_type in (b"PLTE", b"tRNS"):
+                side_chunks.append(_png_chunk(chunk_type, data))
+            elif chunk_type == b"IDAT":
+                idat_pieces.append(data)
+                break
+
+        bit_depth, color_type, interlace = ihdr[8], ihdr[9], ihdr[12]
+        if bit_depth != 8 or interlace or color_type not in PNG_CHANNELS:
+            raise OversizedImageError(
+                f"{width}x{height} PNG (depth {bit_depth}, interlace {interlace}) cannot be strip-decoded")
+        row_bytes = 1 + width * PNG_CHANNELS[color_type]
+
+        def idat_data():
+            yield from idat_pieces
+            for chunk_type, data in chunks:
+                if chunk_type == b"IDAT":
+                    yield data
+
+        output = Image.new("RGB", (out_width, out_height))
+        inflater = zlib.decompressobj()
+        pending = bytearray()
+        previous_row = bytes(row_bytes - 1)  # PNG treats the row above the image as zeros
+        y = 0
+
+        def flush_strip(rows):
+            nonlocal previous_row, y
+            strip_ihdr = ihdr[:4] + struct.pack(">I", rows + 1) + ihdr[8:]
+            raw = bytearray(b"\x00")
+            raw += previous_row
+            raw += memoryview(pending)[:rows * row_bytes]
+            del pending[:rows * row_bytes]
+            idat = _png_chunk(b"IDAT", zlib.compress(raw, 0))
+            del raw
+            strip_png = b"".join((PNG_SIGNATURE, _png_chunk(b"IHDR", strip_ihdr), *side_chunks,
+                                  idat, _png_chunk(b"IEND", b"")))
+            del idat
+            with Image.open(io.BytesIO(strip_png)) as strip:
+                strip.load()
+                del strip_png
+                previous_row = strip.crop((0, rows, width, rows + 1)).tobytes()
+                if strip.mode not in ("RGB", "RGBA", "L", "LA"):
+                    strip = strip.convert("RGB")  # reduce() needs a non-palette mode
+                reduced = strip.reduce(factor, box=(0, 1, width, rows + 1)).convert("RGB")
+            output.paste(reduced, (0, y // factor))
+            y += rows
+
+        for data in idat_data():
+            while data:
+                pending += inflater.decompress(data, INFLATE_CHUNK)
+                data = inflater.unconsumed_tail
+                while len(pending) >= strip_rows * row_bytes:
+                    flush_strip(strip_rows)
+        pending += inflater.flush()
+        while y < height:
+            rows = min(strip_rows, height - y, len(pending) // row_bytes)
+            if rows == 0:
+                break  # Truncated file: keep what was decoded
+            flush_strip(rows)
+
+    if exif:
+        output.info["exif"] = exif  # Keep EXIF orientation for exif_transpose
+    return output
@@ -0,0 +1,129 @@
+"""
+CPU side of the photo pipeline: decode, orient and fit a photo into a
+screen-ready pixel buffer.
+
+Buffers hold only the fitted photo, not a full-screen black canvas; the
+shader places them on screen with the rectangle from letterbox_rect().
+They are RGBX (H, W, 4) uint8, top row first: every row is 4-byte aligned,
+so uploads go straight to RGBA8 textures without a per-pixel repack, and
+the shader flips the rows through its texture coordinates.
+
+Bytes allocated and written per photo after the decode, for D decoded
+bytes and F fitted pixels (PIL holds RGB in 4 bytes per pixel):
+
+    before: D (exif_transpose copy, even when upright) + 4F (resize)
+            + 4F (flip) + 3F (tobytes) + 3F (np.array)  = D + 14F
+    after:  4F (resize) + 4F (transpose, rotated photos only)
+            + 4F (RGBX bytes, wrapped by NumPy without a copy) = 8F-12F
+
+A 12 MP photo on a 1920x1080 screen (decoded 2000x1500, fitted 1440x1080)
+drops from 34 MB to 12 MB, and the rotation now runs on the fitted frame
+instead of the decoded one.
+
+Nothing in here touches OpenGL or pygame, so it is safe to run on worker
+threads or in worker processes. The GL thread only uploads the result.
+PIL is imported on the first decode, not with the module, so the geometry
+helpers cost nothing at startup.
+"""
+
+import numpy as np
+import glob
+import os
+
+# Thumbnails are prepared for a screen this many times smaller in each direction
+THUMBNAIL_DIVISOR = 8
+
+# EXIF tag holding the camera orientation (1 = upright)
+EXIF_ORIENTATION = 0x0112
+
+# Per-image decode memory ceiling enforced by image_decode (here so it can be read without loading PIL)
+DEFAULT_MAX_DECODE_MB = 1024
+
+def find_photos(patterns):
+    """All photo files matching the glob patterns, sorted by path"""
+    photo_paths = set()
+    for pattern in patterns:
+        photo_paths.update(p for p in glob.glob(pattern) if os.path.isfile(p))
+    return sorted(photo_paths)
+
+
+def fit_size(img_width, img_height, screen_width, screen_height):
+    """Size of an image scaled to fit the screen while keeping its aspect ratio"""
+    img_ratio = img_width / img_height
+    screen_ratio = screen_width / screen_height
+
+    if img_ratio > screen_ratio:
+        new_width = screen_width
+        new_height = int(screen_width / img_ratio)
+    else:
+        new_height = screen_height
+        new_width = int(screen_height * img_ratio)
+
+    return max(1, new_width), max(1, new_height)
+
+
+def thumbnail_size(screen_width, screen_height):
+    """Target size of the thumbnail tier for a screen: an eighth of it, like JPEG's smallest DCT scale"""
+    return max(1, screen_width // THUMBNAIL_DIVISOR), max(1, screen_height // THUMBNAIL_DIVISOR)
+
+
+def letterbox_rect(frame_width, frame_height, screen_width, screen_height):
+    """Screen UV rectangle (x, y, width, height) a fitted frame is centered in, bottom-up like GL"""
+    left = (screen_width - frame_width) // 2
+    top = (screen_height - frame_height) // 2
+    bottom = screen_height - frame_height - top
+    return (left / screen_width, bottom / screen_height,
+            frame_width / screen_width, frame_height / screen_height)
+
+
+def orient_and_resize(img, screen_width, screen_height):
+    """Resize a PIL image to fit the screen, then apply its EXIF orientation.
+
+    Resizing in the stored orientation first means the rotation (if any)
+    copies the fitted frame rather than the full decoded image.
+    """
+    from PIL import Image
+
+    # CRITICAL: Apply EXIF orientation to fix upside-down/rotated photos
+    orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+    method = {
+        2: Image.Transpose.FLIP_LEFT_RIGHT,
+        3: Image.Transpose.ROTATE_180,
+        4: Image.Transpose.FLIP_TOP_BOTTOM,
+        5: Image.Transpose.TRANSPOSE,
+        6: Image.Transpose.ROTATE_270,
+        7: Image.Transpose.TRANSVERSE,
+        8: Image.Transpose.ROTATE_90,
+    }.get(orientation)
+
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if orientation in (5, 6, 7, 8):
+        # Fit the displayed (swapped) size, resize in the stored orientation
+        new_height, new_width = fit_size(img.height, img.width, screen_width, screen_height)
+    else:
+        new_width, new_height = fit_size(img.width, img.height, screen_width, screen_height)
+    img = img.resize((new_width, new_height), Image.LANCZOS)
+    return img.transpose(method) if method is not None else img
+
+
+def frame_pixels(img):
+    """(H, W, 4) RGBX uint8 view of an RGB PIL image, top row first"""
+    # One packing copy into a bytes object that NumPy wraps read-only, instead
+    # of np.array()'s tobytes() plus a second copy
+    data = img.tobytes("raw", "RGBX")
+    return np.frombuffer(data, dtype=np.uint8).reshape(img.height, img.width, 4)
+
+
+def prepare_image(img, screen_width, screen_height):
+    """Turn a PIL image into an (H, W, 4) RGBX uint8 array fitted to the screen, top row first"""
+    # No black canvas: the shader letterboxes, so only the photo is stored and uploaded
+    return frame_pixels(orient_and_resize(img, screen_width, screen_height))
+
+
+def prepare_photo(path, screen_width, screen_height, **decode_options):
+    """Decode a photo file and prepare it for upload (worker entry point)"""
+    from image_decode import decode_photo  # image_decode imports fit_size from here
+
+    with decode_photo(path, screen_width, screen_height, **decode_options) as img:
+        return prepare_image(img, screen_width, screen_height)
@@ -0,0 +1,557 @@
+"""
+Drawing the crystal ball frame.
+
+The original single pass (FRAGMENT_SHADER) runs the whole lens/dissolve
+shader over a fullscreen quad, so every pixel pays for the sin-hash noise
+and two texture fetches even when nothing is changing. The bounded path
+splits the frame instead:
+
+- a background pass over just the letterboxed photo area (the bars are
+  cleared to black), and
+- a lens pass over the square bounding the sphere, discarding outside it.
+
+Each pass has a "steady" variant for when one photo is shown on both units
+with the crossfade finished, which drops the dissolve noise and the second
+photo's fetches, and a "crossfade" variant with the full dissolve. The
+variants are compiled from the same source with CROSSFADE defined or not.
+Both paths produce the same image.
+
+Every program also comes in two shader maths: "analytic" evaluates the
+noise hash and lens curves per pixel as the original shader did, "lut"
+fetches them from the precomputed textures in lens_tables.py.
+
+Per-frame state is kept lean for PyOpenGL, where every call costs
+microseconds of Python: all programs read their values from one uniform
+buffer, rewritten with a single orphaning glBufferData per frame, and the
+photo and lookup textures stay bound on units 1-4 between frames. Unit 0
+is left for uploads and the other passes, so their binds never disturb
+ours.
+
+Every program ends with a dimming stage: the brightness uniform scales
+linear light (applied to the sRGB-encoded output through DISPLAY_GAMMA),
+so fades to black run at the frame rate without touching the monitor.
+"""
+
+import ctypes
+
+from OpenGL.GL import *
+from OpenGL.raw.GL.VERSION.GL_1_5 import glBufferData as raw_glBufferData
+import numpy as np
+
+from lens_tables import (SHADER_MATHS, NOISE_SIZE, LENS_TABLE_WIDTH, LENS_TABLE_ROWS, STRENGTH_RANGE,
+                         noise_table, lens_table)
+from program_cache import link_program
+from dimming import DISPLAY_GAMMA
+
+RENDER_PATHS = ("bounded", "full")
+
+# Every per-frame value, shared by all programs (both stages declare it identically)
+FRAME_UNIFORMS = """
+layout(std140) uniform FrameUniforms {
+    vec4 photoRect1;      // Screen UV rectangle (x, y, w, h) each photo is letterboxed into
+    vec4 photoRect2;
+    vec4 backgroundRect;  // Screen UV quads of the background (or full) pass and the lens pass
+    vec4 lensRect;
+    vec2 texScale1;       // Share of the texture storage each photo occupies
+    vec2 texScale2;
+    vec2 sphereCenter;
+    vec2 resolution;
+    float crossfade;
+    float sphereRadius;
+    float strength;
+    float brightness;     // Linear-light scale of the output, 1.0 = undimmed
+};
+"""
+
+# Float offsets of the FrameUniforms members under std140 (vec4s first, so nothing is padded)
+PHOTO_RECT1, PHOTO_RECT2, BACKGROUND_RECT, LENS_RECT = slice(0, 4), slice(4, 8), slice(8, 12), slice(12, 16)
+TEX_SCALE1, TEX_SCALE2, SPHERE_CENTER, RESOLUTION = slice(16, 18), slice(18, 20), slice(20, 22), slice(22, 24)
+CROSSFADE, SPHERE_RADIUS, STRENGTH, BRIGHTNESS = 24, 25, 26, 27
+FRAME_UNIFORM_FLOATS = 28  # Block size, a whole number of vec4s
+FRAME_UNIFORM_BINDING = 0
+
+# Unit 0 is everyone else's scratch unit; the lens renderer's textures stay bound above it
+PHOTO_UNITS = (1, 2)
+NOISE_UNIT = 3
+LENS_LUT_UNIT = 4
+
+# Covers QUAD_RECT (one of the block's pass rectangles) and passes the screen UV along
+QUAD_VERTEX_SHADER = """
+layout(location = 0) in vec2 corner;  // Unit quad, 0..1
+out vec2 fragCoord;
+
+void main() {
+    fragCoord = QUAD_RECT.xy + corner * QUAD_RECT.zw;
+    gl_Position = vec4(fragCoord * 2.0 - 1.0, 0.0, 1.0);
+}
+"""
+
+# Samplers and helpers shared by every fragment program
+SHADER_COMMON = FRAME_UNIFORMS + """
+uniform sampler2D tex1;
+uniform sampler2D tex2;
+
+#ifdef SHADER_LUT
+uniform sampler2D noiseTex;  // Tiling noise: background dissolve in r, sphere dissolve in g
+uniform sampler2D lensLut;   // Columns of squared normalized distance, rows of strength
+
+float backgroundNoise(vec2 uv) {
+    return texelFetch(noiseTex, ivec2(gl_FragCoord.xy) & (NOISE_SIZE - 1), 0).r;
+}
+
+float sphereNoise(vec2 sourceUV) {
+    return texelFetch(noiseTex, ivec2(sourceUV * resolution) & (NOISE_SIZE - 1), 0).g;
+}
+
+// Distortion factor, edge darkening and highlight intensity at a squared normalized distance
+vec3 lensTerms(float distSq) {
+    vec2 at = vec2(distSq, (strength - STRENGTH_MIN) / (STRENGTH_MAX - STRENGTH_MIN));
+    vec2 size = vec2(LENS_TABLE_WIDTH, LENS_TABLE_ROWS);
+    return textureLod(lensLut, (at * (size - 1.0) + 0.5) / size, 0.0).rgb;
+}
+#else
+// Random noise function for dissolve pattern
+float random(vec2 st) {
+    return fract(sin(dot(st.xy, vec2(12.9898,78.233))) * 43758.5453123);
+}
+
+float backgroundNoise(vec2 uv) { return random(uv * 500.0); }  // Higher frequency for finer pattern
+float sphereNoise(vec2 sourceUV) { return random(sourceUV * 100.0); }
+#endif
+
+// Sample a letterboxed photo at a screen UV - black outside the photo
+vec3 samplePhoto(sampler2D tex, vec4 rect, vec2 texScale, vec2 uv) {
+    vec2 local = (uv - rect.xy) / rect.zw;
+    if (any(lessThan(local, vec2(0.0))) || any(greaterThan(local, vec2(1.0)))) {
+        return vec3(0.0);
+    }
+    // Frames are stored top row first, so the flip happens here instead of on the CPU.
+    // Stay half a texel inside the photo so filtering never reaches unused storage
+    vec2 halfTexel = 0.5 / vec2(textureSize(tex, 0));
+    vec2 st = vec2(local.x, 1.0 - local.y) * texScale;
+    return texture(tex, clamp(st, halfTexel, texScale - halfTexel)).rgb;
+}
+
+vec3 photo1(vec2 uv) { return samplePhoto(tex1, photoRect1, texScale1, uv); }
+vec3 photo2(vec2 uv) { return samplePhoto(tex2, photoRect2, texScale2, uv); }
+
+// Dimming stage: scale linear light, i.e. the encoded output by brightness^(1/gamma)
+vec4 dimmed(vec3 color) {
+    if (brightness < 1.0) {
+        color *= pow(brightness, 1.0 / DISPLAY_GAMMA);
+    }
+    return vec4(color, 1.0);
+}
+"""
+
+# GLSL Fragment Shader - GPU-accelerated lens distortion with DISSOLVE effect
+FULL_MAIN = """
+void main() {
+    vec2 uv = gl_FragCoord.xy / resolution;  // Exact pixel centers, whatever quad is drawn
+    vec2 center = sphereCenter / resolution;
+    float radius = sphereRadius / resolution.x;
+    
+    vec2 delta = uv - center;
+#ifdef SHADER_LUT
+    float distSq = dot(delta, delta) / (radius * radius);
+#else
+    float dist = length(delta);
+#endif
+    
+    // Generate dissolve pattern (organic random noise)
+    float dissolveNoise = backgroundNoise(uv);
+    
+    // Smooth dissolve with wider soft edges for organic look
+    float dissolveEdge = 0.15;  // Wider soft edge for smoother transition
+    float dissolveMix = smoothstep(crossfade - dissolveEdge, crossfade + dissolveEdge, dissolveNoise);
+    
+    // Sample both textures with dissolve effect
+    vec3 color1 = photo1(uv);
+    vec3 color2 = photo2(uv);
+    vec3 baseColor = mix(color1, color2, dissolveMix);
+    
+#ifdef SHADER_LUT
+    if (distSq < 1.0) {
+        vec3 lens = lensTerms(distSq);
+        vec2 sourceUV = center + delta * lens.r;
+        vec2 offset = delta * (0.01 / radius);  // 0.01 * normDist * normalize(delta), without the sqrt
+#else
+    if (dist < radius) {
+        float normDist = dist / radius;
+        float z = sqrt(1.0 - normDist * normDist);
+        float distortion = 1.0 / (1.0 + strength * (1.0 - z));
+        
+        vec2 distortedDelta = delta * distortion;
+        vec2 sourceUV = center + distortedDelta;
+        
+        // Chromatic aberration on both textures with dissolve
+        float aberration = 0.01 * normDist;
+        vec2 offset = aberration * normalize(delta);
+#endif
+        vec3 color1_distorted, color2_distorted;
+        
+        color1_distorted.r = photo1(sourceUV - offset).r;
+        color1_distorted.g = photo1(sourceUV).g;
+        color1_distorted.b = photo1(sourceUV + offset).b;
+        
+        color2_distorted.r = photo2(sourceUV - offset).r;
+        color2_distorted.g = photo2(sourceUV).g;
+        color2_distorted.b = photo2(sourceUV + offset).b;
+        
+        // Apply dissolve pattern to distorted colors
+        float dissolveNoise_sphere = sphereNoise(sourceUV);
+        float dissolveThreshold_sphere = crossfade + (dissolveNoise_sphere - 0.5) * 0.1;
+        float dissolveMix_sphere = smoothstep(dissolveThreshold_sphere - 0.1, dissolveThreshold_sphere + 0.1, dissolveNoise_sphere);
+        
+        vec3 color = mix(color1_distorted, color2_distorted, dissolveMix_sphere);
+        
+        // Specular highlight
+        vec2 highlightPos = center + vec2(-0.3, -0.3) * radius;
+#ifdef SHADER_LUT
+        vec2 highlightDelta = (uv - highlightPos) / (radius * 0.3);
+        color += vec3(lensTerms(dot(highlightDelta, highlightDelta)).b);  // Zero past the highlight's edge
+        
+        // Edge darkening
+        color *= lens.g;
+#else
+        float highlightDist = length(uv - highlightPos);
+        if (highlightDist < radius * 0.3) {
+            float intensity = pow(1.0 - highlightDist / (radius * 0.3), 2.0);
+            color += vec3(intensity * 0.5);
+        }
+        
+        // Edge darkening
+        float edgeDarken = 1.0 - 0.4 * pow(normDist, 2.0);
+        color *= edgeDarken;
+#endif
+        
+        fragColor = dimmed(color);
+    } else {
+        fragColor = dimmed(baseColor);
+    }
+}
+"""
+
+# Background pass: the undistorted photos, dissolving only while crossfading
+BACKGROUND_MAIN = """
+void main() {
+    vec2 uv = gl_FragCoord.xy / resolution;  // Exact pixel centers, whatever quad is drawn
+#ifdef CROSSFADE
+    float dissolveNoise = backgroundNoise(uv);
+    float dissolveEdge = 0.15;
+    float dissolveMix = smoothstep(crossfade - dissolveEdge, crossfade + dissolveEdge, dissolveNoise);
+    fragColor = dimmed(mix(photo1(uv), photo2(uv), dissolveMix));
+#else
+    fragColor = dimmed(photo1(uv));
+#endif
+}
+"""
+
+# Lens pass: drawn over the sphere's bounding square, everything outside is discarded
+LENS_MAIN = """
+void main() {
+    vec2 uv = gl_FragCoord.xy / resolution;  // Exact pixel centers, whatever quad is drawn
+    vec2 center = sphereCenter / resolution;
+    float radius = sphereRadius / resolution.x;
+
+    vec2 delta = uv - center;
+#ifdef SHADER_LUT
+    float distSq = dot(delta, delta) / (radius * radius);
+    if (distSq >= 1.0) {
+        discard;  // The background pass already drew this pixel
+    }
+
+    vec3 lens = lensTerms(distSq);
+    vec2 sourceUV = center + delta * lens.r;
+    vec2 offset = delta * (0.01 / radius);  // 0.01 * normDist * normalize(delta), without the sqrt
+#else
+    float dist = length(delta);
+    if (dist >= radius) {
+        discard;  // The background pass already drew this pixel
+    }
+
+    float normDist = dist / radius;
+    float z = sqrt(1.0 - normDist * normDist);
+    float distortion = 1.0 / (1.0 + strength * (1.0 - z));
+    vec2 sourceUV = center + delta * distortion;
+
+    // Chromatic aberration
+    vec2 offset = 0.01 * normDist * normalize(delta);
+#endif
+    vec3 color;
+    color.r = photo1(sourceUV - offset).r;
+    color.g = photo1(sourceUV).g;
+    color.b = photo1(sourceUV + offset).b;
+#ifdef CROSSFADE
+    vec3 color2;
+    color2.r = photo2(sourceUV - offset).r;
+    color2.g = photo2(sourceUV).g;
+    color2.b = photo2(sourceUV + offset).b;
+
+    float dissolveNoise_sphere = sphereNoise(sourceUV);
+    float dissolveThreshold_sphere = crossfade + (dissolveNoise_sphere - 0.5) * 0.1;
+    float dissolveMix_sphere = smoothstep(dissolveThreshold_sphere - 0.1, dissolveThreshold_sphere + 0.1, dissolveNoise_sphere);
+    color = mix(color, color2, dissolveMix_sphere);
+#endif
+
+    // Specular highlight
+    vec2 highlightPos = center + vec2(-0.3, -0.3) * radius;
+#ifdef SHADER_LUT
+    vec2 highlightDelta = (uv - highlightPos) / (radius * 0.3);
+    color += vec3(lensTerms(dot(highlightDelta, highlightDelta)).b);  // Zero past the highlight's edge
+
+    // Edge darkening
+    color *= lens.g;
+#else
+    float highlightDist = length(uv - highlightPos);
+    if (highlightDist < radius * 0.3) {
+        float intensity = pow(1.0 - highlightDist / (radius * 0.3), 2.0);
+        color += vec3(intensity * 0.5);
+    }
+
+    // Edge darkening
+    color *= 1.0 - 0.4 * pow(normDist, 2.0);
+#endif
+    fragColor = dimmed(color);
+}
+"""
+
+# Table sizes the SHADER_LUT code indexes with
+LUT_DEFINES = (f"#define NOISE_SIZE {NOISE_SIZE}\n"
+               f"#define LENS_TABLE_WIDTH {float(LENS_TABLE_WIDTH)}\n"
+               f"#define LENS_TABLE_ROWS {float(LENS_TABLE_ROWS)}\n"
+               f"#define STRENGTH_MIN {float(STRENGTH_RANGE[0])}\n"
+               f"#define STRENGTH_MAX {float(STRENGTH_RANGE[1])}\n")
+
+
+def variant_source(main_source, crossfading, shader_math="analytic"):
+    """Fragment program for one pass, with or without the dissolve, in either shader math"""
+    defines = f"#define DISPLAY_GAMMA {float(DISPLAY_GAMMA)}\n"
+    if crossfading:
+        defines += "#define CROSSFADE\n"
+    if shader_math == "lut":
+        defines += "#define SHADER_LUT\n" + LUT_DEFINES
+    return "#version 330 core\n" + defines + "in vec2 fragCoord;\nout vec4 fragColor;\n" + SHADER_COMMON + main_source
+
+
+def quad_vertex_source(quad_rect):
+    """Vertex program drawing the quad of one pass ("backgroundRect" or "lensRect")"""
+    return f"#version 330 core\n#define QUAD_RECT {quad_rect}\n" + FRAME_UNIFORMS + QUAD_VERTEX_SHADER
+
+
+# The original shader, as the demo first shipped it
+FRAGMENT_SHADER = variant_source(FULL_MAIN, True)
+
+
+def lookup_texture(table, internal_format, pixel_format, pixel_type, filtering, wrap):
+    """Upload one of the lens_tables arrays as a 2D texture"""
+    texture = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture)
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+    glTexImage2D(GL_TEXTURE_2D, 0, internal_format, table.shape[1], table.shape[0], 0,
+                 pixel_format, pixel_type, np.ascontiguousarray(table))
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, filtering)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, filtering)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, wrap)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, wrap)
+    return texture
+
+
+def union_rect(a, b):
+    """Smallest (x, y, w, h) covering both rectangles"""
+    left, bottom = min(a[0], b[0]), min(a[1], b[1])
+    right, top = max(a[0] + a[2], b[0] + b[2]), max(a[1] + a[3], b[1] + b[3])
+    return (left, bottom, right - left, top - bottom)
+
+
+class LensRenderer:
+    """Draws the crystal ball frame with the bounded passes or the original fullscreen pass"""
+
+    FULL_SCREEN = (0.0, 0.0, 1.0, 1.0)
+
+    def __init__(self, width, height, path="bounded", shader_math="lut", program_cache=None):
+        self.width = width
+        self.height = height
+        self.path = path
+        self.shader_math = shader_math
+        if path == "full":
+            sources = {"full": (variant_source(FULL_MAIN, True, shader_math), "backgroundRect")}
+        else:
+            sources = {
+                "background_steady": (variant_source(BACKGROUND_MAIN, False, shader_math), "backgroundRect"),
+                "background_crossfade": (variant_source(BACKGROUND_MAIN, True, shader_math), "backgroundRect"),
+                "lens_steady": (variant_source(LENS_MAIN, False, shader_math), "lensRect"),
+                "lens_crossfade": (variant_source(LENS_MAIN, True, shader_math), "lensRect"),
+            }
+        self.programs = {}
+        for name, (fragment_source, quad_rect) in sources.items():
+            program = link_program(quad_vertex_source(quad_rect), fragment_source, program_cache)
+            self.programs[name] = program
+            glUniformBlockBinding(program, glGetUniformBlockIndex(program, "FrameUniforms"),
+                                  FRAME_UNIFORM_BINDING)
+            glUseProgram(program)
+            glUniform1i(glGetUniformLocation(program, "tex1"), PHOTO_UNITS[0])
+            glUniform1i(glGetUniformLocation(program, "tex2"), PHOTO_UNITS[1])
+            if shader_math == "lut":
+                glUniform1i(glGetUniformLocation(program, "noiseTex"), NOISE_UNIT)
+                glUniform1i(glGetUniformLocation(program, "lensLut"), LENS_LUT_UNIT)
+        # Programs drawn per frame, in order, by variant
+        if path == "full":
+            self.passes = {"steady": [self.programs["full"]], "crossfade": [self.programs["full"]]}
+        else:
+            self.passes = {variant: [self.programs["background_" + variant], self.programs["lens_" + variant]]
+                           for variant in ("steady", "crossfade")}
+
+        self.uniforms = np.zeros(FRAME_UNIFORM_FLOATS, dtype=np.float32)
+        # The raw entry point with a fixed pointer skips PyOpenGL's per-call array conversion
+        self.uniforms_pointer = ctypes.c_void_p(self.uniforms.ctypes.data)
+        self.uniforms[RESOLUTION] = (width, height)
+        self.uniforms[BACKGROUND_RECT] = self.FULL_SCREEN
+        self.uniforms[BRIGHTNESS] = 1.0
+        self.ubo = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.ubo)
+        glBufferData(GL_UNIFORM_BUFFER, self.uniforms.nbytes, self.uniforms, GL_DYNAMIC_DRAW)
+        glBindBufferBase(GL_UNIFORM_BUFFER, FRAME_UNIFORM_BINDING, self.ubo)
+
+        # Bound once; nothing else uses units 3 and 4
+        self.lookup_textures = []
+        if shader_math == "lut":
+            self.lookup_textures = [
+                lookup_texture(noise_table(), GL_RG8, GL_RG, GL_UNSIGNED_BYTE, GL_NEAREST, GL_REPEAT),
+                lookup_texture(lens_table(), GL_RGB32F, GL_RGB, GL_FLOAT, GL_LINEAR, GL_CLAMP_TO_EDGE),
+            ]
+            for unit, texture in zip((NOISE_UNIT, LENS_LUT_UNIT), self.lookup_textures):
+                glActiveTexture(GL_TEXTURE0 + unit)
+                glBindTexture(GL_TEXTURE_2D, texture)
+            glActiveTexture(GL_TEXTURE0)
+        self.bound_photos = [None, None]  # Textures on PHOTO_UNITS, so unchanged binds are skipped
+
+        corners = np.array([0.0, 0.0, 1.0, 0.0, 0.0, 1.0, 1.0, 1.0], dtype=np.float32)
+        self.vao = glGenVertexArrays(1)
+        self.vbo = glGenBuffers(1)
+        glBindVertexArray(self.vao)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, corners.nbytes, corners, GL_STATIC_DRAW)
+        glEnableVertexAttribArray(0)
+        glVertexAttribPointer(0, 2, GL_FLOAT, GL_FALSE, 8, ctypes.c_void_p(0))
+
+        self.rect1 = self.rect2 = self.FULL_SCREEN
+        self.frames = {"steady": 0, "crossfade": 0}
+        self.shaded_area = 0.0
+        self.warm_up()
+        print(f"[RENDER] {path} render path, {shader_math} shader math, {len(self.programs)} programs")
+
+    def warm_up(self, texture1=0, texture2=0):
+        """Draw every variant once into the bound framebuffer.
+
+        Drivers often finish compiling a program on its first draw, and
+        again for each framebuffer and texture format; doing it up front
+        (with the photo textures that will be used) keeps that hitch off
+        the first frames and the first crossfade.
+        """
+        self._bind_photos(texture1, texture2)
+        self.uniforms[BACKGROUND_RECT] = self.uniforms[LENS_RECT] = (0.0, 0.0, 1.0 / self.width, 1.0 / self.height)
+        self._upload_uniforms()
+        glBindVertexArray(self.vao)
+        for program in self.programs.values():
+            glUseProgram(program)
+            glDrawArrays(GL_TRIANGLE_STRIP, 0, 4)
+        glFinish()
+        glBindVertexArray(0)
+
+    def resize(self, width, height):
+        """Render into a width x height target from now on (dynamic resolution)"""
+        self.width = width
+        self.height = height
+        self.uniforms[RESOLUTION] = (width, height)
+
+    def set_brightness(self, brightness):
+        """Dim the output to a share (0-1) of full display light from the next draw on"""
+        self.uniforms[BRIGHTNESS] = min(1.0, max(0.0, brightness))
+
+    def set_placement(self, rect1, scale1, rect2, scale2):
+        """Letterbox uniforms (from TexturePool.placement) for both photos"""
+        self.rect1, self.rect2 = rect1, rect2
+        self.uniforms[PHOTO_RECT1] = rect1
+        self.uniforms[TEX_SCALE1] = scale1
+        self.uniforms[PHOTO_RECT2] = rect2
+        self.uniforms[TEX_SCALE2] = scale2
+
+    def invalidate_bindings(self):
+        """Rebind the photos on the next draw (after other code used units 1 and 2)"""
+        self.bound_photos = [None, None]
+
+    def _bind_photos(self, texture1, texture2):
+        changed = False
+        for slot, (unit, texture) in enumerate(zip(PHOTO_UNITS, (texture1, texture2))):
+            if self.bound_photos[slot] != texture:
+                glActiveTexture(GL_TEXTURE0 + unit)
+                glBindTexture(GL_TEXTURE_2D, texture)
+                self.bound_photos[slot] = texture
+                changed = True
+        if changed:
+            glActiveTexture(GL_TEXTURE0)
+
+    def _upload_uniforms(self):
+        # The buffer stays bound to GL_UNIFORM_BUFFER from __init__; nothing else uses that target.
+        # Respecifying the whole store orphans the copy earlier draws still read, rather than waiting on them
+        raw_glBufferData(GL_UNIFORM_BUFFER, self.uniforms.nbytes, self.uniforms_pointer, GL_STREAM_DRAW)
+
+    def sphere_rect(self, sphere_center, sphere_radius):
+        """Screen UV square bounding the sphere, padded a pixel and clipped to the screen"""
+        # The shader measures the radius in UV units of the width on both axes
+        radius = sphere_radius / self.width
+        pad_x, pad_y = 1.0 / self.width, 1.0 / self.height
+        left = max(0.0, sphere_center[0] / self.width - radius - pad_x)
+        bottom = max(0.0, sphere_center[1] / self.height - radius - pad_y)
+        right = min(1.0, sphere_center[0] / self.width + radius + pad_x)
+        top = min(1.0, sphere_center[1] / self.height + radius + pad_y)
+        return (left, bottom, max(0.0, right - left), max(0.0, top - bottom))
+
+    def draw(self, texture1, texture2, crossfade, sphere_center, sphere_radius, strength):
+        """Draw one frame into the bound framebuffer (cleared to black by the caller)"""
+        # One photo on both units with the dissolve finished: nothing can change but the lens
+        steady = crossfade >= 1.0 and texture1 == texture2
+        variant = "steady" if steady else "crossfade"
+        self.frames[variant] += 1
+
+        uniforms = self.uniforms
+        uniforms[CROSSFADE] = crossfade
+        uniforms[SPHERE_CENTER] = sphere_center
+        uniforms[SPHERE_RADIUS] = sphere_radius
+        uniforms[STRENGTH] = strength
+        if self.path == "full":
+            background = lens = self.FULL_SCREEN
+            self.shaded_area += 1.0
+        else:
+            background = self.rect1 if steady else union_rect(self.rect1, self.rect2)
+            lens = self.sphere_rect(sphere_center, sphere_radius)
+            self.shaded_area += background[2] * background[3] + lens[2] * lens[3]
+        uniforms[BACKGROUND_RECT] = background
+        uniforms[LENS_RECT] = lens
+        self._upload_uniforms()
+
+        self._bind_photos(texture1, texture2)
+        glBindVertexArray(self.vao)
+        for program in self.passes[variant]:
+            glUseProgram(program)
+            glDrawArrays(GL_TRIANGLE_STRIP, 0, 4)
+
+    def stats(self):
+        """Frames per variant and the average share of the screen the shaders ran on"""
+        frames = sum(self.frames.values())
+        return {
+            "path": self.path,
+            "shader_math": self.shader_math,
+            "steady_frames": self.frames["steady"],
+            "crossfade_frames": self.frames["crossfade"],
+            "shaded_screen_pct": round(100 * self.shaded_area / max(1, frames), 1),
+        }
+
+    def delete(self):
+        for program in self.programs.values():
+            glDeleteProgram(program)
+        if self.lookup_textures:
+            glDeleteTextures(self.lookup_textures)
+        glDeleteBuffers(2, [self.vbo, self.ubo])
+        glDeleteVertexArrays(1, [self.vao])
@@ -0,0 +1,57 @@
+"""
+Lookup tables that replace the lens shader's per-pixel transcendental math.
+
+The analytic shader hashes every pixel with sin() for the dissolve noise
+and evaluates sqrt, a division and two pow() calls per lens pixel. In
+"lut" mode it samples two small tables built here at startup instead:
+
+- a tiling noise tile, background noise in channel 0 and sphere noise in
+  channel 1, fetched per pixel without filtering, and
+- a radial lens table indexed by squared normalized distance (columns) and
+  lens strength (rows) holding the distortion factor, the edge darkening
+  and the specular highlight falloff, sampled with linear filtering.
+
+Squared distance is used as the index so the shader never needs a sqrt.
+The tables are plain NumPy arrays, so the CPU reference renderer samples
+exactly the same values as the GPU.
+"""
+
+import numpy as np
+
+SHADER_MATHS = ("analytic", "lut")
+
+NOISE_SIZE = 256  # Noise tile edge in texels, a power of two so it wraps with a mask
+NOISE_SEED = 1994
+
+LENS_TABLE_WIDTH = 1024  # Samples of squared normalized distance, 0..1
+LENS_TABLE_ROWS = 64  # Samples of lens strength across STRENGTH_RANGE
+STRENGTH_RANGE = (0.0, 4.0)  # sphere_motion() breathes between ~1.7 and ~2.9
+
+
+def noise_table(size=NOISE_SIZE, seed=NOISE_SEED):
+    """(size, size, 2) uint8 white noise: background dissolve in [..., 0], sphere dissolve in [..., 1]"""
+    return np.random.default_rng(seed).integers(0, 256, (size, size, 2), dtype=np.uint8)
+
+
+def lens_table(width=LENS_TABLE_WIDTH, rows=LENS_TABLE_ROWS, strength_range=STRENGTH_RANGE):
+    """(rows, width, 3) float32 lens terms: distortion factor, edge darkening, highlight intensity.
+
+    Column i is squared normalized distance i / (width - 1) from the sphere
+    center (or from the highlight center, for the highlight term); row j is
+    strength evenly spaced over strength_range. Only the distortion depends
+    on strength.
+    """
+    dist_sq = np.linspace(0.0, 1.0, width)
+    strength = np.linspace(strength_range[0], strength_range[1], rows)[:, None]
+
+    z = np.sqrt(1.0 - dist_sq)
+    distortion = 1.0 / (1.0 + strength * (1.0 - z))
+    edge_darken = np.broadcast_to(1.0 - 0.4 * dist_sq, distortion.shape)
+    highlight = np.broadcast_to(0.5 * (1.0 - np.sqrt(dist_sq)) ** 2, distortion.shape)
+    return np.stack([distortion, edge_darken, highlight], axis=2).astype(np.float32)
+
+
+def strength_row(strength, strength_range=STRENGTH_RANGE):
+    """Lens strength as a 0..1 coordinate across the table rows"""
+    low, high = strength_range
+    return (strength - low) / (high - low)
@@ -0,0 +1,125 @@
+"""
+In-memory LRU of prepared frames, biased toward where the user is browsing.
+
+The prefetcher only keeps a window of photos around the current one, so
+going back past it with LEFT/RIGHT meant another decode (or at best another
+read from the disk frame cache) for a photo that was on screen seconds ago.
+MemoryFrameCache keeps every frame the prefetcher has shown or finished
+decoding in RAM, up to a byte budget, so any recently seen photo comes back
+with no decode at all - whether auto-advance, manual navigation or a
+control command asks for it.
+
+Eviction is least recently used, except for frames near the current photo:
+up to RETAIN_AHEAD photos ahead in the browsing direction and RETAIN_BEHIND
+behind it are kept while anything else can go, since those are the ones the
+next key press or photo change will want. Only the render thread uses the
+cache, so it has no lock.
+
+Frames memory-mapped from the disk cache (frame_cache.py) or the shared
+frame store (frame_store.py) must not be kept as they are: holding the
+mapping would pin a file the disk cache may evict or a segment the store
+wants back, and would not actually keep the pixels in RAM. put() stores
+what it is given without copying, since it runs on the render thread; the
+prefetcher passes its frames through owned_frame() on its workers first.
+"""
+
+from collections import OrderedDict
+import mmap
+
+import numpy as np
+
+DEFAULT_MEMORY_BUDGET_MB = 512
+
+# Photos either side of the current one that outlast older frames elsewhere
+RETAIN_AHEAD = 4
+RETAIN_BEHIND = 2
+
+
+class MemoryFrameCache:
+    """Byte-budgeted LRU of prepared frames, keyed by photo path and target size"""
+
+    def __init__(self, budget_bytes=DEFAULT_MEMORY_BUDGET_MB * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+        self.frames = OrderedDict()  # (path, width, height) -> pixels, least recently used first
+        self.total_bytes = 0
+        self.positions = {}  # path -> index in the photo list
+        self.center = 0
+        self.direction = 1
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def set_paths(self, photo_paths):
+        """Follow an updated photo list, dropping frames of photos no longer in it"""
+        self.positions = {path: i for i, path in enumerate(photo_paths)}
+        for key in [key for key in self.frames if key[0] not in self.positions]:
+            self._remove(key)
+
+    def focus(self, center, direction=0):
+        """Current photo index and browsing direction (+1 forward, -1 back, 0 unchanged)"""
+        self.center = center
+        if direction:
+            self.direction = 1 if direction > 0 else -1
+
+    def get(self, path, width, height):
+        """Frame prepared for a width x height target, or None"""
+        key = (path, width, height)
+        pixels = self.frames.get(key)
+        if pixels is None:
+            self.misses += 1
+            return None
+        self.frames.move_to_end(key)
+        self.hits += 1
+        return pixels
+
+    def put(self, path, width, height, pixels):
+        """Keep a frame, evicting others until the cache is back under budget"""
+        key = (path, width, height)
+        if key in self.frames:
+            self.frames.move_to_end(key)
+            return
+        if pixels.nbytes > self.budget_bytes:
+            return
+        self.frames[key] = pixels
+        self.total_bytes += pixels.nbytes
+        while self.total_bytes > self.budget_bytes:
+            self._remove(self._victim(key))
+            self.evictions += 1
+
+    def _reach(self, path):
+        """Distance from the current photo in retained-window units (1 or less is inside it)"""
+        position = self.positions.get(path)
+        if position is None:
+            return float("inf")
+        count = len(self.positions)
+        ahead = (position - self.center) * self.direction % count
+        behind = (count - ahead) % count
+        return min(ahead / RETAIN_AHEAD, behind / RETAIN_BEHIND)
+
+    def _victim(self, newest):
+        for key in self.frames:  # Least recently used first
+            if key != newest and self._reach(key[0]) > 1:
+                return key
+        # Everything older is close by: give up the farthest, which may be the new frame itself
+        return max(self.frames, key=lambda key: self._reach(key[0]))
+
+    def _remove(self, key):
+        self.total_bytes -= self.frames.pop(key).nbytes
+
+    def stats(self):
+        """Hit, miss and eviction counters with the bytes held"""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "frames": len(self.frames), "bytes": self.total_bytes, "budget_bytes": self.budget_bytes}
+
+
+def owned_frame(pixels):
+    """`pixels` in memory of its own: a frame viewing an mmap (a .npy file or a shared
+    memory segment) is copied into a read-only array, anything else is returned as is"""
+    base = pixels
+    while base is not None:
+        if isinstance(base, mmap.mmap):
+            pixels = np.array(pixels)
+            pixels.flags.writeable = False  # Same contract as the read-only mapping it replaces
+            return pixels
+        base = getattr(base, "base", None)
+    return pixels
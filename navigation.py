@@ -0,0 +1,101 @@
+"""
+Coalesced LEFT/RIGHT navigation with a thumbnail tier.
+
+Every arrow press used to start a full-resolution load of the next photo
+relative to the current one, so mashing RIGHT queued decode after decode
+for photos that were skipped a moment later, and holding the key did
+nothing at all. Navigator turns presses (and auto-repeat while an arrow is
+held) into one moving target:
+
+- Each step moves the target at once. The demo shows the target's
+  thumbnail, a small frame (1/8 of the screen) from a separate prefetcher
+  with a wide window, which decodes in milliseconds and is kept in the
+  frame cache next to the full-size frames.
+- Only when input has been quiet for SETTLE_SECONDS does the burst's
+  final target get a full-quality load, which then replaces the thumbnail
+  in place.
+- Queued full decodes are cancelled when a burst starts, and uploads of
+  photos the user has already skipped past are dropped when they land.
+"""
+
+# Quiet time after the last step before the target gets its full-quality load
+SETTLE_SECONDS = 0.25
+
+# Auto-repeat for a held arrow key
+REPEAT_DELAY = 0.4
+REPEAT_INTERVAL = 0.08
+
+# Thumbnails kept decoded on each side of the target
+DEFAULT_THUMBNAIL_DEPTH = 10
+
+
+class Navigator:
+    """Turns bursts of arrow presses into a single target photo"""
+
+    def __init__(self, settle_seconds=SETTLE_SECONDS):
+        self.settle_seconds = settle_seconds
+        self.target = None  # Photo index while a burst is under way
+        self.step = 1  # Direction of the last step
+        self.held = 0  # Direction of the arrow key held down
+        self.last_input = None
+        self.next_repeat = None
+        self.steps = 0
+        self.bursts = 0
+        self.thumbnails_shown = 0
+        self.refined = 0
+        self.dropped_uploads = 0
+
+    def press(self, step, origin, count, now):
+        """Arrow key went down: move the target one photo from origin (or from the current target)"""
+        self.held = step
+        self.next_repeat = now + REPEAT_DELAY
+        return self._step(step, origin, count, now)
+
+    def release(self, step):
+        """Arrow key came up"""
+        if self.held == step:
+            self.held = 0
+
+    def repeat(self, count, now):
+        """New target when a held key is due to repeat, otherwise None"""
+        if not self.held or now < self.next_repeat:
+            return None
+        self.next_repeat = now + REPEAT_INTERVAL  # A slow frame skips repeats rather than bursting
+        return self._step(self.held, None, count, now)
+
+    def jump(self, target, now):
+        """Move the target straight to a photo (remote control), settling like any burst"""
+        if self.target is None:
+            self.bursts += 1
+        self.target = target
+        self.steps += 1
+        self.last_input = now
+        return self.target
+
+    def _step(self, step, origin, count, now):
+        if self.target is None:
+            self.target = origin
+            self.bursts += 1
+        self.target = (self.target + step) % count
+        self.step = step
+        self.steps += 1
+        self.last_input = now
+        return self.target
+
+    def settled(self, now):
+        """The burst's final target, once, after input has been quiet long enough"""
+        if self.target is None or self.held or now - self.last_input < self.settle_seconds:
+            return None
+        target, self.target = self.target, None
+        return target
+
+    def stats(self):
+        """Steps taken, full loads they were coalesced into, and thumbnail refinements"""
+        return {
+            "steps": self.steps,
+            "full_loads": self.bursts,
+            "coalesced_steps": self.steps - self.bursts,
+            "thumbnails_shown": self.thumbnails_shown,
+            "refined_in_place": self.refined,
+            "dropped_uploads": self.dropped_uploads,
+        }
@@ -0,0 +1,201 @@
+"""
+Indexed, incremental photo library.
+
+Globbing a network share with tens of thousands of photos takes minutes, so
+the library keeps a local SQLite index of every photo (path, size, mtime and
+EXIF orientation). Startup reads the index immediately and a background
+thread rescans the roots: unchanged files only cost a directory entry,
+changed or new files get their header re-read, and vanished files are
+dropped. Photos under a root or folder that cannot be listed (an offline
+share) stay indexed until it can be read again. New path lists are
+published for the render loop to merge live.
+"""
+
+import bisect
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_ROOTS = ['P:\\']
+DEFAULT_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.tif', '.tiff', '.bmp')
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".crystal_ball_cache", "library.sqlite")
+
+# Publish what has been found so far every this many new photos
+PUBLISH_EVERY = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS photos (
+    path TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    orientation INTEGER NOT NULL
+)
+"""
+
+
+class PhotoLibrary:
+    """Photo list backed by a persistent index and kept fresh by background rescans"""
+
+    def __init__(self, roots=DEFAULT_ROOTS, index_path=DEFAULT_INDEX_PATH,
+                 extensions=DEFAULT_EXTENSIONS, recursive=True):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.index_path = index_path
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.recursive = recursive
+        self.photo_paths = []
+        self.scanning = False
+        self._published = None  # Newest path list not yet taken by poll()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute(SCHEMA)
+
+    def _connect(self):
+        db = sqlite3.connect(self.index_path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")  # Readers never wait for the rescan
+        return db
+
+    def load_index(self):
+        """Photos recorded under the configured roots, sorted by path"""
+        placeholders = ",".join("?" * len(self.roots))
+        with self._connect() as db:
+            rows = db.execute(f"SELECT path FROM photos WHERE root IN ({placeholders}) ORDER BY path",
+                              self.roots).fetchall()
+        self.photo_paths = [row[0] for row in rows]
+        return self.photo_paths
+
+    def _walk(self, root, unreadable):
+        """Yield (path, stat) for every photo under root, adding directories it cannot list to `unreadable`"""
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if self.recursive:
+                                    stack.append(entry.path)
+                            elif entry.name.lower().endswith(self.extensions):
+                                yield entry.path, entry.stat()
+                        except OSError:
+                            continue
+            except OSError as e:
+                unreadable.append(directory)
+                print(f"[LIBRARY] Cannot read {directory}: {e}")
+
+    def _publish(self, paths):
+        with self._changed:
+            self._published = sorted(paths)
+            self._changed.notify_all()
+
+    def scan(self):
+        """Incrementally rescan every root, updating the index; returns the sorted paths"""
+        # Imported here, on the scan thread, so loading PIL never delays startup
+        from PIL import Image
+        from image_decode import exif_orientation
+
+        start = time.time()
+        self.scanning = True
+        db = self._connect()
+        try:
+            known = {path: (root, size, mtime_ns) for path, root, size, mtime_ns in
+                     db.execute("SELECT path, root, size, mtime_ns FROM photos")}
+            current = {p for p, (root, _, _) in known.items() if root in self.roots}
+            seen = set()
+            unreadable = []  # Offline shares and the like: what was under them is not known to be gone
+            added = updated = 0
+
+            for root in self.roots:
+                for path, st in self._walk(root, unreadable):
+                    if self._stop.is_set():
+                        return sorted(current)
+                    seen.add(path)
+                    if known.get(path) == (root, st.st_size, st.st_mtime_ns):
+                        continue
+                    try:
+                        with Image.open(path) as img:
+                            orientation = exif_orientation(img)
+                    except Exception:
+                        orientation = 1  # Unreadable headers still get listed; decode decides later
+                    db.execute("INSERT OR REPLACE INTO photos VALUES (?, ?, ?, ?, ?)",
+                               (path, root, st.st_size, st.st_mtime_ns, orientation))
+                    if path in current:
+                        updated += 1
+                    else:
+                        current.add(path)
+                        added += 1
+                        if added % PUBLISH_EVERY == 0:
+                            db.commit()
+                            self._publish(current)
+
+            prefixes = tuple(os.path.join(directory, "") for directory in unreadable)
+            removed = {path for path in current - seen if not path.startswith(prefixes)}
+            if unreadable:
+                print(f"[LIBRARY] Keeping {len(current - seen - removed)} indexed photos under "
+                      f"{len(unreadable)} unreadable folder(s)")
+            db.executemany("DELETE FROM photos WHERE path = ?", ((p,) for p in removed))
+            db.commit()
+            current -= removed
+        finally:
+            db.close()
+            self.scanning = False
+
+        print(f"[LIBRARY] Rescan: {len(current)} photos, {added} new, {updated} changed, "
+              f"{len(removed)} removed in {time.time() - start:.1f}s")
+        self._publish(current)
+        return sorted(current)
+
+    def start_rescan(self, interval=0):
+        """Rescan in the background, once or every `interval` seconds"""
+        def worker():
+            while not self._stop.is_set():
+                try:
+                    self.scan()
+                except Exception as e:
+                    print(f"[LIBRARY] Rescan failed: {e}")
+                    self._publish(self.photo_paths)  # Wake anyone waiting for a first list
+                if interval <= 0 or self._stop.wait(interval):
+                    break
+
+        self._thread = threading.Thread(target=worker, daemon=True)
+        self._thread.start()
+
+    def poll(self, timeout=None):
+        """New sorted path list if the rescan changed it, else None.
+
+        With a timeout, waits that long for a first list (used when the index
+        is still empty on a first run).
+        """
+        with self._changed:
+            if self._published is None and timeout:
+                self._changed.wait(timeout)
+            published, self._published = self._published, None
+        if published is None or published == self.photo_paths:
+            return None
+        self.photo_paths = published
+        return published
+
+    def wait_for_photos(self):
+        """Block until the rescan publishes photos (first run with an empty index)"""
+        while not self.photo_paths:
+            if self.poll(timeout=0.5) is None and not (self._thread and self._thread.is_alive()):
+                break
+        return self.photo_paths
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+
+def path_index(photo_paths, path):
+    """Index of path in a sorted list, or of the photo that took its place if it was removed"""
+    if not photo_paths:
+        raise ValueError("no photo can take the place of a path in an empty list")
+    return min(bisect.bisect_left(photo_paths, path), len(photo_paths) - 1)
@@ -0,0 +1,128 @@
+"""
+Refresh modes for always-on installs.
+
+The demo used to redraw and swap at the full refresh rate forever, even
+when SPACE had paused the sphere and no dissolve was running, so a paused
+kiosk burned as much GPU and CPU as an animating one. RefreshGovernor
+picks one of three modes per frame:
+
+- "full": something is changing quickly (a dissolve, a pending photo,
+  input); redraw at the target rate, paced by the FrameScheduler.
+- "ambient": only the sphere is drifting between photo changes; redraw at
+  --ambient-fps (off unless set), sleeping on input in between.
+- "idle": the frame is static (paused, dissolve finished, nothing
+  loading); the last frame stays on screen and the loop blocks on input
+  until the next scheduled photo change.
+
+Any event wakes a wait immediately. The wait keeps it and events() hands it
+to the loop ahead of the rest of the queue, so input keeps its order and
+brings full-rate rendering back at once. The
+governor also counts frames, wall time and process CPU time per mode, as
+energy proxies for comparing configurations.
+"""
+
+import time
+
+import pygame
+
+REFRESH_MODES = ("full", "ambient", "idle")
+
+# Longest single idle wait, so a lost wakeup can never freeze the slideshow for long
+MAX_IDLE_SECONDS = 60.0
+
+
+class RefreshGovernor:
+    """Chooses how often the render loop redraws, waits between frames and tallies the cost"""
+
+    def __init__(self, scheduler, ambient_fps=0, idle=True):
+        self.scheduler = scheduler
+        self.full_fps = scheduler.target_fps or scheduler.refresh_hz
+        self.ambient_fps = ambient_fps
+        self.idle = idle
+        self.mode = "full"
+        self.frames = dict.fromkeys(REFRESH_MODES, 0)
+        self.wall_seconds = dict.fromkeys(REFRESH_MODES, 0.0)
+        self.cpu_seconds = dict.fromkeys(REFRESH_MODES, 0.0)
+        self.wakeups = 0  # Waits cut short by an event
+        self._woken_by = []  # The event that cut the last wait short, not yet handled
+        self.last_wall = time.perf_counter()
+        self.last_cpu = time.process_time()
+        self.frame_start = self.last_wall
+
+    def choose(self, steady, static):
+        """Mode for the frame just drawn: static frames idle, steady ones (only motion) go ambient"""
+        if static and self.idle:
+            mode = "idle"
+        elif steady and self.ambient_fps > 0:
+            mode = "ambient"
+        else:
+            mode = "full"
+        if mode != self.mode:
+            rate = {"full": self.scheduler.target_fps and f"{self.full_fps:g} fps" or "uncapped",
+                    "ambient": f"{self.ambient_fps:g} fps",
+                    "idle": "until input or the next photo"}[mode]
+            print(f"[POWER] {mode} refresh ({rate})")
+            self.mode = mode
+        return mode
+
+    def frame_interval(self):
+        """Refresh interval the current mode paces frames to, in seconds"""
+        return 1.0 / (self.ambient_fps if self.mode == "ambient" else self.full_fps)
+
+    def pace(self, idle_seconds=None):
+        """Wait out the rest of this frame for the current mode.
+
+        Full rate is left to the scheduler. Ambient frames sleep until the
+        next ambient frame is due, and idle frames until idle_seconds from
+        now; both return early on input.
+        """
+        if self.mode == "full":
+            self.scheduler.pace()
+            return
+        if self.mode == "ambient":
+            self._wait(self.frame_start + 1.0 / self.ambient_fps - time.perf_counter())
+        else:
+            self._wait(min(MAX_IDLE_SECONDS, idle_seconds if idle_seconds is not None else MAX_IDLE_SECONDS))
+        self.scheduler.resync()  # A deliberate wait is not jitter
+
+    def _wait(self, seconds):
+        if seconds <= 0:
+            return
+        event = pygame.event.wait(max(1, int(seconds * 1000)))
+        if event.type != pygame.NOEVENT:
+            self.wakeups += 1
+            # Posting it back would queue it behind anything that arrived since
+            self._woken_by.append(event)
+
+    def events(self):
+        """Events for the loop to handle this frame, in the order they arrived (replaces pygame.event.get())"""
+        events, self._woken_by = self._woken_by, []
+        return events + pygame.event.get()
+
+    def end_frame(self):
+        """Charge the frame (and any wait after it) to its mode; call once per loop iteration"""
+        now = time.perf_counter()
+        cpu = time.process_time()
+        self.frames[self.mode] += 1
+        self.wall_seconds[self.mode] += now - self.last_wall
+        self.cpu_seconds[self.mode] += cpu - self.last_cpu
+        self.last_wall = now
+        self.last_cpu = cpu
+        self.frame_start = now
+
+    def stats(self):
+        """Frames, wall time and CPU time per mode, and frames saved against full rate everywhere"""
+        wall = sum(self.wall_seconds.values()) or 1e-9
+        cpu = sum(self.cpu_seconds.values())
+        frames = sum(self.frames.values())
+        return {
+            "frames_rendered": frames,
+            "frames_saved": max(0, round(wall * self.full_fps) - frames),
+            "cpu_s": round(cpu, 2),
+            "cpu_pct": round(100 * cpu / wall, 1),
+            "wakeups": self.wakeups,
+            "modes": {mode: {"frames": self.frames[mode],
+                             "time_pct": round(100 * self.wall_seconds[mode] / wall, 1),
+                             "cpu_s": round(self.cpu_seconds[mode], 2)}
+                      for mode in REFRESH_MODES},
+        }
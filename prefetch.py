@@ -0,0 +1,196 @@
+"""
+Background prefetch of screen-ready photo buffers.
+
+The render loop never decodes: it asks the prefetcher whether a photo is
+ready and uploads the finished pixel buffer. A window of `depth` photos on
+each side of the current one is decoded ahead of time on a worker pool, and
+anything that falls out of the window (e.g. the user skipped ahead) is
+cancelled or dropped. With a FrameCache attached, workers read memory-mapped
+frames from disk and only decode on a miss. With a SharedFrameStore
+(frame_store.py) they ask the host's decoder service instead, which decodes
+each frame once for every demo instance on the machine. With a
+MemoryFrameCache (memory_cache.py), frames that leave the window stay in
+RAM, so coming back to a recent photo needs no worker at all; workers then
+copy mapped frames into memory of their own before handing them back, so
+the render thread never does.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+import os
+import weakref
+
+from image_pipeline import prepare_photo
+from memory_cache import owned_frame
+
+
+class PhotoPrefetcher:
+    """Decode/resize/letterbox photos around the current index on a worker pool"""
+
+    def __init__(self, photo_paths, screen_width, screen_height,
+                 depth=2, workers=2, use_processes=False, frame_cache=None,
+                 decode_options=None, frame_store=None, memory_cache=None):
+        self.photo_paths = photo_paths
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.depth = max(0, depth)
+        # The service decodes; workers only wait on it, so threads are enough
+        self.use_processes = use_processes and frame_store is None
+        self.frame_cache = frame_cache
+        self.frame_store = frame_store
+        self.decode_options = decode_options or {}
+        self.memory_cache = memory_cache
+        self.center = None
+        self.futures = {}  # photo index -> Future of pixel buffer
+        self.cache_keys = weakref.WeakKeyDictionary()  # Future -> memory cache key it fills
+        self.cancelled = 0
+        if memory_cache is not None:
+            memory_cache.set_paths(photo_paths)
+
+        pool_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+        self.pool = pool_class(max_workers=max(1, workers))
+        print(f"[PREFETCH] {pool_class.__name__} with {max(1, workers)} workers, "
+              f"lookahead {self.depth} each way at {screen_width}x{screen_height}")
+
+    def window(self, center):
+        """Photo indices to keep decoded around `center`, nearest first"""
+        count = len(self.photo_paths)
+        indices = [center % count]
+        for step in range(1, self.depth + 1):
+            for idx in ((center + step) % count, (center - step) % count):
+                if idx not in indices:
+                    indices.append(idx)
+        return indices
+
+    def _submit(self, idx):
+        if idx not in self.futures:
+            key = (self.photo_paths[idx], self.screen_width, self.screen_height)
+            pixels = self.memory_cache.get(*key) if self.memory_cache is not None else None
+            if pixels is not None:
+                future = self.futures[idx] = Future()
+                future.set_result(pixels)
+                self.cache_keys[future] = key
+                return future
+            if self.frame_store is not None:
+                task = self.frame_store.get
+            elif self.frame_cache is None:
+                task = prepare_photo
+            elif self.use_processes and self.memory_cache is None:
+                # Workers fill the cache; the frame is mapped here, not pickled back
+                task = self.frame_cache.build
+            else:
+                task = self.frame_cache.load_or_prepare
+            if self.memory_cache is not None:
+                # Frames kept in RAM are pickled back or copied out of their mapping on the worker
+                future = self.pool.submit(_prepare_owned, task, *key, **self.decode_options)
+            else:
+                future = self.pool.submit(task, *key, **self.decode_options)
+            self.futures[idx] = future
+            self.cache_keys[future] = key
+        return self.futures[idx]
+
+    def _pixels(self, future):
+        pixels = future.result()
+        if isinstance(pixels, str):
+            pixels = self.frame_cache.open_file(pixels)
+        return pixels
+
+    def _remember(self, future, pixels):
+        if self.memory_cache is not None:
+            self.memory_cache.put(*self.cache_keys[future], pixels)
+
+    def update(self, center):
+        """Move the lookahead window to `center`, cancelling work outside it"""
+        wanted = self.window(center)
+        count = len(self.photo_paths)
+        if self.memory_cache is not None:
+            # Browsing direction from the shorter way round the ring
+            step = 0 if self.center is None else (center - self.center) % count
+            self.memory_cache.focus(center % count, 0 if step == 0 else 1 if step <= count // 2 else -1)
+        self.center = center % count
+
+        for idx in list(self.futures):
+            if idx not in wanted:
+                future = self.futures.pop(idx)
+                # Queued work is cancelled; running work finishes and is dropped,
+                # and finished frames move to the memory cache
+                if future.cancel():
+                    self.cancelled += 1
+                elif future.done() and future.exception() is None:
+                    self._remember(future, self._pixels(future))
+
+        for idx in wanted:
+            self._submit(idx)
+
+    def cancel_queued(self):
+        """Cancel every decode that has not started yet, keeping finished and running ones.
+
+        Called when the user starts skipping through photos, so the workers
+        stop on the old window; a decode already running cannot be
+        interrupted and is kept in case the user comes back to it.
+        """
+        for idx, future in list(self.futures.items()):
+            if future.cancel():
+                del self.futures[idx]
+                self.cancelled += 1
+
+    def set_paths(self, photo_paths):
+        """Switch to an updated photo list, keeping decoded work for photos still in it"""
+        index = {path: i for i, path in enumerate(photo_paths)}
+        futures = {}
+        for idx, future in self.futures.items():
+            new_idx = index.get(self.photo_paths[idx])
+            if new_idx is None:
+                future.cancel()
+            else:
+                futures[new_idx] = future
+        self.futures = futures
+        self.photo_paths = photo_paths
+        if self.memory_cache is not None:
+            self.memory_cache.set_paths(photo_paths)
+
+    def set_target_size(self, width, height):
+        """Prepare photos entering the window for a different resolution.
+
+        Buffers already decoded or in flight are kept; the texture pool
+        places frames of any size correctly.
+        """
+        self.screen_width = width
+        self.screen_height = height
+
+    def ready(self, idx):
+        """True when the buffer for `idx` is decoded (or failed) and can be taken"""
+        future = self.futures.get(idx % len(self.photo_paths))
+        return future is not None and future.done()
+
+    def get(self, idx):
+        """Pixel buffer for `idx`, blocking until it is decoded"""
+        from image_decode import OversizedImageError  # Loads PIL, which the workers import anyway
+
+        idx %= len(self.photo_paths)
+        future = self._submit(idx)
+        try:
+            pixels = self._pixels(future)
+            self._remember(future, pixels)
+            return pixels
+        except OversizedImageError as e:
+            # Permanent: keep the failed future so the photo is not decoded again
+            print(f"[PREFETCH] Skipping {os.path.basename(self.photo_paths[idx])}: {e}")
+            return None
+        except Exception as e:
+            # Drop the failed future so a later request retries the decode
+            self.futures.pop(idx, None)
+            print(f"[PREFETCH] Failed to load {os.path.basename(self.photo_paths[idx])}: {e}")
+            return None
+
+    def shutdown(self):
+        """Cancel pending work and stop the worker pool"""
+        for future in self.futures.values():
+            future.cancel()
+        self.futures.clear()
+        # Process pools must be joined or their manager thread errors at exit
+        self.pool.shutdown(wait=self.use_processes, cancel_futures=True)
+
+
+def _prepare_owned(task, path, width, height, **decode_options):
+    """Worker entry point when frames go to a memory cache"""
+    return owned_frame(task(path, width, height, **decode_options))
@@ -0,0 +1,140 @@
+"""
+On-disk cache of linked shader programs.
+
+Every start used to compile and link each GLSL program from source, which
+costs tens of milliseconds per program and far more on some drivers, all
+while the screen is still black. ProgramCache saves each linked program
+with glGetProgramBinary and reloads it with glProgramBinary on the next
+start, skipping the GLSL compiler entirely. Entries are keyed by the GL
+vendor, renderer and version strings plus a hash of the sources, so a
+driver update or an edited shader never loads a stale binary; a binary the
+driver rejects anyway is recompiled and replaced.
+
+Without a cache (or on drivers that offer no binary formats) programs are
+compiled from source as before.
+"""
+
+import ctypes
+import hashlib
+import os
+import struct
+
+from OpenGL.GL import *
+from OpenGL.error import GLError
+
+DEFAULT_PROGRAM_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".crystal_ball_cache", "programs")
+
+# File header: binary format enum
+HEADER = struct.Struct("<I")
+
+
+def compile_program(vertex_source, fragment_source, retrievable=False):
+    """Compile and link a program from GLSL source, raising RuntimeError on failure"""
+    # Deferred: PyOpenGL's shader helpers are only needed when something is compiled
+    from OpenGL.GL.shaders import compileShader
+
+    shaders = [compileShader(vertex_source, GL_VERTEX_SHADER),
+               compileShader(fragment_source, GL_FRAGMENT_SHADER)]
+    program = glCreateProgram()
+    for shader in shaders:
+        glAttachShader(program, shader)
+    if retrievable:
+        glProgramParameteri(program, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE)
+    glLinkProgram(program)
+    for shader in shaders:
+        glDetachShader(program, shader)
+        glDeleteShader(shader)
+    if glGetProgramiv(program, GL_LINK_STATUS) != GL_TRUE:
+        log = glGetProgramInfoLog(program)
+        glDeleteProgram(program)
+        raise RuntimeError(f"Shader program failed to link: {log}")
+    return program
+
+
+def link_program(vertex_source, fragment_source, program_cache=None):
+    """Linked program for the sources, from the cache when one is given"""
+    if program_cache is None:
+        return compile_program(vertex_source, fragment_source)
+    return program_cache.link(vertex_source, fragment_source)
+
+
+class ProgramCache:
+    """Linked program binaries on disk, keyed by driver and shader source"""
+
+    def __init__(self, cache_dir=DEFAULT_PROGRAM_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.supported = bool(glGetIntegerv(GL_NUM_PROGRAM_BINARY_FORMATS))
+        self.driver = "|".join(glGetString(name).decode(errors="replace")
+                               for name in (GL_VENDOR, GL_RENDERER, GL_VERSION))
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        if self.supported:
+            os.makedirs(cache_dir, exist_ok=True)
+        else:
+            print("[PROGRAMS] Driver offers no program binary formats, compiling from source")
+
+    def key(self, vertex_source, fragment_source):
+        """Cache file for a program on this driver"""
+        ident = "\0".join((self.driver, vertex_source, fragment_source))
+        return os.path.join(self.cache_dir, hashlib.sha1(ident.encode("utf-8")).hexdigest() + ".bin")
+
+    def link(self, vertex_source, fragment_source):
+        """Program loaded from its cached binary, or compiled and cached on a miss"""
+        if not self.supported:
+            return compile_program(vertex_source, fragment_source)
+        cache_file = self.key(vertex_source, fragment_source)
+        program = self._load(cache_file)
+        if program is not None:
+            self.hits += 1
+            return program
+        self.misses += 1
+        program = compile_program(vertex_source, fragment_source, retrievable=True)
+        self._store(cache_file, program)
+        return program
+
+    def _load(self, cache_file):
+        try:
+            with open(cache_file, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) <= HEADER.size:
+            return None
+        binary_format, = HEADER.unpack_from(data)
+        binary = data[HEADER.size:]
+        program = glCreateProgram()
+        try:
+            glProgramBinary(program, binary_format, binary, len(binary))
+            linked = glGetProgramiv(program, GL_LINK_STATUS) == GL_TRUE
+        except GLError:
+            linked = False
+        if not linked:
+            # Driver changed without changing its version strings; recompile
+            glGetError()  # Clear the error a rejected format leaves when checking is off
+            glDeleteProgram(program)
+            self.rejected += 1
+            return None
+        return program
+
+    def _store(self, cache_file, program):
+        length = int(glGetProgramiv(program, GL_PROGRAM_BINARY_LENGTH))
+        if length <= 0:
+            return
+        binary = ctypes.create_string_buffer(length)
+        written = GLsizei(0)
+        binary_format = GLenum(0)
+        glGetProgramBinary(program, length, ctypes.byref(written), ctypes.byref(binary_format), binary)
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_file, "wb") as f:
+                f.write(HEADER.pack(binary_format.value))
+                f.write(binary.raw[:written.value])
+            os.replace(tmp_file, cache_file)  # Atomic, so a crash never leaves half a binary
+        except OSError as e:
+            print(f"[PROGRAMS] Could not cache program binary: {e}")
+
+    def stats(self):
+        """Binary cache hits, compiles and binaries the driver refused"""
+        return {"supported": self.supported, "hits": self.hits, "misses": self.misses,
+                "rejected": self.rejected}
@@ -0,0 +1,43 @@
+"""
+Startup timeline for boot-to-kiosk machines.
+
+Every milestone from the moment the demo module starts loading to the first
+frame on screen and the first full-quality photo is logged as a [STARTUP]
+line with its time since launch and since the previous milestone, and the
+whole timeline goes into the stats report so time-to-first-frame can be
+tracked across builds and machines.
+"""
+
+import time
+
+
+class StartupTimeline:
+    """Named milestones in perf_counter() time since `origin`"""
+
+    def __init__(self, origin=None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.marks = []  # (name, ms since origin)
+
+    def mark(self, name):
+        """Log a milestone once; repeated names are ignored"""
+        if any(mark == name for mark, _ in self.marks):
+            return
+        elapsed = (time.perf_counter() - self.origin) * 1000
+        step = elapsed - (self.marks[-1][1] if self.marks else 0.0)
+        self.marks.append((name, elapsed))
+        print(f"[STARTUP] {elapsed:8.1f} ms (+{step:6.1f}) {name}")
+
+    def elapsed_ms(self, name):
+        """Time from launch to a milestone, or None if it has not happened"""
+        for mark, elapsed in self.marks:
+            if mark == name:
+                return round(elapsed, 1)
+        return None
+
+    def stats(self):
+        """Milestones in order, with the headline times pulled out"""
+        return {
+            "first_frame_ms": self.elapsed_ms("first frame"),
+            "full_quality_ms": self.elapsed_ms("full-quality photo"),
+            "marks_ms": {name: round(elapsed, 1) for name, elapsed in self.marks},
+        }
@@ -0,0 +1,21 @@
+from benchmark import compare
+
+
+def run(**metrics):
+    return {"metrics": metrics}
+
+
+def test_small_frame_cpu_slowdown_is_a_regression():
+    baseline = run(**{"frame_cpu.p95_ms": 0.2, "frame_cpu.p50_ms": 0.1})
+    current = run(**{"frame_cpu.p95_ms": 0.4, "frame_cpu.p50_ms": 0.11})
+    assert compare(current, baseline) == ["frame_cpu.p95_ms"]  # 10% of 0.1 ms is noise
+
+
+def test_large_metrics_keep_the_absolute_floor():
+    baseline = run(**{"stage.decode.mean_ms": 40.0, "stage.array.mean_ms": 2.0})
+    current = run(**{"stage.decode.mean_ms": 46.0, "stage.array.mean_ms": 2.4})
+    assert compare(current, baseline) == ["stage.decode.mean_ms"]  # +0.4 ms is under 0.5 ms
+
+
+def test_speedups_and_new_metrics_pass():
+    assert compare(run(a=0.1, b=5.0), run(a=0.4)) == []
@@ -0,0 +1,143 @@
+import math
+import socket
+import sys
+import threading
+import types
+
+import pytest
+
+from brightness_api import BrightnessController
+from control_server import ControlClient, ControlServer, parse_brightness, parse_settings
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def server():
+    woken = threading.Event()
+    server = ControlServer(free_port(), wake=woken.set)
+    assert server.start()
+    server.woken = woken
+    yield server
+    server.stop()
+
+
+def answer_next_command(server, **result):
+    """Act as the render loop: wait for one command and reply to it"""
+    def loop():
+        server.woken.wait(5)
+        for command, args, reply in server.poll():
+            reply(command=command, args=args, **result)
+    thread = threading.Thread(target=loop)
+    thread.start()
+    return thread
+
+
+def test_ping_is_answered_without_the_render_loop(server):
+    client = ControlClient(server.port)
+    try:
+        assert client.send("ping") == {"ok": True}
+    finally:
+        client.close()
+    assert server.poll() == []
+
+
+def test_unknown_command_and_malformed_lines_are_refused(server):
+    client = ControlClient(server.port)
+    try:
+        reply = client.send("explode")
+        assert not reply["ok"] and "unknown command" in reply["error"]
+        client.sock.sendall(b"not json\n")
+        reply = client.replies.readline()
+        assert b'"ok": false' in reply
+    finally:
+        client.close()
+    assert server.stats()["errors"] == 2
+
+
+def test_commands_reach_the_render_loop_and_replies_come_back(server):
+    thread = answer_next_command(server, photo=3)
+    client = ControlClient(server.port)
+    try:
+        reply = client.send("goto", photo=3)
+    finally:
+        client.close()
+    thread.join()
+    assert reply == {"ok": True, "command": "goto", "args": {"photo": 3}, "photo": 3}
+
+
+def test_error_replies_are_counted(server):
+    def loop():
+        server.woken.wait(5)
+        for _, _, reply in server.poll():
+            reply(error="no such photo")
+    thread = threading.Thread(target=loop)
+    thread.start()
+    client = ControlClient(server.port)
+    try:
+        assert client.send("goto", photo="x") == {"ok": False, "error": "no such photo"}
+    finally:
+        client.close()
+    thread.join()
+    assert server.stats() == {"port": server.port, "commands": 1, "errors": 1}
+
+
+def test_parse_settings_accepts_valid_values():
+    assert parse_settings({"photo_display_time": "10", "crossfade_duration": 2, "ambient_fps": 0,
+                           "show_stats": 1}) == {"photo_display_time": 10.0, "crossfade_duration": 2.0,
+                                                 "ambient_fps": 0.0, "show_stats": True}
+
+
+@pytest.mark.parametrize("args", [
+    {"crossfade_duration": 0},
+    {"crossfade_duration": -1},
+    {"photo_display_time": 0},
+    {"photo_display_time": math.inf},
+    {"ambient_fps": -5},
+    {"ambient_fps": "nan"},
+    {"volume": 11},
+])
+def test_parse_settings_rejects_values_the_loop_cannot_use(args):
+    with pytest.raises(ValueError):
+        parse_settings(args)
+
+
+
+def test_parse_brightness_clamps_the_level():
+    assert parse_brightness({"level": 150, "duration": "2", "backend": "shader"}) == {
+        "level": 100.0, "duration": 2.0, "backend": "shader"}
+    assert parse_brightness({"level": -3, "cycle": 0}) == {"level": 0.0, "cycle": 0.0}
+
+
+@pytest.mark.parametrize("args", [
+    {"level": math.nan},
+    {"level": math.inf},
+    {"level": -math.inf},
+    {"duration": -1},
+    {"duration": math.inf},
+    {"cycle": math.nan},
+    {"cycle": -2},
+    {"level": "dim"},
+    {"gamma": 2.2},
+])
+def test_parse_brightness_rejects_values_the_loop_cannot_use(args):
+    with pytest.raises(ValueError):
+        parse_brightness(args)
+
+
+@pytest.mark.parametrize("backend", ["hardware", "shader", "hybrid"])
+@pytest.mark.parametrize("level", [math.nan, math.inf, -math.inf, 1e300])
+def test_controller_survives_levels_outside_0_to_100(monkeypatch, backend, level):
+    writes = []
+    fake_sbc = types.ModuleType("screen_brightness_control")
+    fake_sbc.get_brightness = lambda: [60]
+    fake_sbc.set_brightness = writes.append
+    monkeypatch.setitem(sys.modules, "screen_brightness_control", fake_sbc)
+    controller = BrightnessController(backend)
+    controller.set_brightness(level)
+    assert 0.0 <= controller.shader_level <= 100.0
+    assert all(0 <= value <= 100 for value in writes)
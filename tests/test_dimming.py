@@ -0,0 +1,111 @@
+import sys
+import types
+
+import pytest
+
+import brightness_api
+from brightness_api import (BrightnessController, HYBRID_BACKLIGHT_OFF_AFTER,
+                            HYBRID_BACKLIGHT_OFF_BELOW, HYBRID_BACKLIGHT_ON_ABOVE)
+from dimming import FadeScheduler
+
+
+def test_fade_to_interpolates_then_holds():
+    fader = FadeScheduler()
+    fader.fade_to(0, 2.0, now=10.0)
+    assert fader.level(10.0) == 100.0
+    assert fader.level(10.5) == pytest.approx(75.0)
+    assert fader.level(11.0) == pytest.approx(50.0)
+    assert fader.level(12.0) == 0.0
+    assert fader.level(99.0) == 0.0
+    assert fader.active(11.0)
+    assert not fader.active(12.0)
+
+
+def test_fade_starts_from_the_level_reached():
+    fader = FadeScheduler()
+    fader.fade_to(0, 2.0, now=0.0)
+    fader.fade_to(100, 1.0, now=1.0)  # Reversed halfway down, at 50
+    assert fader.level(1.0) == pytest.approx(50.0)
+    assert fader.level(1.5) == pytest.approx(75.0)
+    assert fader.level(2.0) == 100.0
+
+
+def test_zero_duration_fade_jumps():
+    fader = FadeScheduler()
+    fader.fade_to(30, 0.0, now=5.0)
+    assert fader.level(5.0) == 30.0
+    assert not fader.active(5.0)
+
+
+def test_cycle_is_a_triangle_wave():
+    fader = FadeScheduler()
+    fader.start_cycle(now=0.0, low=0.0, high=100.0, seconds=4.0)
+    assert fader.level(0.0) == pytest.approx(100.0)
+    assert fader.level(1.0) == pytest.approx(75.0)
+    assert fader.level(4.0) == pytest.approx(0.0)
+    assert fader.level(6.0) == pytest.approx(50.0)
+    assert fader.level(8.0) == pytest.approx(100.0)
+    assert fader.level(9.0) == pytest.approx(75.0)  # Repeats
+    assert fader.active(1000.0)
+
+
+def test_stop_cycle_holds_the_level():
+    fader = FadeScheduler()
+    fader.start_cycle(now=0.0, seconds=4.0)
+    fader.stop_cycle(now=2.0)
+    assert fader.level(2.0) == pytest.approx(50.0)
+    assert fader.level(50.0) == pytest.approx(50.0)
+    assert not fader.active(50.0)
+
+
+@pytest.fixture
+def hybrid(monkeypatch):
+    """Hybrid controller over a fake monitor, with a clock the test moves by hand"""
+    writes = []
+    fake_sbc = types.ModuleType("screen_brightness_control")
+    fake_sbc.get_brightness = lambda: [80]
+    fake_sbc.set_brightness = writes.append
+    monkeypatch.setitem(sys.modules, "screen_brightness_control", fake_sbc)
+    clock = [0.0]
+    monkeypatch.setattr(brightness_api.time, "perf_counter", lambda: clock[0])
+    controller = BrightnessController("hybrid")
+    return controller, writes, clock
+
+
+def test_hybrid_backlight_waits_for_a_held_black(hybrid):
+    controller, writes, clock = hybrid
+    controller.set_brightness(0)
+    clock[0] += HYBRID_BACKLIGHT_OFF_AFTER / 2
+    controller.set_brightness(0)
+    assert writes == []  # Not dark for long enough yet
+    clock[0] += HYBRID_BACKLIGHT_OFF_AFTER
+    controller.set_brightness(0)
+    assert writes == [0]
+    controller.set_brightness(50)
+    assert writes == [0, 80]  # Back on as soon as the picture brightens
+
+
+def test_hybrid_backlight_stays_on_when_a_fade_only_touches_black(hybrid):
+    controller, writes, clock = hybrid
+    for level in (10, 0.2, 0, 0.3, 10):
+        controller.set_brightness(level)
+        clock[0] += HYBRID_BACKLIGHT_OFF_AFTER / 3
+    assert writes == []
+
+
+def test_hybrid_backlight_band_keeps_its_state(hybrid):
+    controller, writes, clock = hybrid
+    between = (HYBRID_BACKLIGHT_OFF_BELOW + HYBRID_BACKLIGHT_ON_ABOVE) / 2
+    controller.set_brightness(0)
+    clock[0] += HYBRID_BACKLIGHT_OFF_AFTER
+    controller.set_brightness(0)
+    assert writes == [0]
+    controller.set_brightness(between)
+    controller.set_brightness(0)
+    assert writes == [0]  # Still off: the band does not switch it back on
+    controller.set_brightness(HYBRID_BACKLIGHT_ON_ABOVE)
+    controller.set_brightness(between)
+    clock[0] += HYBRID_BACKLIGHT_OFF_AFTER * 2
+    controller.set_brightness(between)
+    assert writes == [0, 80]  # And on stays on
+    assert controller.shader_level == between
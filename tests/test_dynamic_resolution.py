@@ -0,0 +1,109 @@
+import pytest
+
+from dynamic_resolution import (ResolutionController, scaled_size, HEADROOM_WINDOWS, PROBE_SECONDS,
+                                TEXTURE_SETTLE_SECONDS)
+
+WINDOW = 4
+
+
+def feed(controller, frame_ms, now, gpu_ms=None, frames=WINDOW, frame_seconds=0.01):
+    """One window of identical frames; returns (scale changed, time after the last frame)"""
+    changed = False
+    for _ in range(frames):
+        changed = controller.update(frame_ms, gpu_ms, now=now) or changed
+        now += frame_seconds
+    return changed, now
+
+
+def make_controller(**kwargs):
+    return ResolutionController(10.0, window=WINDOW, **kwargs)
+
+
+def test_waits_for_a_full_window():
+    controller = make_controller()
+    for i in range(WINDOW - 1):
+        assert not controller.update(100.0, now=i * 0.01)
+    assert controller.update(100.0, now=1.0)
+
+
+def test_drop_aims_just_under_the_budget():
+    controller = make_controller()
+    changed, _ = feed(controller, 15.0, 0.0)
+    assert changed
+    assert controller.scale == pytest.approx(0.8)  # sqrt(9 / 15) = 0.77, on the 0.1 grid
+    assert controller.drops == 1
+
+
+def test_drop_stops_at_the_minimum():
+    controller = make_controller(min_scale=0.6)
+    feed(controller, 100.0, 0.0)
+    assert controller.scale == pytest.approx(0.6)
+    changed, _ = feed(controller, 100.0, 1.0)
+    assert not changed and controller.scale == pytest.approx(0.6)
+
+
+def test_within_budget_keeps_the_scale():
+    controller = make_controller()
+    changed, _ = feed(controller, 11.0, 0.0)  # Under the frame-time tolerance
+    assert not changed and controller.scale == 1.0
+
+
+def test_cpu_bound_frames_do_not_drop_pixels_when_gpu_time_is_known():
+    controller = make_controller()
+    changed, _ = feed(controller, 30.0, 0.0, gpu_ms=4.0)
+    assert not changed and controller.scale == 1.0
+    changed, _ = feed(controller, 30.0, 1.0, gpu_ms=20.0)
+    assert changed and controller.scale < 1.0
+
+
+def test_gpu_headroom_raises_after_several_windows():
+    controller = make_controller()
+    feed(controller, 15.0, 0.0)
+    dropped = controller.scale
+    now = 1.0
+    for _ in range(HEADROOM_WINDOWS - 1):
+        changed, now = feed(controller, 5.0, now, gpu_ms=2.0)
+        assert not changed
+    changed, now = feed(controller, 5.0, now, gpu_ms=2.0)
+    assert changed and controller.scale == pytest.approx(dropped + 0.1)
+
+
+def test_failed_probe_is_undone_and_backs_off():
+    controller = make_controller()
+    feed(controller, 15.0, 0.0)
+    dropped = controller.scale
+    changed, now = feed(controller, 5.0, 1.0)
+    assert not changed  # Too soon to probe
+    changed, now = feed(controller, 5.0, PROBE_SECONDS + 1.0)
+    assert changed and controller.probing
+    changed, now = feed(controller, 15.0, now)
+    assert changed and controller.scale == pytest.approx(dropped)
+    assert controller.failed_probes == 1
+    assert controller.probe_seconds == 2 * PROBE_SECONDS
+
+
+def test_texture_scale_follows_up_at_once_and_down_once_settled():
+    controller = make_controller()
+    feed(controller, 15.0, 0.0)
+    dropped = controller.scale
+    # GPU time inside the budget but without headroom, so the render scale holds
+    feed(controller, 10.0, TEXTURE_SETTLE_SECONDS + 1.0, gpu_ms=8.0)
+    assert controller.texture_scale == 1.0  # That period started at full scale
+    feed(controller, 10.0, 2 * TEXTURE_SETTLE_SECONDS + 2.0, gpu_ms=8.0)
+    assert controller.scale == pytest.approx(dropped)
+    assert controller.texture_scale == pytest.approx(dropped)
+
+    changed, now = False, 3 * TEXTURE_SETTLE_SECONDS
+    while not changed:
+        changed, now = feed(controller, 2.0, now, gpu_ms=1.0)
+    assert controller.scale > dropped
+    assert controller.texture_scale == pytest.approx(controller.scale)
+
+
+def test_warm_up_scales_cover_the_grid_below_the_maximum():
+    assert make_controller().warm_up_scales() == [0.9, 0.8, 0.7, 0.6, 0.5]
+
+
+def test_scaled_size():
+    assert scaled_size(1920, 1080, 0.5) == (960, 540)
+    assert scaled_size(3, 3, 0.01) == (1, 1)
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pytest
+
+from frame_cache import FrameCache
+
+
+def frame(height=16, width=16, value=0):
+    return np.full((height, width, 4), value, np.uint8)
+
+
+def disk_bytes(cache):
+    return sum(size for _, size, _ in cache._entries())
+
+
+@pytest.fixture
+def photos(tmp_path):
+    paths = []
+    for i in range(4):
+        path = tmp_path / f"photo{i}.jpg"
+        path.write_bytes(b"not decoded by these tests %d" % i)
+        paths.append(str(path))
+    return paths
+
+
+def test_store_counts_new_files(tmp_path, photos):
+    cache = FrameCache(str(tmp_path / "frames"))
+    cache.store(photos[0], 16, 16, frame())
+    cache.store(photos[1], 16, 16, frame())
+    assert cache.total_bytes == disk_bytes(cache) > 0
+
+
+def test_storing_again_replaces_without_double_counting(tmp_path, photos):
+    cache = FrameCache(str(tmp_path / "frames"))
+    cache.store(photos[0], 16, 16, frame())
+    cache.store(photos[0], 16, 16, frame(value=9))
+    assert cache.total_bytes == disk_bytes(cache)
+    assert cache.lookup(photos[0], 16, 16)[0, 0, 0] == 9
+
+    cache.store(photos[0], 16, 16, frame(8, 8))  # A smaller frame under the same key
+    assert cache.total_bytes == disk_bytes(cache)
+
+
+def test_total_survives_a_restart(tmp_path, photos):
+    cache = FrameCache(str(tmp_path / "frames"))
+    cache.store(photos[0], 16, 16, frame())
+    cache.store(photos[0], 8, 8, frame(8, 8))
+    assert FrameCache(str(tmp_path / "frames")).total_bytes == cache.total_bytes
+
+
+def test_evicts_least_recently_used_to_budget(tmp_path, photos):
+    probe = FrameCache(str(tmp_path / "probe"))
+    file_bytes = os.path.getsize(probe.store(photos[0], 16, 16, frame()))
+    cache = FrameCache(str(tmp_path / "frames"), budget_bytes=2 * file_bytes)
+    for i, path in enumerate(photos[:3]):
+        cache_file = cache.store(path, 16, 16, frame())
+        os.utime(cache_file, (i, i))  # Stored in order, so photo 0 is the oldest
+    assert cache.evictions == 1
+    assert cache.total_bytes == disk_bytes(cache) == 2 * file_bytes
+    assert cache.lookup(photos[0], 16, 16) is None
+    assert cache.lookup(photos[2], 16, 16) is not None
+
+
+def test_lookup_counts_hits_and_misses(tmp_path, photos):
+    cache = FrameCache(str(tmp_path / "frames"))
+    assert cache.lookup(photos[0], 16, 16) is None
+    cache.store(photos[0], 16, 16, frame(value=3))
+    pixels = cache.lookup(photos[0], 16, 16)
+    assert isinstance(pixels, np.memmap) and pixels[5, 5, 2] == 3
+    assert cache.lookup(photos[0], 32, 32) is None  # Other target size
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_edited_photo_gets_a_new_key(tmp_path, photos):
+    cache = FrameCache(str(tmp_path / "frames"))
+    before = cache.key(photos[0], 16, 16)
+    with open(photos[0], "ab") as f:
+        f.write(b"edited")
+    assert cache.key(photos[0], 16, 16) != before
@@ -0,0 +1,113 @@
+import os
+import socket
+import stat
+import threading
+from multiprocessing import AuthenticationError, shared_memory
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from frame_store import FrameStoreService, SharedFrameStore, key_path
+from image_pipeline import prepare_photo
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path / "run"))
+    service = FrameStoreService(free_port(), budget_bytes=1 << 20, workers=1)
+    thread = threading.Thread(target=service.serve_forever, kwargs={"exit_when_idle": 0.5}, daemon=True)
+    thread.start()
+    for _ in range(100):
+        if os.path.exists(key_path(service.port)):
+            break
+        threading.Event().wait(0.05)
+    yield service
+    thread.join(timeout=5)
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / "photo.png"
+    Image.new("RGB", (32, 24), (200, 100, 50)).save(path)
+    return str(path)
+
+
+def test_key_is_random_and_readable_by_this_user_only(service):
+    path = key_path(service.port)
+    with open(path, "rb") as f:
+        assert f.read() == service.authkey
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert FrameStoreService(service.port).authkey != service.authkey
+
+
+def test_frame_round_trips_through_the_store(service, photo):
+    store = SharedFrameStore(service.port)
+    try:
+        pixels = store.get(photo, 16, 12)
+        assert not pixels.flags.writeable
+        np.testing.assert_array_equal(pixels, prepare_photo(photo, 16, 12))
+        again = store.get(photo, 16, 12)
+        np.testing.assert_array_equal(again, pixels)
+        stats = store.stats()
+        assert (stats["decodes"], stats["hits"], stats["mapped_here"]) == (1, 1, 2)
+    finally:
+        store.close()
+
+
+def test_stale_segment_is_decoded_again(service, photo):
+    store = SharedFrameStore(service.port)
+    try:
+        first = store.get(photo, 16, 12)
+        name = next(iter(service.segments.values())).shm.name
+        del first
+        unlinked = shared_memory.SharedMemory(name=name)
+        unlinked.close()
+        unlinked.unlink()  # As a tmpfs cleaner would
+        pixels = store.get(photo, 16, 12)
+        np.testing.assert_array_equal(pixels, prepare_photo(photo, 16, 12))
+        assert store.stats()["decodes"] == 2
+    finally:
+        store.close()
+
+
+def test_missing_photo_fails_the_call_not_the_connection(service, photo, tmp_path):
+    store = SharedFrameStore(service.port)
+    try:
+        with pytest.raises(FileNotFoundError):
+            store.get(str(tmp_path / "gone.png"), 16, 12)
+        assert store.get(photo, 16, 12).shape == (12, 16, 4)
+    finally:
+        store.close()
+
+
+def test_wrong_key_is_refused_and_the_service_keeps_serving(service, photo):
+    with pytest.raises(AuthenticationError):
+        SharedFrameStore(service.port, authkey=b"crystal-ball-frame-store")
+    store = SharedFrameStore(service.port)
+    try:
+        assert store.get(photo, 16, 12).shape == (12, 16, 4)
+    finally:
+        store.close()
+
+
+def test_no_key_file_means_no_service(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    with pytest.raises(OSError):
+        SharedFrameStore(free_port())
+
+
+def test_key_file_is_removed_when_the_service_stops(service):
+    path = key_path(service.port)
+    assert os.path.exists(path)
+    for _ in range(100):
+        if not os.path.exists(path):
+            break
+        threading.Event().wait(0.05)
+    assert not os.path.exists(path)  # Idle for exit_when_idle: stopped
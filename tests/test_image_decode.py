@@ -0,0 +1,91 @@
+import struct
+import types
+import zlib
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import image_decode
+from image_decode import OversizedImageError, decode_photo, peak_rss_mb
+
+
+def photo_pixels(width, height, channels=3, seed=0):
+    """Gradients plus noise, so every PNG row filter gets used"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    layers = [(x * 255 // width), (y * 255 // height), ((x + y) * 127 // (width + height))][:channels]
+    layers += [np.full_like(x, 200)] * (channels - len(layers))
+    pixels = np.stack(layers, axis=2) + rng.integers(0, 24, (height, width, channels))
+    return np.clip(pixels, 0, 255).astype(np.uint8)
+
+
+def strip_ceiling(width, factor, out_width, out_height, rows):
+    """Decode ceiling that leaves room for `rows` full-resolution rows per strip"""
+    return out_width * out_height * 4 + width * 12 * rows + factor * width * 12 - 1
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L", "P"])
+def test_png_strips_match_a_full_decode(tmp_path, mode):
+    width, height = 400, 300
+    channels = {"RGB": 3, "RGBA": 4, "L": 1, "P": 3}[mode]
+    pixels = photo_pixels(width, height, channels)
+    img = Image.fromarray(pixels[..., 0] if channels == 1 else pixels)
+    if mode == "P":
+        img = img.quantize(64)
+    path = tmp_path / "big.png"
+    img.save(path)
+
+    ceiling = strip_ceiling(width, 4, 100, 75, 8)
+    assert width * height * 4 > ceiling  # A full decode would not fit
+    decoded = decode_photo(str(path), 100, 75, max_decode_bytes=ceiling)
+
+    with Image.open(path) as full:
+        expected = full.convert("RGB").reduce(4) if mode in ("L", "P") else full.reduce(4).convert("RGB")
+    assert decoded.size == (100, 75)
+    assert np.array_equal(np.asarray(decoded), np.asarray(expected))
+
+
+def test_png_strips_keep_the_exif_orientation(tmp_path):
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    path = tmp_path / "rotated.png"
+    Image.fromarray(photo_pixels(400, 300)).save(path, exif=exif.tobytes())
+    decoded = decode_photo(str(path), 75, 100, max_decode_bytes=strip_ceiling(400, 4, 100, 75, 8))
+    assert decoded.getexif().get(0x0112) == 6
+
+
+def test_interlaced_png_over_the_ceiling_is_refused(tmp_path):
+    path = tmp_path / "interlaced.png"
+    Image.fromarray(photo_pixels(400, 300)).save(path)
+    # PIL cannot write Adam7 PNGs; the strip decoder refuses on the IHDR flag alone
+    data = bytearray(path.read_bytes())
+    data[28] = 1  # IHDR interlace method
+    data[29:33] = struct.pack(">I", zlib.crc32(bytes(data[12:29])) & 0xffffffff)
+    path.write_bytes(bytes(data))
+    with pytest.raises(OversizedImageError):
+        decode_photo(str(path), 100, 75, max_decode_bytes=strip_ceiling(400, 4, 100, 75, 8))
+
+
+def test_oversized_non_png_is_refused(tmp_path):
+    path = tmp_path / "big.bmp"
+    Image.fromarray(photo_pixels(400, 300)).save(path)
+    with pytest.raises(OversizedImageError):
+        decode_photo(str(path), 100, 75, max_decode_bytes=100_000)
+
+
+def test_jpeg_draft_decodes_no_larger_than_needed(tmp_path):
+    path = tmp_path / "big.jpg"
+    Image.fromarray(photo_pixels(1600, 1200)).save(path, quality=90)
+    decoded = decode_photo(str(path), 400, 300)
+    assert decoded.size == (400, 300)  # 1/4 DCT scale still covers the target
+    decoded = decode_photo(str(path), 500, 375)
+    assert decoded.size == (800, 600)
+
+
+@pytest.mark.parametrize("platform, maxrss", [("linux", 600 * 1024), ("darwin", 600 * 1024 * 1024)])
+def test_peak_rss_units_follow_the_platform(monkeypatch, platform, maxrss):
+    usage = types.SimpleNamespace(ru_maxrss=maxrss)
+    monkeypatch.setattr(image_decode, "resource", types.SimpleNamespace(RUSAGE_SELF=0, getrusage=lambda who: usage))
+    monkeypatch.setattr(image_decode.sys, "platform", platform)
+    assert peak_rss_mb() == 600
@@ -0,0 +1,134 @@
+import threading
+
+import numpy as np
+
+import prefetch
+from frame_cache import FrameCache
+from memory_cache import MemoryFrameCache, RETAIN_AHEAD, RETAIN_BEHIND, owned_frame
+from prefetch import PhotoPrefetcher
+
+FRAME_BYTES = 2 * 2 * 4
+
+
+def frame(value=0):
+    return np.full((2, 2, 4), value, np.uint8)
+
+
+def make_cache(frames, count=20):
+    cache = MemoryFrameCache(budget_bytes=frames * FRAME_BYTES)
+    cache.set_paths([f"p{i}" for i in range(count)])
+    return cache
+
+
+def held(cache):
+    return [key[0] for key in cache.frames]
+
+
+def test_hit_miss_and_budget():
+    cache = make_cache(2)
+    assert cache.get("p0", 2, 2) is None
+    cache.put("p0", 2, 2, frame(7))
+    assert cache.get("p0", 2, 2)[0, 0, 0] == 7
+    assert cache.get("p0", 4, 4) is None  # Other target size
+    cache.put("p1", 2, 2, frame())
+    cache.put("p2", 2, 2, frame())
+    assert len(cache.frames) == 2
+    assert cache.total_bytes == 2 * FRAME_BYTES
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 2, 1)
+
+
+def test_least_recently_used_goes_first_outside_the_window():
+    cache = make_cache(3)
+    cache.focus(0, 1)
+    for name in ("p10", "p11", "p12"):
+        cache.put(name, 2, 2, frame())
+    cache.get("p10", 2, 2)  # Now p11 is the oldest
+    cache.put("p13", 2, 2, frame())
+    assert held(cache) == ["p12", "p10", "p13"]
+
+
+def test_frames_near_the_current_photo_outlast_older_ones():
+    cache = make_cache(3)
+    cache.focus(5, 1)
+    cache.put("p6", 2, 2, frame())  # Ahead, oldest
+    cache.put("p4", 2, 2, frame())  # Behind
+    cache.put("p15", 2, 2, frame())  # Far away
+    cache.put("p7", 2, 2, frame())
+    assert sorted(held(cache)) == ["p4", "p6", "p7"]
+
+
+def test_window_follows_the_browsing_direction():
+    cache = make_cache(2)
+    cache.focus(10, -1)  # Browsing backwards: "ahead" is lower indices
+    cache.put(f"p{10 - RETAIN_AHEAD}", 2, 2, frame())
+    cache.put(f"p{10 + RETAIN_AHEAD}", 2, 2, frame())  # Past the behind window
+    cache.put("p9", 2, 2, frame())
+    assert sorted(held(cache)) == [f"p{10 - RETAIN_AHEAD}", "p9"]
+
+
+def test_new_far_frame_does_not_push_out_the_window():
+    cache = make_cache(2)
+    cache.focus(0, 1)
+    cache.put("p1", 2, 2, frame())
+    cache.put(f"p{20 - RETAIN_BEHIND}", 2, 2, frame())  # Behind, across the wrap
+    cache.put("p10", 2, 2, frame())
+    assert sorted(held(cache)) == ["p1", f"p{20 - RETAIN_BEHIND}"]
+
+
+def test_set_paths_drops_removed_photos():
+    cache = make_cache(4)
+    cache.put("p1", 2, 2, frame())
+    cache.put("p2", 2, 2, frame())
+    cache.set_paths(["p2", "p3"])
+    assert held(cache) == ["p2"]
+    assert cache.total_bytes == FRAME_BYTES
+
+
+def test_oversized_frame_is_not_kept():
+    cache = make_cache(1)
+    cache.put("p1", 4, 4, np.zeros((4, 4, 4), np.uint8))
+    assert not cache.frames and cache.total_bytes == 0
+
+
+def test_owned_frame_copies_only_mapped_frames(tmp_path):
+    np.save(tmp_path / "frame.npy", frame(3))
+    mapped = np.load(tmp_path / "frame.npy", mmap_mode="r")
+    owned = owned_frame(mapped)
+    assert type(owned) is np.ndarray and owned.flags.owndata
+    assert not owned.flags.writeable
+    assert owned[1, 1, 3] == 3
+
+    decoded = frame(5)
+    assert owned_frame(decoded) is decoded
+
+
+def test_put_never_copies(tmp_path):
+    np.save(tmp_path / "frame.npy", frame(3))
+    mapped = np.load(tmp_path / "frame.npy", mmap_mode="r")
+    cache = make_cache(2)
+    cache.put("p1", 2, 2, mapped)  # Runs on the render thread: the caller decides about copies
+    assert cache.get("p1", 2, 2) is mapped
+
+
+def test_prefetch_workers_copy_mapped_frames(tmp_path, monkeypatch):
+    photo = tmp_path / "photo.jpg"
+    photo.write_bytes(b"stands in for a photo; the frame comes from the disk cache")
+    frame_cache = FrameCache(str(tmp_path / "frames"))
+    frame_cache.store(str(photo), 2, 2, frame(7))
+
+    copied_on = []
+
+    def recording_owned_frame(pixels):
+        copied_on.append(threading.current_thread())
+        return owned_frame(pixels)
+
+    monkeypatch.setattr(prefetch, "owned_frame", recording_owned_frame)
+    cache = MemoryFrameCache()
+    prefetcher = PhotoPrefetcher([str(photo)], 2, 2, depth=0, frame_cache=frame_cache, memory_cache=cache)
+    try:
+        pixels = prefetcher.get(0)
+    finally:
+        prefetcher.shutdown()
+    assert pixels.flags.owndata and pixels[0, 0, 0] == 7
+    assert copied_on and threading.main_thread() not in copied_on
+    assert cache.get(str(photo), 2, 2) is pixels
@@ -0,0 +1,59 @@
+from navigation import Navigator, REPEAT_DELAY, REPEAT_INTERVAL, SETTLE_SECONDS
+
+
+def tap(navigator, step, origin, now, count=10):
+    target = navigator.press(step, origin, count, now)
+    navigator.release(step)
+    return target
+
+
+def test_taps_move_one_target_and_settle_once():
+    navigator = Navigator()
+    assert tap(navigator, 1, 3, now=0.0) == 4
+    assert tap(navigator, 1, 3, now=0.125) == 5  # From the target, not the origin
+    assert tap(navigator, -1, 3, now=0.25) == 4
+    assert navigator.settled(0.25 + SETTLE_SECONDS / 2) is None
+    assert navigator.settled(0.25 + SETTLE_SECONDS) == 4
+    assert navigator.settled(5.0) is None
+    assert navigator.target is None
+    assert navigator.stats()["full_loads"] == 1
+    assert navigator.stats()["coalesced_steps"] == 2
+    assert navigator.step == -1
+
+
+def test_target_wraps_around_the_list():
+    navigator = Navigator()
+    assert tap(navigator, 1, 9, now=0.0) == 0
+    navigator.settled(1.0)
+    assert tap(navigator, -1, 0, now=2.0) == 9
+
+
+def test_held_key_repeats_after_the_delay():
+    navigator = Navigator()
+    navigator.press(1, 0, 10, now=0.0)
+    assert navigator.repeat(10, REPEAT_DELAY / 2) is None
+    assert navigator.repeat(10, REPEAT_DELAY) == 2
+    assert navigator.repeat(10, REPEAT_DELAY + REPEAT_INTERVAL / 2) is None
+    assert navigator.repeat(10, REPEAT_DELAY + REPEAT_INTERVAL) == 3
+    # A long frame gives one repeat, not a catch-up burst
+    assert navigator.repeat(10, REPEAT_DELAY + 10 * REPEAT_INTERVAL) == 4
+    assert navigator.repeat(10, REPEAT_DELAY + 10 * REPEAT_INTERVAL) is None
+
+
+def test_nothing_settles_while_a_key_is_held():
+    navigator = Navigator()
+    navigator.press(1, 0, 10, now=0.0)
+    assert navigator.settled(SETTLE_SECONDS * 10) is None
+    navigator.release(-1)  # The other key: still held
+    assert navigator.settled(SETTLE_SECONDS * 10) is None
+    navigator.release(1)
+    assert navigator.repeat(10, 100.0) is None
+    assert navigator.settled(SETTLE_SECONDS * 10) == 1
+
+
+def test_jump_settles_like_a_burst():
+    navigator = Navigator()
+    assert navigator.jump(7, now=0.0) == 7
+    assert tap(navigator, 1, 0, now=0.5) == 8  # Continues from the jump target
+    assert navigator.settled(0.5 + SETTLE_SECONDS) == 8
+    assert navigator.stats()["full_loads"] == 1
@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+import photo_library
+from photo_library import PhotoLibrary, path_index
+
+
+PATHS = ["/p/a.jpg", "/p/c.jpg", "/p/e.jpg"]
+
+
+def test_path_index_finds_a_path():
+    assert path_index(PATHS, "/p/c.jpg") == 1
+
+
+def test_path_index_of_a_removed_path_is_the_photo_in_its_place():
+    assert path_index(PATHS, "/p/b.jpg") == 1
+    assert path_index(PATHS, "/p/0.jpg") == 0
+    assert path_index(PATHS, "/p/z.jpg") == 2  # Past the end: the last photo
+
+
+def test_path_index_refuses_an_empty_list():
+    with pytest.raises(ValueError):
+        path_index([], "/p/a.jpg")
+
+
+def test_poll_reports_changes_once(tmp_path):
+    library = PhotoLibrary([str(tmp_path)], str(tmp_path / "index.sqlite"))
+    assert library.poll() is None
+    library._publish(set(PATHS))
+    assert library.poll() == PATHS
+    assert library.poll() is None
+    library._publish(set(PATHS))
+    assert library.poll() is None  # Unchanged
+
+
+def test_poll_hands_out_an_empty_list(tmp_path):
+    library = PhotoLibrary([str(tmp_path)], str(tmp_path / "index.sqlite"))
+    library._publish(set(PATHS))
+    library.poll()
+    library._publish(set())
+    assert library.poll() == []  # Distinct from "no change"; the demo keeps its photos
+
+
+def make_photos(directory, names):
+    directory.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        (directory / name).write_bytes(b"header is not read by these tests")
+    return sorted(str(directory / name) for name in names)
+
+
+def test_scan_drops_vanished_photos(tmp_path):
+    photos = make_photos(tmp_path / "share", ["a.jpg", "b.jpg"])
+    library = PhotoLibrary([str(tmp_path / "share")], str(tmp_path / "index.sqlite"))
+    assert library.scan() == photos
+    os.remove(photos[0])
+    assert library.scan() == photos[1:]
+    assert library.load_index() == photos[1:]
+
+
+def test_unreadable_root_keeps_its_photos(tmp_path, monkeypatch):
+    local = make_photos(tmp_path / "local", ["a.jpg"])
+    nas = make_photos(tmp_path / "nas", ["b.jpg", "c.jpg"])
+    nested = make_photos(tmp_path / "nas" / "2024", ["d.jpg"])
+    library = PhotoLibrary([str(tmp_path / "local"), str(tmp_path / "nas")], str(tmp_path / "index.sqlite"))
+    assert library.scan() == sorted(local + nas + nested)
+
+    scandir = os.scandir
+
+    def offline_nas(directory):
+        if str(directory).startswith(str(tmp_path / "nas")):
+            raise OSError("network path not found")
+        return scandir(directory)
+
+    monkeypatch.setattr(photo_library.os, "scandir", offline_nas)
+    os.remove(local[0])
+    assert library.scan() == sorted(nas + nested)  # Only the photo really deleted goes
+    assert library.load_index() == sorted(nas + nested)
+
+
+def test_unreadable_subfolder_keeps_only_its_photos(tmp_path, monkeypatch):
+    top = make_photos(tmp_path / "share", ["a.jpg", "b.jpg"])
+    nested = make_photos(tmp_path / "share" / "locked", ["c.jpg"])
+    library = PhotoLibrary([str(tmp_path / "share")], str(tmp_path / "index.sqlite"))
+    library.scan()
+
+    scandir = os.scandir
+
+    def locked(directory):
+        if str(directory) == str(tmp_path / "share" / "locked"):
+            raise PermissionError("access denied")
+        return scandir(directory)
+
+    monkeypatch.setattr(photo_library.os, "scandir", locked)
+    os.remove(top[0])
+    assert library.scan() == sorted(top[1:] + nested)
@@ -0,0 +1,48 @@
+import threading
+import time
+import types
+
+import pygame
+import pytest
+
+from power_modes import RefreshGovernor
+
+
+@pytest.fixture
+def governor(monkeypatch):
+    monkeypatch.setenv("SDL_VIDEODRIVER", "dummy")
+    pygame.display.init()
+    pygame.event.clear()
+    yield RefreshGovernor(types.SimpleNamespace(target_fps=60, refresh_hz=60), ambient_fps=5)
+    pygame.display.quit()
+
+
+def test_wait_runs_out_without_input(governor):
+    start = time.perf_counter()
+    governor._wait(0.05)
+    assert time.perf_counter() - start >= 0.05
+    assert governor.wakeups == 0
+
+
+def test_input_ends_a_wait_and_keeps_its_order(governor):
+    pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_RIGHT, mod=0, unicode="", scancode=0))
+    pygame.event.post(pygame.event.Event(pygame.KEYUP, key=pygame.K_RIGHT, mod=0, unicode="", scancode=0))
+    start = time.perf_counter()
+    governor._wait(5.0)
+    assert time.perf_counter() - start < 1.0
+    assert governor.wakeups == 1
+    keys = [(event.type, event.key) for event in governor.events() if event.type in (pygame.KEYDOWN, pygame.KEYUP)]
+    assert keys == [(pygame.KEYDOWN, pygame.K_RIGHT), (pygame.KEYUP, pygame.K_RIGHT)]
+    assert governor.events() == []
+
+
+def test_input_from_another_thread_wakes_a_wait(governor):
+    def later():
+        time.sleep(0.1)
+        pygame.event.post(pygame.event.Event(pygame.USEREVENT, photo=3))
+
+    threading.Thread(target=later).start()
+    start = time.perf_counter()
+    governor._wait(5.0)
+    assert time.perf_counter() - start < 1.0
+    assert [event.photo for event in governor.events() if event.type == pygame.USEREVENT] == [3]
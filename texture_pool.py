@@ -0,0 +1,168 @@
+"""
+Fixed ring of preallocated photo textures.
+
+Photo changes used to delete a texture, generate a new one and reallocate its
+storage with glTexImage2D. The pool allocates its textures once (immutable
+storage where glTexStorage2D is available) and refills them in place with
+glTexSubImage2D. Roles are swapped by handle, so showing the same photo on
+both texture units never needs another upload.
+
+Frames are stored at their fitted size rather than padded to the screen. A
+frame is written into the corner of a texture whose storage it fills well;
+otherwise that texture's storage is reallocated to the frame's size.
+placement() gives the uniforms the shader needs to letterbox it.
+
+Frames prepared for a lower resolution than the screen (dynamic resolution
+decodes photos at the internal render size) are placed where the
+full-size frame would be, and the shader stretches them to fit.
+
+load_texture_from_pixels() makes a one-off texture sized to a frame, for
+tools like export_video.py that hold a few photos without a pool.
+"""
+
+from OpenGL.GL import *
+import numpy as np
+
+from image_pipeline import fit_size, letterbox_rect
+
+# Reallocate storage when a frame would use less than this share of it
+MIN_STORAGE_USE = 0.5
+
+
+class TexturePool:
+    """Ring of RGBA photo textures that are updated in place"""
+
+    # Current photo, incoming photo and one spare to fill while both are shown
+    def __init__(self, width, height, count=3):
+        self.width = width
+        self.height = height
+        self.immutable = bool(glTexStorage2D)
+        self.textures = [int(t) for t in np.atleast_1d(glGenTextures(count))]
+        self.storage = {}  # texture -> (width, height) of its allocated storage
+        self.frames = {}  # texture -> (width, height) of the frame it holds
+        self.next_slot = 0
+        self.allocations = 0
+        self.reallocations = 0
+        self.uploads = 0
+        self.bytes_uploaded = 0
+        self.bytes_uploaded_full_screen = 0
+
+        # RGBX rows are 4-byte aligned at any width, so GL's default unpack alignment applies
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 4)
+        for texture in self.textures:
+            self._allocate(texture, width, height)
+
+        storage = "immutable" if self.immutable else "mutable"
+        print(f"[TEXTURES] Pool of {count} {storage} textures for {width}x{height}")
+
+    def _allocate(self, texture, width, height):
+        glBindTexture(GL_TEXTURE_2D, texture)
+        if self.immutable:
+            glTexStorage2D(GL_TEXTURE_2D, 1, GL_RGBA8, width, height)
+        else:
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, width, height,
+                         0, GL_RGBA, GL_UNSIGNED_BYTE, None)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        # The shader masks outside the photo; clamping keeps edge texels from wrapping
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        self.storage[texture] = (width, height)
+        self.frames[texture] = (width, height)
+        self.allocations += 1
+
+    def acquire(self, in_use=()):
+        """Next texture in the ring that is not currently shown"""
+        for _ in range(len(self.textures)):
+            texture = self.textures[self.next_slot]
+            self.next_slot = (self.next_slot + 1) % len(self.textures)
+            if texture not in in_use:
+                return texture
+        raise RuntimeError("Texture pool exhausted - every texture is in use")
+
+    def ensure_storage(self, texture, width, height):
+        """Texture able to hold a width x height frame, reallocated if it fits badly.
+
+        Immutable storage cannot be resized, so the returned handle may differ
+        from the one passed in; it takes over the same ring slot.
+        """
+        storage_width, storage_height = self.storage[texture]
+        fits = width <= storage_width and height <= storage_height
+        if fits and width * height >= MIN_STORAGE_USE * storage_width * storage_height:
+            return texture
+
+        slot = self.textures.index(texture)
+        del self.storage[texture], self.frames[texture]
+        if self.immutable:
+            glDeleteTextures([texture])
+            texture = int(glGenTextures(1))
+            self.textures[slot] = texture
+        self._allocate(texture, width, height)
+        self.reallocations += 1
+        return texture
+
+    def upload(self, texture, pixels):
+        """Write a prepared (H, W, 4) RGBX uint8 frame into a pooled texture, returning its handle"""
+        height, width = pixels.shape[:2]
+        texture = self.ensure_storage(texture, width, height)
+        glBindTexture(GL_TEXTURE_2D, texture)
+        glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, width, height,
+                        GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+        self.record_upload(texture, width, height)
+        return texture
+
+    def record_upload(self, texture, width, height):
+        """Count an upload made here or by a streaming uploader"""
+        self.frames[texture] = (width, height)
+        self.uploads += 1
+        self.bytes_uploaded += width * height * 4
+        self.bytes_uploaded_full_screen += self.width * self.height * 4
+
+    def placement(self, texture):
+        """(photoRect, texScale) uniforms that letterbox this texture's frame on screen"""
+        frame_width, frame_height = self.frames[texture]
+        storage_width, storage_height = self.storage[texture]
+        rect = letterbox_rect(*self.display_size(frame_width, frame_height), self.width, self.height)
+        return rect, (frame_width / storage_width, frame_height / storage_height)
+
+    def display_size(self, frame_width, frame_height):
+        """On-screen size of a frame: its own size, or fitted up if it was prepared for a smaller screen"""
+        # Frames fitted to this screen always span its full width or height
+        if frame_width >= self.width or frame_height >= self.height:
+            return frame_width, frame_height
+        return fit_size(frame_width, frame_height, self.width, self.height)
+
+    def stats(self):
+        """Allocation and upload counters, with savings against full-screen textures"""
+        texture_bytes = sum(w * h * 4 for w, h in self.storage.values())
+        full_screen_bytes = len(self.textures) * self.width * self.height * 4
+        return {
+            "textures": len(self.textures),
+            "allocations": self.allocations,
+            "reallocations": self.reallocations,
+            "uploads": self.uploads,
+            "bytes_uploaded": self.bytes_uploaded,
+            "upload_saving_pct": round(100 * (1 - self.bytes_uploaded / max(1, self.bytes_uploaded_full_screen)), 1),
+            "texture_bytes": texture_bytes,
+            "texture_saving_pct": round(100 * (1 - texture_bytes / max(1, full_screen_bytes)), 1),
+        }
+
+    def delete(self):
+        """Free every pooled texture"""
+        glDeleteTextures(self.textures)
+        self.textures = []
+
+
+def load_texture_from_pixels(img_data):
+    """Upload a prepared (H, W, 4) RGBX uint8 frame as a standalone texture, outside any pool"""
+    height, width = img_data.shape[:2]
+    texture = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture)
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 4)
+    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, width, height,
+                 0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+    return texture
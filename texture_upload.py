@@ -0,0 +1,196 @@
+"""
+Upload paths for pooled photo textures.
+
+SyncUploader is the original behaviour: glTexSubImage2D straight from the
+NumPy buffer, so the driver copies the whole frame on the render thread.
+
+PBOUploader streams through a pair of pixel buffer objects instead. A worker
+thread copies the decoded frame into a mapped PBO (persistently mapped when
+glBufferStorage is available), and the render thread only issues a
+glTexSubImage2D that sources the PBO, which the driver can DMA while the next
+frames render. A fence per PBO tells us when it can be refilled.
+
+Both share the same interface so the main loop can switch between them:
+    begin(texture, pixels, tag) -> False if no upload slot is free
+    poll()                      -> [(texture, tag), ...] uploads issued
+
+The texture handle poll() returns may differ from the one passed to begin()
+when the pool had to reallocate its storage for the frame's size.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import ctypes
+import time
+
+from OpenGL.GL import *
+import numpy as np
+
+
+class SyncUploader:
+    """Synchronous glTexSubImage2D upload on the render thread"""
+
+    name = "sync"
+
+    def __init__(self, texture_pool):
+        self.texture_pool = texture_pool
+        self.finished = []
+        self.gl_time_total = 0.0
+        self.gl_time_max = 0.0
+
+    def busy(self):
+        return False
+
+    def begin(self, texture, pixels, tag=None):
+        start = time.perf_counter()
+        texture = self.texture_pool.upload(texture, pixels)
+        self._record_gl_time(time.perf_counter() - start)
+        self.finished.append((texture, tag))
+        return True
+
+    def poll(self):
+        finished, self.finished = self.finished, []
+        return finished
+
+    def _record_gl_time(self, seconds):
+        self.gl_time_total += seconds
+        self.gl_time_max = max(self.gl_time_max, seconds)
+
+    def stats(self):
+        """Render-thread time spent uploading, to compare frame-time spikes"""
+        return {
+            "mode": self.name,
+            "gl_ms_total": round(self.gl_time_total * 1000, 2),
+            "gl_ms_max": round(self.gl_time_max * 1000, 2),
+        }
+
+    def shutdown(self):
+        pass
+
+
+class PBOUploader(SyncUploader):
+    """Double-buffered pixel buffer object streaming with worker-side copies"""
+
+    name = "pbo"
+
+    def __init__(self, texture_pool, slots=2):
+        super().__init__(texture_pool)
+        # Sized for a full-screen frame; fitted frames use the front of the buffer
+        self.size = texture_pool.width * texture_pool.height * 4
+        self.persistent = bool(glBufferStorage)
+        self.worker = ThreadPoolExecutor(max_workers=1)
+        self.jobs = []  # (slot, texture, tag, frame shape, copy future) waiting for their copy
+        self.fences = {}  # slot -> fence of the last upload sourced from it
+
+        self.buffers = [int(b) for b in np.atleast_1d(glGenBuffers(slots))]
+        self.mapped = {}
+        for slot, buffer in enumerate(self.buffers):
+            glBindBuffer(GL_PIXEL_UNPACK_BUFFER, buffer)
+            if self.persistent:
+                flags = GL_MAP_WRITE_BIT | GL_MAP_PERSISTENT_BIT | GL_MAP_COHERENT_BIT
+                glBufferStorage(GL_PIXEL_UNPACK_BUFFER, self.size, None, flags)
+                self.mapped[slot] = self._map(flags, self.size)
+            else:
+                glBufferData(GL_PIXEL_UNPACK_BUFFER, self.size, None, GL_STREAM_DRAW)
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        # The demo turns PyOpenGL's error checking off, so look for setup failures here
+        error = glGetError()
+        if error != GL_NO_ERROR:
+            raise RuntimeError(f"GL error 0x{error:04x} while allocating PBOs")
+
+        mapping = "persistently mapped" if self.persistent else "map-per-upload"
+        print(f"[UPLOAD] {slots} {mapping} PBOs of {self.size / 1024 / 1024:.1f} MB")
+
+    def _map(self, flags, length):
+        """Map the front of the bound PBO and wrap it as a flat uint8 array"""
+        ptr = glMapBufferRange(GL_PIXEL_UNPACK_BUFFER, 0, length, flags)
+        address = ptr if isinstance(ptr, int) else ctypes.cast(ptr, ctypes.c_void_p).value
+        raw = (ctypes.c_ubyte * length).from_address(address)
+        return np.ctypeslib.as_array(raw)
+
+    def _free_slot(self):
+        """A PBO that is neither being filled nor still read by the GPU"""
+        filling = {job[0] for job in self.jobs}
+        for slot in range(len(self.buffers)):
+            if slot in filling:
+                continue
+            fence = self.fences.get(slot)
+            if fence is not None:
+                status = glClientWaitSync(fence, 0, 0)
+                if status not in (GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED):
+                    continue
+                glDeleteSync(fence)
+                del self.fences[slot]
+            return slot
+        return None
+
+    def busy(self):
+        return bool(self.jobs)
+
+    def begin(self, texture, pixels, tag=None):
+        start = time.perf_counter()
+        slot = self._free_slot()
+        if slot is None:
+            return False
+        if not self.persistent:
+            glBindBuffer(GL_PIXEL_UNPACK_BUFFER, self.buffers[slot])
+            self.mapped[slot] = self._map(GL_MAP_WRITE_BIT | GL_MAP_INVALIDATE_BUFFER_BIT,
+                                          pixels.nbytes)
+            glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        # The worker writes straight into driver memory
+        target = self.mapped[slot][:pixels.nbytes].reshape(pixels.shape)
+        future = self.worker.submit(np.copyto, target, pixels)
+        self.jobs.append((slot, texture, tag, pixels.shape, future))
+        self._record_gl_time(time.perf_counter() - start)
+        return True
+
+    def poll(self):
+        start = time.perf_counter()
+        finished = []
+        for job in list(self.jobs):
+            slot, texture, tag, shape, future = job
+            if not future.done():
+                continue
+            self.jobs.remove(job)
+            glBindBuffer(GL_PIXEL_UNPACK_BUFFER, self.buffers[slot])
+            if not self.persistent:
+                glUnmapBuffer(GL_PIXEL_UNPACK_BUFFER)
+                del self.mapped[slot]
+            if future.exception() is None:
+                height, width = shape[:2]
+                texture = self.texture_pool.ensure_storage(texture, width, height)
+                # Sources the bound PBO, so this returns without copying the frame
+                glBindTexture(GL_TEXTURE_2D, texture)
+                glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, width, height,
+                                GL_RGBA, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+                self.fences[slot] = glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+                self.texture_pool.record_upload(texture, width, height)
+                finished.append((texture, tag))
+            else:
+                print(f"[UPLOAD] PBO fill failed: {future.exception()}")
+            glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        if self.jobs or finished:
+            self._record_gl_time(time.perf_counter() - start)
+        return finished
+
+    def shutdown(self):
+        self.worker.shutdown(wait=True)
+        for slot, buffer in enumerate(self.buffers):
+            if slot in self.mapped:
+                glBindBuffer(GL_PIXEL_UNPACK_BUFFER, buffer)
+                glUnmapBuffer(GL_PIXEL_UNPACK_BUFFER)
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        for fence in self.fences.values():
+            glDeleteSync(fence)
+        glDeleteBuffers(len(self.buffers), self.buffers)
+        self.mapped.clear()
+        self.fences.clear()
+
+
+def create_uploader(mode, texture_pool):
+    """Uploader for --upload-mode, falling back to sync when PBOs are unusable"""
+    if mode == "pbo":
+        try:
+            return PBOUploader(texture_pool)
+        except Exception as e:
+            print(f"[UPLOAD] PBO streaming unavailable ({e}), using synchronous uploads")
+    return SyncUploader(texture_pool)